@@ -1,12 +1,20 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+# Ship the templates precompiled so the first page after launch doesn't compile Jinja source
+subprocess.run([sys.executable, '-m', 'flask', '--app', 'pcs_proposal_web', 'compile-templates',
+                'build/precompiled_templates'], check=True, env=dict(os.environ, TEMPLATE_WARMUP='0'))
 
 
 a = Analysis(
     ['run_app.py'],
     pathex=[],
     binaries=[],
-    datas=[('templates', 'templates'), ('static', 'static')],
-    hiddenimports=[],
+    datas=[('templates', 'templates'), ('static', 'static'),
+           ('build/precompiled_templates', 'precompiled_templates')],
+    hiddenimports=['waitress'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,245 @@
+"""
+Benchmarks for the proposal hot paths, with a baseline regression gate.
+
+    python -m benchmarks.bench_hotpaths                      # run, compare to baseline
+    python -m benchmarks.bench_hotpaths --update-baseline    # store a new baseline
+    python -m benchmarks.bench_hotpaths --quick --only calc  # fast subset
+
+Excel and LibreOffice are replaced by the deterministic stand-ins in benchmarks/standins.py,
+so the numbers measure our code, not Office. Results are written as JSON; any benchmark
+whose median is slower than baseline * (1 + tolerance) fails the run (exit code 1). A
+missing baseline also fails (exit code 2) unless --update-baseline is given; the committed
+benchmarks/baseline.json was produced by this harness with the stand-ins.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import standins
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+LIST_SIZES = (10, 1000, 50000)
+
+# Set by setup(): the app module only loads once the stand-in paths are in the environment
+WORK_DIR = None
+web = None
+
+
+def setup():
+    """Create the scratch root, install the stand-ins and import the app against them."""
+    global WORK_DIR, web
+    WORK_DIR = tempfile.mkdtemp(prefix="pcs-bench-")
+    standins.install(WORK_DIR)
+    import pcs_proposal_web  # must follow standins.install
+    standins.patch_app(pcs_proposal_web)
+    web = pcs_proposal_web
+
+
+def measure(fn, repeat=5, number=1, warmup=1):
+    """Run fn() `number` times per sample, `repeat` samples; return per-call timings."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    samples.sort()
+    return {
+        "median": statistics.median(samples),
+        "min": samples[0],
+        "max": samples[-1],
+        "p95": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def calc_kwargs(product, roof_type, squares=120):
+    return dict(
+        squares=squares, product=product, roof_type=roof_type, labor_days=None, warranty_incl="Yes",
+        price_per_sq_10=None, commission_pct=0, submitted_by="Vern Abbott", previous_submitted_by="",
+        office_fee_pct=None, adjusted_coverage=None, silicone_units_10=None, silicone_price=None,
+        gaco_patch_units=None, gaco_patch_price=None, sw_1flash_units=None, sw_1flash_price=None,
+        bleed_trap_units=None, bleed_trap_price=None, sw_bleed_block_units=None, sw_bleed_block_price=None,
+        drainage_mat_units=None, drainage_mat_price=None, foam_units=None, foam_price=None,
+        rfc_labor_price=None, pcs_labor_price=0, scarifying_total=0, travel_total=0, misc_costs_total=0,
+        previous_squares=0, previous_roof_type="", previous_product="", previous_adjusted_coverage=0,
+        previous_silicone_units_10=0, proposal_note="",
+    )
+
+
+def bench_calculation(quick):
+    results = {}
+    for product in standins.PRODUCTS:
+        for roof_type in standins.ROOF_TYPES:
+            kwargs = calc_kwargs(product, roof_type)
+            results[f"calculation_routine[{product}|{roof_type}]"] = measure(
+                lambda: web.calculation_routine(**kwargs), repeat=5, number=50 if quick else 500)
+    # Memo hit path: what a repeated recalc POST costs once the inputs have been seen
+    kwargs = calc_kwargs("Gaco", "Mod Bit")
+    web.calculation_routine_cached(**kwargs)
+    results["calculation_routine_cached[hit]"] = measure(
+        lambda: web.calculation_routine_cached(**kwargs), repeat=5, number=50 if quick else 500)
+    return results
+
+
+def _replacements():
+    return {
+        "[[CustomerName]]": "Bench Customer", "[[ProjectStreetAddr]]": "1 Main St", "[[ProjectCity]]": "Denver",
+        "[[ProjectState]]": "CO", "[[ProjectZip]]": "80202", "[[Date]]": "January 01, 2026", "[[Squares]]": 120,
+        "[[PriceIncludesLanguage]]": "* Price Includes material", "[[WarrantyIncluded]]": "IS INCLUDED",
+        "[[SubmittedBy]]": "Vern Abbott", "[[10YrTotalPrice]]": "40,000", "[[15YrTotalPrice]]": "45,000",
+        "[[20YrTotalPrice]]": "50,000", "[[AdditionalLanguage]]": " ",
+    }
+
+
+def bench_templates(quick):
+    from docx import Document
+    results = {}
+    template_dir = os.environ["TEMPLATE_DIR"]
+    for name in sorted(os.listdir(template_dir)):
+        if not name.endswith(".docx"):
+            continue
+        path = os.path.join(template_dir, name)
+
+        def run(path=path):
+            doc = Document(path)
+            web.replace_placeholder_blocks(doc, _replacements())
+
+        results[f"replace_placeholder_blocks[{name}]"] = measure(run, repeat=3 if quick else 10)
+    return results
+
+
+def _create(folder=None, street="1 Main St"):
+    return web.create_proposal_from_fields(
+        customer_name="Bench Customer", street_address=street, city="Denver", state="CO", zip_code="80202",
+        roof_type="Mod Bit", total_squares=120, warranty_incl="Yes", product="Gaco", proposal_language="",
+        submitted_by="Vern Abbott", target_folder=folder, mapped_data={"price_per_sq_10": 350},
+        pdf_async=False, use_libreoffice=True,
+    )
+
+
+def bench_import(quick):
+    import pandas as pd
+    folder = os.path.join(os.environ["PROPOSALS_DIR"], _create(street="Import Bench"))
+    path = web.find_profit_summary_file(folder)
+    return {"profit_summary_import": measure(lambda: pd.read_excel(path, header=None).values.tolist(),
+                                             repeat=3 if quick else 10)}
+
+
+def bench_create(quick):
+    folder = os.path.join(os.environ["PROPOSALS_DIR"], "Bench Customer - Create Bench")
+
+    def run():
+        web._delete_old_artifacts(folder)
+        _create(folder=folder, street="Create Bench")
+
+    return {"create_proposal_from_fields": measure(run, repeat=3 if quick else 10)}
+
+
+def bench_list(quick, sizes=LIST_SIZES):
+    results = {}
+    client = web.app.test_client()
+    for size in sizes:
+        if quick and size > 1000:
+            continue
+        root = tempfile.mkdtemp(prefix=f"list-{size}-", dir=WORK_DIR)
+        for i in range(size):
+            os.mkdir(os.path.join(root, f"Customer {i:05d} - {i} Bench Street"))
+        web.PROPOSALS_DIR = web.STAGE_DIRS["proposals"] = root
+
+        def run():
+            resp = client.get("/")
+            assert resp.status_code == 200
+
+        results[f"proposal_list[{size}]"] = measure(run, repeat=3 if size >= 50000 else 5)
+    return results
+
+
+SUITES = {
+    "calc": bench_calculation,
+    "templates": bench_templates,
+    "import": bench_import,
+    "create": bench_create,
+    "list": bench_list,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (name, current, baseline, ratio) for regressions."""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = stats["median"] / base["median"] if base["median"] else float("inf")
+        if ratio > 1 + tolerance:
+            regressions.append((name, stats["median"], base["median"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=sorted(SUITES), help="Run only these suites.")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations, skip the 50k-folder list.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write results JSON.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=float(os.environ.get("BENCH_TOLERANCE", "0.25")),
+                        help="Allowed slowdown vs baseline median (0.25 = 25%%).")
+    parser.add_argument("--update-baseline", action="store_true", help="Write results to the baseline file.")
+    args = parser.parse_args(argv)
+
+    setup()
+    results = {}
+    try:
+        for name in args.only or SUITES:
+            print(f"Running {name} ...", flush=True)
+            results.update(SUITES[name](args.quick))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+    width = max(len(n) for n in results) if results else 10
+    for name, stats in sorted(results.items()):
+        print(f"{name:<{width}}  median {stats['median'] * 1000:10.3f} ms   p95 {stats['p95'] * 1000:10.3f} ms")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 2
+    with open(args.baseline, "r", encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, current, base, ratio in regressions:
+        print(f"REGRESSION {name}: {current * 1000:.3f} ms vs baseline {base * 1000:.3f} ms ({ratio:.2f}x)")
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.tolerance:.0%} of baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Stand-in for `soffice --headless --convert-to pdf --outdir DIR FILE`.
+Writes a minimal valid PDF named after FILE after sleeping FAKE_SOFFICE_LATENCY seconds.
+"""
+import os
+import sys
+import time
+
+MINIMAL_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def main(argv):
+    if "--outdir" not in argv or len(argv) < 2:
+        print("usage: fake_soffice.py --headless --convert-to pdf --outdir DIR FILE", file=sys.stderr)
+        return 2
+    outdir = argv[argv.index("--outdir") + 1]
+    source = argv[-1]
+    time.sleep(float(os.environ.get("FAKE_SOFFICE_LATENCY", "0") or 0))
+    os.makedirs(outdir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(source))[0] + ".pdf"
+    with open(os.path.join(outdir, name), "wb") as fh:
+        fh.write(MINIMAL_PDF)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,202 @@
+"""
+Generate a synthetic proposal corpus for scale testing.
+
+    python -m benchmarks.generate_corpus --count 50000 --root /data/pcs-corpus --workers 8
+
+Creates N folders spread over the four stage directories under --root, named like the real
+ones ("{customer} - {street address}"). Each folder holds a Profit Summary workbook whose
+input cells are filled through EXCEL_CELL_MAP and whose formula cells hold the values
+calculation_routine produces, plus the proposal DOCX rendered from the Word templates.
+No customer data is involved: names and addresses are generated from a seed, so the same
+arguments always produce the same corpus.
+
+Point the app at it with the printed environment variables.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import standins
+
+SUBMITTERS = ("David Estes", "Mark Burcham", "Richard Winger", "Vern Abbott")
+STAGE_WEIGHTS = {"proposals": 0.40, "contracts": 0.15, "completed": 0.25, "dead": 0.20}
+NAME_PARTS = (
+    ("Summit", "Front Range", "Apex", "Granite", "Blue Sky", "Pinnacle", "Keystone", "Cedar", "Ironwood",
+     "Silver Creek", "Red Rock", "Evergreen", "Highland", "Canyon", "Northstar", "Timberline"),
+    ("Roofing", "Exteriors", "Construction", "Builders", "Contractors", "Property Mgmt", "Restoration"),
+)
+STREET_NAMES = ("Main", "Oak", "Maple", "Cedar", "Elm", "Pine", "Lincoln", "Colfax", "Broadway", "Federal",
+                "Wadsworth", "Kipling", "Alameda", "Mississippi", "Evans", "Hampden", "Arapahoe", "Quebec")
+STREET_SUFFIXES = ("St", "Street", "Ave", "Avenue", "Blvd", "Rd", "Road", "Dr", "Way", "Pkwy", "Ct")
+CITIES = (("Denver", "CO", "802"), ("Aurora", "CO", "800"), ("Lakewood", "CO", "802"), ("Boulder", "CO", "803"),
+          ("Colorado Springs", "CO", "809"), ("Fort Collins", "CO", "805"), ("Cheyenne", "WY", "820"))
+
+_web = None
+_profit_template = None
+
+
+def _init_worker():
+    """Import the app once per worker process with the stand-ins in place."""
+    global _web, _profit_template
+    import pcs_proposal_web
+    _web = standins.patch_app(pcs_proposal_web)
+    _profit_template = os.path.join(os.environ["TEMPLATE_DIR"], "Profit Summary.xlsm")
+
+
+def _pick_stage(rng):
+    r = rng.random()
+    for stage, weight in STAGE_WEIGHTS.items():
+        if r < weight:
+            return stage
+        r -= weight
+    return "dead"
+
+
+def make_fields(i, seed):
+    """Deterministic proposal inputs for corpus entry i."""
+    rng = random.Random(seed * 1_000_003 + i)
+    city, state, zip_prefix = rng.choice(CITIES)
+    product = rng.choice(standins.PRODUCTS)
+    roof_type = rng.choice(standins.ROOF_TYPES)
+    squares = rng.randint(15, 450)
+    fields = {
+        "stage": _pick_stage(rng),
+        "customer_name": f"{rng.choice(NAME_PARTS[0])} {rng.choice(NAME_PARTS[1])}",
+        "street_address": f"{rng.randint(100, 19999)} {rng.choice(STREET_NAMES)} {rng.choice(STREET_SUFFIXES)}",
+        "city": city,
+        "state": state,
+        "zip_code": f"{zip_prefix}{rng.randint(0, 99):02d}",
+        "product": product,
+        "current_roof": roof_type,
+        "squares": squares,
+        "warranty_incl": "Yes" if product == "Uniflex" or rng.random() < 0.7 else "No",
+        "submitted_by": rng.choice(SUBMITTERS),
+        "price_per_sq_10": None if rng.random() < 0.5 else rng.randrange(300, 800, 5),
+        "travel_total": rng.choice((0, 0, 0, 250, 500, 1200)),
+        "misc_costs_total": rng.choice((0, 0, 150, 400)),
+        "proposal_note": rng.choice(("", "", "Access via rear alley", "Needs lift for parapet walls",
+                                     "Owner requested early start", "Ponding on north side")),
+        "proposal_language": rng.choice(("", "", "Includes cleaning of gutters and downspouts",
+                                         "Excludes replacement of damaged decking")),
+        # Spread modification times over the last five years
+        "mtime": time.time() - rng.uniform(0, 5 * 365) * 86400,
+    }
+    return fields
+
+
+def _build_folder(task):
+    i, seed = task
+    web = _web
+    f = make_fields(i, seed)
+    folder_name = f"{f['customer_name']} - {f['street_address']}"
+    folder = os.path.join(web.STAGE_DIRS[f["stage"]], folder_name)
+    if os.path.isdir(folder):
+        folder = f"{folder} #{i}"
+        folder_name = os.path.basename(folder)
+    os.makedirs(folder)
+
+    result = web.calculation_routine(
+        f["squares"], f["product"], f["current_roof"], None, f["warranty_incl"], f["price_per_sq_10"], 0,
+        submitted_by=f["submitted_by"], previous_submitted_by=f["submitted_by"], office_fee_pct=None,
+        adjusted_coverage=0, silicone_units_10=None, silicone_price=None, gaco_patch_units=None,
+        gaco_patch_price=None, sw_1flash_units=None, sw_1flash_price=None, bleed_trap_units=None,
+        bleed_trap_price=None, sw_bleed_block_units=None, sw_bleed_block_price=None, drainage_mat_units=None,
+        drainage_mat_price=None, foam_units=None, foam_price=None, rfc_labor_price=None, pcs_labor_price=0,
+        scarifying_total=0, travel_total=f["travel_total"], misc_costs_total=f["misc_costs_total"],
+        previous_squares=f["squares"], previous_roof_type=f["current_roof"], previous_product=f["product"],
+        previous_adjusted_coverage=0, previous_silicone_units_10=None, proposal_note=f["proposal_note"],
+    )
+    values = dict(f)
+    values.update(result)
+    values["squares"] = f["squares"]
+
+    # Profit Summary: inputs through the central cell map, formula cells from the calculation
+    from openpyxl import load_workbook
+    profit_path = os.path.join(folder, f"Profit Summary - {f['street_address']}.xlsm")
+    wb = load_workbook(_profit_template, keep_vba=True)
+    ws = wb.worksheets[0]
+    for field, cell in web.EXCEL_CELL_MAP.items():
+        if cell:
+            ws[cell] = values.get(field)
+    for field, cell in web.PROFIT_SUMMARY_RESULT_CELLS.items():
+        ws[cell] = values.get(field)
+    wb.save(profit_path)
+
+    # Proposal DOCX from the real templates
+    from docx import Document
+    roof_suffix = {
+        "TPO/EPDM": "TPO EPDM Metal.docx", "Metal": "TPO EPDM Metal.docx", "Mod Bit": "Mod Bit.docx",
+        "Rock/Foam/Coat": "RFC.docx", "Ballasted 45 mil": "Ballasted 45mil.docx",
+        "Ballasted 60 mil": "Ballasted 60mil.docx",
+    }[f["current_roof"]]
+    prefix = "Gaco S42 Proposal - " if f["product"] == "Gaco" else "Uniflex Proposal - "
+    template_path = os.path.join(os.environ["TEMPLATE_DIR"], prefix + roof_suffix)
+    doc = Document(template_path)
+    web.replace_placeholder_blocks(doc, {
+        "[[CustomerName]]": f["customer_name"],
+        "[[ProjectStreetAddr]]": f["street_address"],
+        "[[ProjectCity]]": f["city"],
+        "[[ProjectState]]": f["state"],
+        "[[ProjectZip]]": f["zip_code"],
+        "[[Date]]": datetime.date.fromtimestamp(f["mtime"]).strftime("%B %d, %Y"),
+        "[[Squares]]": f["squares"],
+        "[[PriceIncludesLanguage]]": f["proposal_language"] or " ",
+        "[[WarrantyIncluded]]": f["warranty_incl"],
+        "[[SubmittedBy]]": f["submitted_by"],
+        "[[10YrTotalPrice]]": f"{result['total_price_10']:,.0f}",
+        "[[15YrTotalPrice]]": f"{result['total_price_15']:,.0f}",
+        "[[20YrTotalPrice]]": f"{result['total_price_20']:,.0f}",
+        "[[AdditionalLanguage]]": f["proposal_language"] or " ",
+    })
+    web._save_docx_from_template(doc, template_path, os.path.join(folder, f"{prefix}{f['street_address']}.docx"))
+
+    pid = web._new_proposal_id()
+    with open(os.path.join(folder, web.PROPOSAL_ID_FILE), "w", encoding="utf-8") as fh:
+        fh.write(pid)
+    for name in os.listdir(folder):
+        os.utime(os.path.join(folder, name), (f["mtime"], f["mtime"]))
+    os.utime(folder, (f["mtime"], f["mtime"]))
+    return pid, f["stage"], folder_name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000, help="Number of proposal folders to create.")
+    parser.add_argument("--root", required=True, help="Corpus root; stage directories are created inside.")
+    parser.add_argument("--templates", help="Directory with the real Word/Profit Summary templates "
+                                            "(default: synthetic templates under ROOT/doc_templates).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.root)
+    standins.install(root, make_templates=not args.templates)
+    if args.templates:
+        os.environ["TEMPLATE_DIR"] = os.path.abspath(args.templates)
+
+    started = time.perf_counter()
+    entries = {}
+    tasks = ((i, args.seed) for i in range(args.count))
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        for n, (pid, stage, folder_name) in enumerate(pool.map(_build_folder, tasks, chunksize=64), 1):
+            entries[pid] = {"stage": stage, "folder": folder_name}
+            if n % 1000 == 0:
+                print(f"  {n}/{args.count} folders ({time.perf_counter() - started:.0f}s)", flush=True)
+
+    # Write the proposal index directly so the app doesn't have to scan the corpus on first use
+    import pcs_proposal_web as web
+    web._update_index(lambda current: (current.clear(), current.update(entries)))
+
+    elapsed = time.perf_counter() - started
+    print(f"Created {len(entries)} proposal folders in {elapsed:.1f}s under {root}")
+    for env in (*standins.DIRS, *standins.STATE_FILES):
+        print(f"export {env}='{os.environ[env]}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
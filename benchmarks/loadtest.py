@@ -0,0 +1,281 @@
+"""
+End-to-end load test for the gunicorn deployment, with Excel and LibreOffice stand-ins.
+
+    python -m benchmarks.loadtest --workers 1 2 4 --threads 1 4 --concurrency 1 4 8 16 32
+
+For every workers x threads combination a gunicorn server is started on
+benchmarks.loadtest_app, and virtual estimators run the realistic flow
+
+    list -> details -> N recalc POSTs -> save (-> contract move)
+
+at each concurrency level for --duration seconds. Excel and soffice latency are simulated
+with --excel-latency / --soffice-latency. The report gives throughput, latency percentiles
+per step and the saturation point (the concurrency after which throughput stops growing,
+errors appear or p95 exceeds --slo seconds). Results are also written as JSON.
+Contracts cannot go back to proposals, so a proposal that took the contract move leaves
+the pool for the rest of the run; use a --corpus large enough for the duration.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmarks import generate_corpus
+
+STEPS = ("list", "details", "recalc", "save", "move")
+# Same preload/post_fork settings as the Procfile
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class Server:
+    """A gunicorn process serving benchmarks.loadtest_app."""
+
+    def __init__(self, root, workers, threads, args):
+        self.port = _free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        env = dict(os.environ,
+                   LOADTEST_ROOT=root,
+                   FAKE_EXCEL_LATENCY=str(args.excel_latency),
+                   FAKE_SOFFICE_LATENCY=str(args.soffice_latency))
+        cmd = [sys.executable, "-m", "gunicorn", "benchmarks.loadtest_app:app", "--config", GUNICORN_CONF,
+               "--bind", f"127.0.0.1:{self.port}", "--workers", str(workers),
+               "--threads", str(threads), "--timeout", str(args.timeout), "--log-level", "warning"]
+        self.proc = subprocess.Popen(cmd, env=env)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                urllib.request.urlopen(self.base + "/metrics", timeout=2).read()
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError("gunicorn did not become ready")
+
+    def stop(self):
+        if self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGTERM)
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+class VirtualEstimator(threading.Thread):
+    """Runs the estimator flow in a loop against its own proposals until stop is set."""
+
+    def __init__(self, base, proposals, args, stop, rng_seed):
+        super().__init__(daemon=True)
+        self.base, self.proposals, self.args, self.stop = base, list(proposals), args, stop
+        self.moved = []
+        self.rng = random.Random(rng_seed)
+        self.timings = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.flows = 0
+
+    def _request(self, step, path, data=None):
+        body = None
+        if data is not None:
+            body = (json.dumps(data).encode() if isinstance(data, dict) and step == "move"
+                    else urllib.parse.urlencode(data).encode())
+        req = urllib.request.Request(self.base + path, data=body)
+        if step == "move" and data is not None:
+            req.add_header("Content-Type", "application/json")
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.args.timeout + 5) as resp:
+                resp.read()
+                ok = resp.status < 500
+        except urllib.error.HTTPError as e:
+            ok = e.code < 500
+        except (urllib.error.URLError, OSError):
+            ok = False
+        self.timings[step].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[step] += 1
+        return ok
+
+    def _form(self, folder_name):
+        customer, _, street = folder_name.partition(" - ")
+        squares = self.rng.randint(20, 400)
+        roof = self.rng.choice(("TPO/EPDM", "Metal", "Mod Bit", "Rock/Foam/Coat"))
+        product = self.rng.choice(("Gaco", "Uniflex"))
+        return {
+            "customer_name": customer, "street_address": street, "city": "Denver", "state": "CO",
+            "zip_code": "80202", "squares": squares, "current_roof": roof, "product": product,
+            "warranty_incl": "Yes", "submitted_by": "Vern Abbott", "price_per_sq_10": "",
+            "previous_squares": squares, "previous_roof_type": roof, "previous_product": product,
+            "previous_submitted_by": "Vern Abbott", "read_only": "No",
+        }
+
+    def run(self):
+        while not self.stop.is_set() and self.proposals:
+            pid, folder_name = self.rng.choice(self.proposals)
+            self._request("list", "/")
+            self._request("details", f"/proposal_details/{pid}")
+            form = self._form(folder_name)
+            for _ in range(self.args.recalcs):
+                form["price_per_sq_10"] = str(self.rng.randrange(300, 800, 5))
+                self._request("recalc", f"/update-proposal/{pid}", dict(form, action="recalc"))
+            self._request("save", f"/update-proposal/{pid}", dict(form, action="save"))
+            if self.rng.random() < self.args.move_ratio:
+                self._request("move", f"/proposal_details/{pid}?contract_ind=true")
+                self.proposals.remove((pid, folder_name))
+                self.moved.append((pid, folder_name))
+            self.flows += 1
+
+
+def run_level(base, proposals, concurrency, args):
+    stop = threading.Event()
+    shares = [proposals[i::concurrency] or proposals for i in range(concurrency)]
+    users = [VirtualEstimator(base, shares[i], args, stop, rng_seed=i) for i in range(concurrency)]
+    started = time.perf_counter()
+    for u in users:
+        u.start()
+    time.sleep(args.duration)
+    stop.set()
+    for u in users:
+        u.join(timeout=args.timeout + 10)
+    elapsed = time.perf_counter() - started
+    # Contracted proposals are no longer open for the next levels and runs
+    moved = {entry for u in users for entry in u.moved}
+    proposals[:] = [entry for entry in proposals if entry not in moved]
+
+    level = {"concurrency": concurrency, "elapsed": elapsed, "steps": {}}
+    all_timings, total_requests, total_errors = [], 0, 0
+    for step in STEPS:
+        timings = [t for u in users for t in u.timings[step]]
+        errors = sum(u.errors[step] for u in users)
+        all_timings.extend(timings)
+        total_requests += len(timings)
+        total_errors += errors
+        level["steps"][step] = {
+            "requests": len(timings),
+            "errors": errors,
+            "p50": _percentile(timings, 0.50),
+            "p95": _percentile(timings, 0.95),
+            "p99": _percentile(timings, 0.99),
+            "mean": statistics.fmean(timings) if timings else None,
+        }
+    level.update(
+        flows=sum(u.flows for u in users),
+        flows_per_sec=sum(u.flows for u in users) / elapsed,
+        requests_per_sec=total_requests / elapsed,
+        error_rate=(total_errors / total_requests) if total_requests else 0.0,
+        p50=_percentile(all_timings, 0.50),
+        p95=_percentile(all_timings, 0.95),
+        p99=_percentile(all_timings, 0.99),
+    )
+    return level
+
+
+def saturation_point(levels, slo):
+    """First concurrency level where adding users no longer helps or the SLO breaks."""
+    previous = None
+    for level in levels:
+        if level["error_rate"] > 0.01 or (level["p95"] or 0) > slo:
+            return level["concurrency"]
+        if previous and level["flows_per_sec"] < previous["flows_per_sec"] * 1.10:
+            return previous["concurrency"]
+        previous = level
+    return None
+
+
+def _load_proposals(root, limit):
+    with open(os.path.join(root, "proposal_index.json"), "r", encoding="utf-8") as fh:
+        entries = json.load(fh)["proposals"]
+    open_ones = [(pid, e["folder"]) for pid, e in entries.items() if e["stage"] == "proposals"]
+    open_ones.sort()
+    return open_ones[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="gunicorn worker counts")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1], help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency level")
+    parser.add_argument("--recalcs", type=int, default=3, help="Recalc POSTs per flow")
+    parser.add_argument("--move-ratio", type=float, default=0.2, help="Share of flows that do a contract move")
+    parser.add_argument("--excel-latency", type=float, default=2.0, help="Simulated Excel session seconds")
+    parser.add_argument("--soffice-latency", type=float, default=3.0, help="Simulated PDF conversion seconds")
+    parser.add_argument("--corpus", type=int, default=500, help="Folders to generate before the run")
+    parser.add_argument("--timeout", type=int, default=120, help="gunicorn --timeout (matches the Procfile)")
+    parser.add_argument("--slo", type=float, default=10.0, help="p95 seconds considered saturated")
+    parser.add_argument("--root", help="Reuse an existing corpus root instead of generating one")
+    parser.add_argument("--output", default="loadtest_results.json")
+    args = parser.parse_args(argv)
+
+    root = args.root or tempfile.mkdtemp(prefix="pcs-load-")
+    if not args.root:
+        print(f"Generating {args.corpus} proposal folders in {root} ...", flush=True)
+        generate_corpus.main(["--count", str(args.corpus), "--root", root])
+    proposals = _load_proposals(root, limit=max(args.concurrency) * 20)
+    if not proposals:
+        print("No open proposals in the corpus.")
+        return 1
+
+    report = {"args": vars(args), "runs": []}
+    try:
+        for workers in args.workers:
+            for threads in args.threads:
+                print(f"\n== gunicorn workers={workers} threads={threads} ==", flush=True)
+                server = Server(root, workers, threads, args)
+                levels = []
+                try:
+                    for concurrency in args.concurrency:
+                        if not proposals:
+                            print("  no open proposals left; use a larger --corpus", flush=True)
+                            break
+                        level = run_level(server.base, proposals, concurrency, args)
+                        levels.append(level)
+                        print(f"  c={concurrency:<3} flows/s={level['flows_per_sec']:7.2f} "
+                              f"req/s={level['requests_per_sec']:7.2f} "
+                              f"p50={level['p50'] or 0:6.2f}s p95={level['p95'] or 0:6.2f}s "
+                              f"p99={level['p99'] or 0:6.2f}s save.p95={level['steps']['save']['p95'] or 0:6.2f}s "
+                              f"errors={level['error_rate']:.1%}", flush=True)
+                finally:
+                    server.stop()
+                saturated = saturation_point(levels, args.slo)
+                print(f"  saturation point: {saturated if saturated is not None else 'not reached'}")
+                report["runs"].append({"workers": workers, "threads": threads, "levels": levels,
+                                       "saturation_concurrency": saturated})
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
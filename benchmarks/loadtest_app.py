@@ -0,0 +1,18 @@
+"""
+WSGI entry point for load tests: the real app with Excel/LibreOffice stand-ins.
+
+    LOADTEST_ROOT=/tmp/pcs-load gunicorn benchmarks.loadtest_app:app --workers 4
+
+LOADTEST_ROOT must be the same for every worker (benchmarks.loadtest sets it).
+"""
+import os
+import tempfile
+
+from benchmarks import standins
+
+standins.install(os.environ.get("LOADTEST_ROOT") or tempfile.mkdtemp(prefix="pcs-load-"))
+
+import pcs_proposal_web  # noqa: E402  (must follow standins.install)
+
+standins.patch_app(pcs_proposal_web)
+app = pcs_proposal_web.init_app()
@@ -0,0 +1,238 @@
+"""
+Deterministic local stand-ins for Excel (xlwings) and LibreOffice.
+
+The benchmark, corpus and load-test tools run the real app code on machines with no Excel
+and no soffice. Call install() BEFORE importing pcs_proposal_web so the directory settings
+are picked up, then patch_app(pcs_proposal_web) to swap the backends in:
+
+    from benchmarks import standins
+    standins.install(work_dir)
+    import pcs_proposal_web
+    standins.patch_app(pcs_proposal_web)
+
+Latency can be injected with FAKE_EXCEL_LATENCY / FAKE_SOFFICE_LATENCY (seconds).
+"""
+import os
+import stat
+import sys
+import time
+import types
+
+from docx import Document
+from openpyxl import Workbook, load_workbook
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_SOFFICE = os.path.join(HERE, "fake_soffice.py")
+
+PRODUCTS = ("Gaco", "Uniflex")
+ROOF_TYPES = ("TPO/EPDM", "Metal", "Mod Bit", "Ballasted 60 mil", "Ballasted 45 mil", "Rock/Foam/Coat")
+
+_app_module = None
+
+
+def _latency(name):
+    try:
+        return float(os.environ.get(name, "0") or 0)
+    except ValueError:
+        return 0.0
+
+
+def recalculate_sheet(ws, app_module):
+    """Fill the formula cells from the input cells, the way the real workbook's formulas do."""
+    cell_map = app_module.EXCEL_CELL_MAP
+
+    def val(field, default=None):
+        cell = cell_map.get(field)
+        v = ws[cell].value if cell else None
+        return default if v is None or v == "" else v
+
+    squares = float(val("squares", 0) or 0)
+    roof_type = val("current_roof", "")
+    product = val("product", "")
+    submitted_by = val("submitted_by", "")
+    result = app_module.calculation_routine(
+        squares, product, roof_type, val("labor_days"), val("warranty_incl", "No"),
+        val("price_per_sq_10"), 0,
+        submitted_by=submitted_by, previous_submitted_by=submitted_by, office_fee_pct=None,
+        adjusted_coverage=0, silicone_units_10=val("silicone_units_10"),
+        silicone_price=val("silicone_price"), gaco_patch_units=val("gaco_patch_units"),
+        gaco_patch_price=val("gaco_patch_price"), sw_1flash_units=val("sw_1flash_units"),
+        sw_1flash_price=val("sw_1flash_price"), bleed_trap_units=val("bleed_trap_units"),
+        bleed_trap_price=val("bleed_trap_price"), sw_bleed_block_units=val("sw_bleed_block_units"),
+        sw_bleed_block_price=val("sw_bleed_block_price"), drainage_mat_units=val("drainage_mat_units"),
+        drainage_mat_price=val("drainage_mat_price"), foam_units=val("foam_units"),
+        foam_price=val("foam_price"), rfc_labor_price=val("rfc_labor_price"),
+        pcs_labor_price=val("pcs_labor_price"), scarifying_total=val("scarifying_total", 0),
+        travel_total=val("travel_total", 0), misc_costs_total=val("misc_costs_total", 0),
+        previous_squares=squares, previous_roof_type=roof_type, previous_product=product,
+        previous_adjusted_coverage=0, previous_silicone_units_10=val("silicone_units_10"),
+        proposal_note=val("proposal_note", ""),
+    )
+    for field, cell in app_module.PROFIT_SUMMARY_RESULT_CELLS.items():
+        ws[cell] = result.get(field)
+    return result
+
+
+# ---- Fake xlwings ----
+class _Range:
+    def __init__(self, ws, address):
+        self._ws, self._address = ws, address
+
+    @property
+    def value(self):
+        return self._ws[self._address].value
+
+    @value.setter
+    def value(self, v):
+        self._ws[self._address] = v
+
+
+class _Sheet:
+    def __init__(self, ws):
+        self._ws = ws
+
+    def range(self, address):
+        return _Range(self._ws, address)
+
+
+class _Book:
+    def __init__(self, path):
+        self.fullname = path
+        self._wb = load_workbook(path, keep_vba=path.lower().endswith(".xlsm"))
+        self.sheets = [_Sheet(ws) for ws in self._wb.worksheets]
+
+    def save(self):
+        time.sleep(_latency("FAKE_EXCEL_LATENCY") / 2)
+        if _app_module is not None:
+            recalculate_sheet(self._wb.worksheets[0], _app_module)
+        self._wb.save(self.fullname)
+
+    def close(self):
+        self._wb.close()
+
+
+class _Books:
+    def open(self, path):
+        return _Book(path)
+
+
+class FakeExcelApp:
+    """Enough of xlwings.App for create_proposal_from_fields, backed by openpyxl."""
+
+    def __init__(self, visible=False):
+        time.sleep(_latency("FAKE_EXCEL_LATENCY") / 2)  # Excel start-up cost
+        self.visible = visible
+        self.display_alerts = True
+        self.screen_updating = True
+        self.books = _Books()
+
+    def quit(self):
+        pass
+
+
+fake_xlwings = types.ModuleType("xlwings")
+fake_xlwings.App = FakeExcelApp
+
+
+def _fake_docx2pdf_convert(doc_path, outdir):
+    raise RuntimeError("docx2pdf is not available under the stand-ins; use the fake soffice")
+
+
+# ---- Template directory ----
+def make_template_dir(path, app_module=None):
+    """
+    Create synthetic Word templates (one per product x roof type) and a Profit Summary
+    workbook in `path`, unless real ones are already there.
+    """
+    os.makedirs(path, exist_ok=True)
+    suffixes = {"TPO EPDM Metal.docx", "Mod Bit.docx", "RFC.docx", "Ballasted 45mil.docx", "Ballasted 60mil.docx"}
+    for prefix in ("Gaco S42 Proposal - ", "Uniflex Proposal - "):
+        for suffix in suffixes:
+            target = os.path.join(path, prefix + suffix)
+            if os.path.exists(target):
+                continue
+            doc = Document()
+            doc.add_heading("[[CustomerName]]", level=1)
+            doc.add_paragraph("[[ProjectStreetAddr]], [[ProjectCity]], [[ProjectState]] [[ProjectZip]]")
+            doc.add_paragraph("Date: [[Date]]    Squares: [[Squares]]    Submitted by: [[SubmittedBy]]")
+            for i in range(40):
+                doc.add_paragraph(f"Scope item {i}: clean, prime and coat the roof surface per spec section {i}.")
+            table = doc.add_table(rows=4, cols=2)
+            for row, (label, key) in enumerate((("10 Year", "[[10YrTotalPrice]]"), ("15 Year", "[[15YrTotalPrice]]"),
+                                                ("20 Year", "[[20YrTotalPrice]]"), ("Warranty", "[[WarrantyIncluded]]"))):
+                table.cell(row, 0).text = label
+                table.cell(row, 1).text = key
+            doc.add_paragraph("[[PriceIncludesLanguage]]")
+            doc.add_paragraph("[[AdditionalLanguage]]")
+            doc.save(target)
+
+    profit = os.path.join(path, "Profit Summary.xlsm")
+    if not os.path.exists(profit):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Profit Summary"
+        for row in range(1, 42):
+            for col in "ABCDEFGHIJKLMNOPQRSTU":
+                ws[f"{col}{row}"] = None
+        ws["A1"] = "Customer"
+        wb.save(profit)
+    return path
+
+
+# ---- Installation ----
+# Every directory and state file the app keeps, relative to the install() root, so a
+# benchmark or test run never touches the checkout or the real share
+DIRS = {
+    "PROPOSALS_DIR": "proposals",
+    "CONTRACTS_DIR": "contracts",
+    "COMPLETED_DIR": "completed",
+    "DEADFILE_DIR": "dead",
+    "ARCHIVE_DIR": "archive",
+    "TEMPLATE_DIR": "doc_templates",
+    "JINJA_CACHE_DIR": "jinja_cache",
+}
+STATE_FILES = {
+    "PROPOSAL_INDEX_PATH": "proposal_index.json",
+    "MOVE_JOBS_PATH": "move_jobs.json",
+    "ROLLUPS_PATH": "rollups.json",
+    "SEARCH_INDEX_PATH": "search_index.json",
+    "TRACE_LOG_PATH": "traces.ndjson",
+}
+
+
+def install(work_dir, make_templates=True):
+    """
+    Point every stage directory and state file at `work_dir` and make the stand-ins
+    importable. Must run before pcs_proposal_web is imported.
+    """
+    for env, sub in DIRS.items():
+        os.environ[env] = os.path.join(work_dir, sub)
+        os.makedirs(os.environ[env], exist_ok=True)
+    for env, name in STATE_FILES.items():
+        os.environ[env] = os.path.join(work_dir, name)
+    os.environ["LIBREOFFICE_PATH"] = FAKE_SOFFICE
+    st = os.stat(FAKE_SOFFICE)
+    if not st.st_mode & stat.S_IXUSR:
+        os.chmod(FAKE_SOFFICE, st.st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    # Excel/Word automation libraries are Windows/macOS only; the stand-ins replace them.
+    sys.modules.setdefault("xlwings", fake_xlwings)
+    if "docx2pdf" not in sys.modules:
+        try:
+            import docx2pdf  # noqa: F401
+        except Exception:
+            sys.modules["docx2pdf"] = types.ModuleType("docx2pdf")
+            sys.modules["docx2pdf"].convert = _fake_docx2pdf_convert
+
+    if make_templates:
+        make_template_dir(os.environ["TEMPLATE_DIR"])
+    return DIRS
+
+
+def patch_app(app_module):
+    """Swap the imported app's Excel/LibreOffice backends for the stand-ins."""
+    global _app_module
+    _app_module = app_module
+    app_module.xw = fake_xlwings
+    app_module.LIBREOFFICE_PATH = FAKE_SOFFICE
+    return app_module
@@ -0,0 +1,22 @@
+"""
+gunicorn settings used by the Procfile.
+
+The app is preloaded so init_app() (template compilation, proposal index) runs once in
+the master and forked workers share it copy-on-write. Background threads can't cross a
+fork, so each worker starts its own in post_fork.
+"""
+import gc
+
+preload_app = True
+
+
+def when_ready(server):
+    # Everything built during preload lives for the life of the process. Freezing it keeps
+    # the collector from touching (and so un-sharing) those pages in every worker.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import pcs_proposal_web
+    pcs_proposal_web.start_background_services()
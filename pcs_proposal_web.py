@@ -10,12 +10,30 @@ COMPLETED_DIR  = os.environ.get("COMPLETED_DIR", "./completed")
 DEADFILE_DIR   = os.environ.get("DEADFILE_DIR", "./dead")
 TEMPLATE_DIR   = os.environ.get("TEMPLATE_DIR", "./templates")
 LIBREOFFICE_PATH = os.environ.get("LIBREOFFICE_PATH", "/usr/bin/soffice")
+# Packed archives of aged completed/dead proposals
+ARCHIVE_DIR    = os.environ.get("ARCHIVE_DIR", "./archive")
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+# Local (not on the share) JSON index mapping stable proposal IDs -> stage + folder
+PROPOSAL_INDEX_PATH = os.environ.get("PROPOSAL_INDEX_PATH", "./proposal_index.json")
+
+# Stage key -> directory. Order matters: legacy folder-name lookups prefer earlier stages.
+STAGE_DIRS = {
+    "proposals": PROPOSALS_DIR,
+    "contracts": CONTRACTS_DIR,
+    "completed": COMPLETED_DIR,
+    "dead": DEADFILE_DIR,
+}
+
+# Stage moves the workflow allows: destination -> stages a proposal may come from.
+# Proposals die or become contracts; only contracts get closed out as completed.
+STAGE_TRANSITIONS = {
+    "dead": {"proposals"},
+    "contracts": {"proposals"},
+    "completed": {"contracts"},
+}
+# Closed out: shown read-only and never regenerated from the edit form
+CLOSED_STAGES = {"completed", "dead"}
 
-print("PROPOSALS_DIR =", PROPOSALS_DIR)
-print("CONTRACTS_DIR =", CONTRACTS_DIR)
-print("COMPLETED_DIR =", COMPLETED_DIR)
-print("DEADFILE_DIR =", DEADFILE_DIR)
-print("TEMPLATE_DIR =", TEMPLATE_DIR)
 
 def create_proposal_from_fields(customer_name,
                                 street_address,
@@ -80,14 +98,16 @@ def create_proposal_from_fields(customer_name,
 
     # Folder and file names
     # Folder and file names
+    # With the local mirror active, files are written there and pushed to the share later
     if target_folder:
-        proposal_folder = target_folder
+        proposal_folder = mirror_write_path(target_folder)
         os.makedirs(proposal_folder, exist_ok=True)
         folder_name = os.path.basename(proposal_folder)
     else:
         folder_name = f"{customer_name} - {street_address}"
-        proposal_folder = os.path.join(PROPOSALS_DIR, folder_name)
+        proposal_folder = mirror_write_path(os.path.join(PROPOSALS_DIR, folder_name))
         os.makedirs(proposal_folder, exist_ok=True)
+        register_proposal_folder("proposals", proposal_folder)
 
     # Map roof type to suffix
     roof_suffix_map = {
@@ -104,14 +124,16 @@ def create_proposal_from_fields(customer_name,
     prefix = "Gaco S42 Proposal - " if product == "Gaco" else "Uniflex Proposal - "
     doc_template_name = f"{prefix}{roof_suffix}"
     doc_output_name = f"{prefix}{street_address}.docx"
-    doc_template_path = os.path.join(TEMPLATE_DIR, doc_template_name)
+    doc_template_path = mirror_read_path(os.path.join(TEMPLATE_DIR, doc_template_name))
     doc_output_path = os.path.join(proposal_folder, doc_output_name)
 
-    # Copy template and replace placeholders directly in the output file
-    shutil.copy(doc_template_path, doc_output_path)
-    doc = Document(doc_output_path)
-    replace_placeholder_blocks(doc, replacements)
-    doc.save(doc_output_path)
+    # Replace placeholders in memory; only the changed document part is written fresh
+    with timed("docx_load"):
+        doc = Document(doc_template_path)
+    with timed("docx_replace"):
+        replace_placeholder_blocks(doc, replacements)
+    with timed("docx_save"):
+        _save_docx_from_template(doc, doc_template_path, doc_output_path)
 
     # Convert Word doc to PDF and save in same folder (headless if possible)
     _convert_to_pdf(
@@ -122,18 +144,14 @@ def create_proposal_from_fields(customer_name,
     )
 
     # Copy Excel files
-    profit_template = os.path.join(TEMPLATE_DIR, "Profit Summary.xlsm")
+    profit_template = mirror_read_path(os.path.join(TEMPLATE_DIR, "Profit Summary.xlsm"))
     profit_output = os.path.join(proposal_folder, f"Profit Summary - {street_address}.xlsm")
-    shutil.copy(profit_template, profit_output)
+    with timed("xlsm_copy"):
+        shutil.copy(profit_template, profit_output)
 
     # Update Profit Summary.xlsm using central map
-    app_excel = xw.App(visible=False)
-    app_excel.display_alerts = False
-    app_excel.screen_updating = False
-    try:
-        wb_profit = app_excel.books.open(profit_output)
-        # Prepare default header-only map, then merge any provided mapped_data
-        default_header_map = {
+    with timed("xlsm_write"):
+        _write_profit_summary(profit_output, mapped_data, {
             "customer_name": customer_name,
             "street_address": street_address,
             "city": city,
@@ -148,21 +166,37 @@ def create_proposal_from_fields(customer_name,
             # "price_per_sq_10": None,
             # "labor_days": None,
             "proposal_note": "",
-        }
-        merged_map = dict(default_header_map)
+        })
+
+    mirror_touch(proposal_folder)
+    share_folder = target_folder or os.path.join(PROPOSALS_DIR, folder_name)
+    stage = _stage_of_folder(share_folder) if target_folder else "proposals"
+    if stage:
+        catalog_event("saved", proposal_id_for(stage, folder_name), stage, share_folder)
+    return folder_name
+
+
+def _write_profit_summary(profit_output, mapped_data, default_header_map):
+    """Open the copied Profit Summary in Excel and write the header map plus any mapped_data."""
+    app_excel = xw.App(visible=False)
+    app_excel.display_alerts = False
+    app_excel.screen_updating = False
+    try:
+        wb_profit = app_excel.books.open(profit_output)
+        # Merge any provided mapped_data over the default header-only map
+        record = ProposalRecord(default_header_map)
         if mapped_data:
-            merged_map.update({k: v for k, v in mapped_data.items() if k in EXCEL_CELL_MAP and EXCEL_CELL_MAP[k]})
-        write_fields_to_profit_summary(wb_profit, merged_map)
+            record.update({k: v for k, v in mapped_data.items() if k in EXCEL_CELL_MAP})
+        write_fields_to_profit_summary(wb_profit, record)
         wb_profit.save()
         wb_profit.close()
     finally:
         app_excel.quit()
-
-    return folder_name
-from flask import Flask, render_template, request, send_file, redirect, url_for, flash
+from flask import Flask, render_template, request, send_file, redirect, url_for, flash, jsonify, Response, g
 from docx2pdf import convert
 from docx import Document
 import pandas as pd
+import numpy as np
 import os
 import math
 import shutil
@@ -174,6 +208,31 @@ import subprocess
 import threading
 import shlex
 import sys
+import json
+import uuid
+import contextlib
+import errno
+import hashlib
+import queue
+import time
+import zipfile
+import zlib
+import struct
+import click
+import functools
+import bisect
+import collections
+import inspect
+import io
+import re
+import heapq
+import csv
+import contextvars
+import logging
+import logging.handlers
+from urllib.parse import quote
+from markupsafe import escape
+import jinja2
 
 # Flask app, List and Detail forms were saved and are working correctly at 8/28 2:24PM
 
@@ -187,6 +246,648 @@ STATIC_PATH = os.path.join(BASE_DIR, 'static')
 app = Flask(__name__, template_folder=TEMPLATE_PATH, static_folder=STATIC_PATH)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret-key")
 
+# ---- Template compilation cache ----
+# Compiled templates are kept as Jinja bytecode on disk so a new worker or a fresh launch of
+# the desktop app doesn't recompile proposal_details.html from source. Cache entries are
+# keyed on the template's path and mtime (and Jinja still verifies the source checksum), so
+# an edited template simply gets a new entry. The frozen app can also ship templates
+# precompiled to Python modules (flask compile-templates); those are used first when present.
+PRECOMPILED_TEMPLATES_DIR = os.environ.get("JINJA_PRECOMPILED_DIR") or (
+    os.path.join(BASE_DIR, "precompiled_templates") if getattr(sys, 'frozen', False) else "")
+TEMPLATE_WARMUP = os.environ.get("TEMPLATE_WARMUP", "1").strip().lower() not in ("0", "false", "no")
+
+
+def _default_jinja_cache_dir() -> str:
+    if not getattr(sys, 'frozen', False):
+        return os.path.join(BASE_DIR, ".jinja_cache")
+    # The bundle itself is read-only; use the per-user cache directory
+    if sys.platform == "darwin":
+        root = os.path.expanduser("~/Library/Caches")
+    elif os.name == "nt":
+        root = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    else:
+        root = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(root, "PCS Proposals", "jinja")
+
+
+class _MtimeBytecodeCache(jinja2.FileSystemBytecodeCache):
+    def get_cache_key(self, name, filename=None):
+        key = super().get_cache_key(name, filename)
+        if filename:
+            try:
+                key = f"{key}-{os.stat(filename).st_mtime_ns:x}"
+            except OSError:
+                pass
+        return key
+
+
+def _make_bytecode_cache():
+    import tempfile
+    for directory in (os.environ.get("JINJA_CACHE_DIR"), _default_jinja_cache_dir(),
+                      os.path.join(tempfile.gettempdir(), f"pcs-jinja-{os.getuid() if hasattr(os, 'getuid') else 0}")):
+        if not directory:
+            continue
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if os.access(directory, os.W_OK):
+                return _MtimeBytecodeCache(directory)
+        except OSError:
+            continue
+    print("Jinja bytecode cache disabled: no writable cache directory")
+    return None
+
+
+app.jinja_options = dict(app.jinja_options, bytecode_cache=_make_bytecode_cache())
+if PRECOMPILED_TEMPLATES_DIR and os.path.isdir(PRECOMPILED_TEMPLATES_DIR):
+    app.jinja_env.loader = jinja2.ChoiceLoader([
+        jinja2.ModuleLoader(PRECOMPILED_TEMPLATES_DIR),
+        app.jinja_env.loader,
+    ])
+
+# ---- Metrics (Prometheus text exposition at /metrics) ----
+# Plain in-process counters/histograms: one lock, a bisect per observation, no allocation
+# beyond the first time a label combination is seen. Each gunicorn worker keeps its own
+# numbers, so scrape the workers individually or aggregate in Prometheus.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_metrics_lock = threading.Lock()
+_metrics_registry = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _k, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _v), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self._values = {}
+        _metrics_registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with _metrics_lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _metrics_lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, k), v) for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self._callback = callback
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with _metrics_lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self._callback is not None:
+            try:
+                return [(self.name, "", self._callback())]
+            except Exception:
+                return []
+        return super().samples()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        _metrics_registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with _metrics_lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[idx] += 1
+            series[-1] += value
+
+    def samples(self):
+        with _metrics_lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        out = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                out.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, [("le", le)]), cumulative))
+            out.append((f"{self.name}_sum", _format_labels(self.labelnames, key), series[-1]))
+            out.append((f"{self.name}_count", _format_labels(self.labelnames, key), cumulative))
+        return out
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics_registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "pcs_stage_duration_seconds",
+    "Time spent in each stage of proposal generation, import, calculation and moves.",
+    ("stage", "outcome"),
+)
+REQUEST_SECONDS = Histogram(
+    "pcs_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge("pcs_http_requests_in_flight", "Requests currently being handled.")
+PDF_CONVERSIONS_IN_FLIGHT = Gauge("pcs_pdf_conversions_in_flight", "DOCX to PDF conversions queued or running.")
+
+
+@contextlib.contextmanager
+def timed(stage: str, **attrs):
+    """
+    Record the duration of a block in pcs_stage_duration_seconds{stage=...} and as a
+    trace span of the same name. Yields the span record so callers can add attributes.
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(stage, **attrs) as rec:
+            yield rec
+        outcome = "ok"
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, outcome=outcome)
+
+
+def instrumented(stage: str, trace: bool = True):
+    """
+    Decorator form of timed(). trace=False records only the histogram, for hot functions
+    where a span per call would flood the trace file.
+    """
+    def decorator(func):
+        if trace:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with timed(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        @functools.wraps(func)
+        def histogram_only(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, outcome=outcome)
+        return histogram_only
+    return decorator
+
+
+# ---- Request tracing ----
+# Every request and background job runs under a trace ID held in a contextvar. timed()
+# blocks open nested spans; each finished span is written as one JSON line to a rotating
+# file. Threads started for a request (PDF conversion) inherit the trace through
+# contextvars.copy_context(); move jobs start their own trace and remember the one that
+# queued them, so a slow PDF or copy can be tied back to the save that caused it.
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH", "./traces.ndjson")
+TRACE_LOG_MAX_BYTES = int(os.environ.get("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = int(os.environ.get("TRACE_LOG_BACKUPS", "5"))
+TRACE_VIEW_LIMIT = 50
+TRACE_VIEW_TAIL_BYTES = 2 * 1024 * 1024
+
+_current_span = contextvars.ContextVar("pcs_current_span", default=None)  # (trace_id, span_id)
+_trace_logger = logging.getLogger("pcs.trace")
+_trace_logger.propagate = False
+_trace_logger.setLevel(logging.INFO)
+_trace_handler_lock = threading.Lock()
+
+
+def _new_trace_id() -> str:
+    return os.urandom(8).hex()
+
+
+def current_trace_id():
+    current = _current_span.get()
+    return current[0] if current else None
+
+
+def _trace_handler_ready() -> bool:
+    """Attach the rotating file handler on first use, so importing the module writes nothing."""
+    if _trace_logger.handlers:
+        return True
+    with _trace_handler_lock:
+        if not _trace_logger.handlers:
+            try:
+                log_dir = os.path.dirname(os.path.abspath(TRACE_LOG_PATH))
+                os.makedirs(log_dir, exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    TRACE_LOG_PATH, maxBytes=TRACE_LOG_MAX_BYTES, backupCount=TRACE_LOG_BACKUPS,
+                    encoding="utf-8", delay=True)
+            except OSError as e:
+                print(f"Tracing disabled, cannot open {TRACE_LOG_PATH}: {e}")
+                _trace_logger.addHandler(logging.NullHandler())
+                return False
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _trace_logger.addHandler(handler)
+    return True
+
+
+def start_span(name: str, trace_id=None, **attrs):
+    """
+    Open a span under the current one (or a new trace). Returns (record, token); pass both
+    to end_span(). Use span() unless the start and end live in different callbacks.
+    """
+    parent = _current_span.get()
+    if trace_id is None:
+        trace_id = parent[0] if parent else _new_trace_id()
+    rec = {
+        "trace_id": trace_id,
+        "span_id": os.urandom(8).hex(),
+        "parent_id": parent[1] if parent and parent[0] == trace_id else None,
+        "name": name,
+        "start": time.time(),
+        "duration_ms": None,
+        "outcome": "ok",
+        "attrs": attrs,
+        "pid": os.getpid(),
+        "thread": threading.current_thread().name,
+        "_t0": time.perf_counter(),
+    }
+    token = _current_span.set((trace_id, rec["span_id"]))
+    return rec, token
+
+
+def end_span(rec: dict, token, exc=None):
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        pass  # ended from a different context than it started in; nothing to restore
+    rec["duration_ms"] = round((time.perf_counter() - rec.pop("_t0")) * 1000, 3)
+    if exc is not None:
+        rec["outcome"] = "error"
+        rec["error"] = f"{type(exc).__name__}: {exc}"
+    if TRACING_ENABLED and _trace_handler_ready():
+        try:
+            _trace_logger.info(json.dumps(rec, default=str))
+        except Exception as e:
+            print(f"Could not write trace span: {e}")
+
+
+@contextlib.contextmanager
+def span(name: str, trace_id=None, **attrs):
+    rec, token = start_span(name, trace_id=trace_id, **attrs)
+    exc = None
+    try:
+        yield rec
+    except BaseException as e:
+        exc = e
+        raise
+    finally:
+        end_span(rec, token, exc)
+
+
+def _read_trace_tail(max_bytes=TRACE_VIEW_TAIL_BYTES) -> list:
+    """Parse the newest spans from the trace file (and the previous file if just rotated)."""
+    lines = []
+    remaining = max_bytes
+    for path in (TRACE_LOG_PATH, f"{TRACE_LOG_PATH}.1"):
+        if remaining <= 0 or not os.path.exists(path):
+            continue
+        with open(path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell()
+            fh.seek(max(0, size - remaining))
+            chunk = fh.read()
+        remaining -= len(chunk)
+        chunk_lines = chunk.splitlines()
+        if size > len(chunk) and chunk_lines:
+            chunk_lines = chunk_lines[1:]  # first line is probably cut off
+        lines = chunk_lines + lines
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue
+    return spans
+
+
+def recent_traces(limit=TRACE_VIEW_LIMIT) -> list:
+    """Group the newest spans into traces, newest first, each with its spans in tree order."""
+    by_trace = collections.OrderedDict()
+    for rec in _read_trace_tail():
+        by_trace.setdefault(rec.get("trace_id"), []).append(rec)
+    traces = []
+    for trace_id, spans in reversed(by_trace.items()):
+        children = collections.defaultdict(list)
+        ids = {s["span_id"] for s in spans}
+        for s in spans:
+            parent = s.get("parent_id")
+            children[parent if parent in ids else None].append(s)
+        ordered = []
+
+        def walk(parent_id, depth):
+            for s in sorted(children.get(parent_id, ()), key=lambda x: x["start"]):
+                ordered.append(dict(s, depth=depth))
+                walk(s["span_id"], depth + 1)
+
+        walk(None, 0)
+        started = min(s["start"] for s in spans)
+        ended = max(s["start"] + (s.get("duration_ms") or 0) / 1000 for s in spans)
+        roots = children.get(None, [])
+        traces.append({
+            "trace_id": trace_id,
+            "name": roots[0]["name"] if roots else spans[0]["name"],
+            "started": started,
+            "started_at": datetime.datetime.fromtimestamp(started).strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_ms": round((ended - started) * 1000, 3),
+            "outcome": "error" if any(s.get("outcome") == "error" for s in spans) else "ok",
+            "spans": ordered,
+        })
+        if len(traces) >= limit:
+            break
+    return traces
+
+
+@app.before_request
+def _trace_start_request():
+    incoming = request.headers.get("X-Trace-Id", "")
+    trace_id = incoming if incoming.isalnum() and len(incoming) <= 64 else None
+    g.trace_span = start_span("request", trace_id=trace_id, method=request.method, path=request.path)
+
+
+@app.after_request
+def _trace_tag_response(response):
+    rec = g.get("trace_span")
+    if rec is not None:
+        rec[0]["attrs"]["status"] = response.status_code
+        response.headers["X-Trace-Id"] = rec[0]["trace_id"]
+    return response
+
+
+@app.teardown_request
+def _trace_end_request(exc=None):
+    rec = g.pop("trace_span", None)
+    if rec is not None:
+        if request.url_rule is not None:
+            rec[0]["attrs"]["route"] = request.url_rule.rule
+        end_span(rec[0], rec[1], exc)
+
+
+# ---- Admin pages ----
+# /admin/* (traces, profiler, mirror status) shows request paths, stacks and share paths,
+# so it answers only to requests from this machine unless ADMIN_REMOTE_ENABLED=1.
+ADMIN_REMOTE_ENABLED = os.environ.get("ADMIN_REMOTE_ENABLED", "").strip().lower() in ("1", "true", "yes")
+_LOOPBACK_ADDRS = ("127.0.0.1", "::1")
+
+
+@app.before_request
+def _admin_guard():
+    if not request.path.startswith("/admin/") or ADMIN_REMOTE_ENABLED:
+        return None
+    addr = request.remote_addr or ""
+    if addr in _LOOPBACK_ADDRS or addr.startswith("127.") or addr.startswith("::ffff:127."):
+        return None
+    return jsonify(error="admin pages are local-only; set ADMIN_REMOTE_ENABLED=1"), 403
+
+
+@app.route('/admin/traces')
+def trace_viewer():
+    try:
+        limit = max(1, min(int(request.args.get('limit', TRACE_VIEW_LIMIT)), 500))
+    except ValueError:
+        limit = TRACE_VIEW_LIMIT
+    traces = recent_traces(limit)
+    wanted = request.args.get('trace_id')
+    if wanted:
+        traces = [t for t in traces if t["trace_id"] == wanted]
+    if request.args.get('format') == 'json':
+        return jsonify(traces=traces)
+    return render_template('traces.html', traces=traces, trace_log_path=TRACE_LOG_PATH,
+                           tracing_enabled=TRACING_ENABLED)
+
+
+@app.before_request
+def _metrics_start_request():
+    g.request_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+
+@app.after_request
+def _metrics_record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                method=request.method, route=route, status=str(response.status_code))
+    return response
+
+
+@app.teardown_request
+def _metrics_end_request(exc=None):
+    REQUESTS_IN_FLIGHT.dec()
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+# ---- Sampling profiler (opt-in: PROFILER_ENABLED=1) ----
+# A background thread samples the stacks of in-flight request threads every
+# PROFILER_INTERVAL_SECONDS. Samples are kept as raw (code, line) tuples and only formatted
+# when a request turns out slower than PROFILER_THRESHOLD_SECONDS; fast requests are
+# discarded. /admin/profiler/start opens an on-demand window that samples every thread.
+# Profiles are kept in a bounded ring buffer as flamegraph-compatible collapsed stacks.
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "").strip().lower() in ("1", "true", "yes")
+PROFILER_THRESHOLD_SECONDS = float(os.environ.get("PROFILER_THRESHOLD_SECONDS", "5"))
+PROFILER_INTERVAL_SECONDS = float(os.environ.get("PROFILER_INTERVAL_SECONDS", "0.01"))
+PROFILER_RETAIN = int(os.environ.get("PROFILER_RETAIN", "50"))
+PROFILER_MAX_WINDOW_SECONDS = 300
+
+_profiler_lock = threading.Lock()
+_profiled_requests = {}   # thread ident -> {"label", "started", "stacks": Counter}
+_profiles = collections.deque(maxlen=PROFILER_RETAIN)
+_profile_window = None    # {"until", "started", "stacks": Counter} while an on-demand window is open
+_profiler_thread = None
+
+
+def _stack_key(frame):
+    key = []
+    while frame is not None:
+        key.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    key.reverse()
+    return tuple(key)
+
+
+def _collapse_stacks(stacks) -> dict:
+    """Turn Counter{stack key: n} into {"root;caller;leaf": n} (Brendan Gregg's collapsed format)."""
+    collapsed = collections.Counter()
+    for key, count in stacks.items():
+        names = []
+        for code, lineno in key:
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno})")
+        collapsed[";".join(names)] += count
+    return dict(collapsed)
+
+
+def _store_profile(kind: str, label: str, started: float, duration: float, stacks):
+    profile = {
+        "id": uuid.uuid4().hex[:10],
+        "kind": kind,
+        "label": label,
+        "started": started,
+        "duration": round(duration, 3),
+        "samples": sum(stacks.values()),
+        "stacks": _collapse_stacks(stacks),
+    }
+    with _profiler_lock:
+        _profiles.append(profile)
+    return profile
+
+
+def _profiler_loop():
+    global _profile_window
+    own_ident = threading.get_ident()
+    while True:
+        time.sleep(PROFILER_INTERVAL_SECONDS)
+        frames = sys._current_frames()
+        with _profiler_lock:
+            for ident, rec in _profiled_requests.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    rec["stacks"][_stack_key(frame)] += 1
+            window = _profile_window
+            if window is not None:
+                for ident, frame in frames.items():
+                    if ident != own_ident:
+                        window["stacks"][_stack_key(frame)] += 1
+        if window is not None and time.time() >= window["until"]:
+            with _profiler_lock:
+                _profile_window = None
+            _store_profile("window", window["label"], window["started"],
+                           time.time() - window["started"], window["stacks"])
+
+
+def _start_profiler_thread():
+    global _profiler_thread
+    with _profiler_lock:
+        if _profiler_thread is not None and _profiler_thread.is_alive():
+            return
+        _profiler_thread = threading.Thread(target=_profiler_loop, name="sampling-profiler", daemon=True)
+        _profiler_thread.start()
+
+
+@app.before_request
+def _profiler_start_request():
+    if not PROFILER_ENABLED:
+        return
+    _start_profiler_thread()
+    with _profiler_lock:
+        _profiled_requests[threading.get_ident()] = {
+            "label": f"{request.method} {request.path}",
+            "started": time.time(),
+            "stacks": collections.Counter(),
+        }
+
+
+@app.teardown_request
+def _profiler_end_request(exc=None):
+    if not PROFILER_ENABLED:
+        return
+    with _profiler_lock:
+        rec = _profiled_requests.pop(threading.get_ident(), None)
+    if rec is None:
+        return
+    duration = time.time() - rec["started"]
+    if duration >= PROFILER_THRESHOLD_SECONDS and rec["stacks"]:
+        _store_profile("slow_request", rec["label"], rec["started"], duration, rec["stacks"])
+
+
+def _profiler_guard():
+    if not PROFILER_ENABLED:
+        return jsonify(error="profiler disabled; set PROFILER_ENABLED=1"), 404
+    return None
+
+
+@app.route('/admin/profiler')
+def profiler_index():
+    denied = _profiler_guard()
+    if denied:
+        return denied
+    with _profiler_lock:
+        profiles = [{k: v for k, v in p.items() if k != "stacks"} for p in _profiles]
+        window = _profile_window
+    for p in profiles:
+        p["download_url"] = url_for('profiler_download', profile_id=p["id"])
+    return jsonify(
+        threshold_seconds=PROFILER_THRESHOLD_SECONDS,
+        interval_seconds=PROFILER_INTERVAL_SECONDS,
+        retain=PROFILER_RETAIN,
+        window_open_until=window["until"] if window else None,
+        profiles=list(reversed(profiles)),
+    )
+
+
+@app.route('/admin/profiler/start', methods=['POST'])
+def profiler_start_window():
+    """Sample every thread for ?seconds=N (default 30) and keep the result as one profile."""
+    global _profile_window
+    denied = _profiler_guard()
+    if denied:
+        return denied
+    try:
+        seconds = min(float(request.args.get('seconds', 30)), PROFILER_MAX_WINDOW_SECONDS)
+    except ValueError:
+        return jsonify(error="seconds must be a number"), 400
+    _start_profiler_thread()
+    now = time.time()
+    with _profiler_lock:
+        if _profile_window is not None:
+            return jsonify(error="a profiling window is already open", until=_profile_window["until"]), 409
+        _profile_window = {"label": f"on-demand {seconds:g}s", "started": now,
+                           "until": now + seconds, "stacks": collections.Counter()}
+    return jsonify(started=now, until=now + seconds), 202
+
+
+@app.route('/admin/profiler/<profile_id>.txt')
+def profiler_download(profile_id):
+    denied = _profiler_guard()
+    if denied:
+        return denied
+    with _profiler_lock:
+        profile = next((p for p in _profiles if p["id"] == profile_id), None)
+    if profile is None:
+        return "Unknown profile", 404
+    body = "".join(f"{stack} {count}\n" for stack, count in
+                   sorted(profile["stacks"].items(), key=lambda kv: -kv[1]))
+    return Response(body, mimetype="text/plain", headers={
+        "Content-Disposition": f"attachment; filename=profile-{profile_id}.collapsed.txt"})
+
+
 # ---- Jinja filters for number/currency blank if 0 ----
 @app.template_filter("num_blank0")
 def jinja_num_blank0(val, decimals=0):
@@ -203,224 +904,3333 @@ def jinja_num_blank0(val, decimals=0):
     except Exception:
         return ""
 
-@app.template_filter("currency_blank0")
-def jinja_currency_blank0(val, decimals=0):
-    s = jinja_num_blank0(val, decimals)
-    return f"${s}" if s else ""
+@app.template_filter("currency_blank0")
+def jinja_currency_blank0(val, decimals=0):
+    s = jinja_num_blank0(val, decimals)
+    return f"${s}" if s else ""
+
+# Excel-style rounding (ROUND_HALF_UP) to match Excel's ROUND behavior
+def excel_round(value, digits=0):
+    try:
+        q = Decimal('1') if digits == 0 else Decimal(f'1e-{digits}')
+        return float(Decimal(str(value)).quantize(q, rounding=ROUND_HALF_UP))
+    except Exception:
+        # Fallback: return original value if rounding fails
+        return value
+
+
+def _delete_old_artifacts(proposal_folder: str):
+    """Remove generated files before regenerating."""
+    proposal_folder = mirror_write_path(proposal_folder)
+    patterns = [
+        os.path.join(proposal_folder, "Gaco S42 Proposal - *.docx"),
+        os.path.join(proposal_folder, "Uniflex Proposal - *.docx"),
+        os.path.join(proposal_folder, "*.pdf"),
+        os.path.join(proposal_folder, "Profit Summary - *.xlsm"),
+    ]
+    for patt in patterns:
+        for path in glob.glob(patt):
+            try:
+                os.remove(path)
+            except Exception as e:
+                print(f"Warning: could not remove {path}: {e}")
+    mirror_touch(proposal_folder)
+
+# ---- DOCX template instantiation ----
+# A generated proposal differs from its template only in word/document.xml. Every other
+# member (styles, images, numbering, headers) is copied as its raw compressed bytes instead
+# of being inflated and deflated again, so a save costs one deflate of the document part.
+# The writer emits plain local headers, member data and a central directory; templates
+# that are encrypted or need zip64 go through zipfile and get recompressed instead.
+_ZIP_LOCAL = struct.Struct("<4s5H3L2H")
+_ZIP_CENTRAL = struct.Struct("<4s6H3L5H2L")
+_ZIP_END = struct.Struct("<4s4H2LH")
+_ZIP_LIMIT = 0xFFFFFFFF
+_ZIP_UTF8 = 0x800              # general purpose flag: name/comment are UTF-8
+_ZIP_DESCRIPTOR = 0x08         # general purpose flag: sizes follow the data
+
+
+def _zip_dos_time(date_time) -> tuple:
+    y, mo, d, h, mi, s = date_time
+    return (h << 11) | (mi << 5) | (s // 2), (max(y, 1980) - 1980) << 9 | (mo << 5) | d
+
+
+def _zip_name_bytes(name: str, flags: int) -> tuple:
+    if flags & _ZIP_UTF8:
+        return name.encode("utf-8"), flags
+    try:
+        return name.encode("cp437"), flags
+    except UnicodeEncodeError:
+        return name.encode("utf-8"), flags | _ZIP_UTF8
+
+
+def _zip_copy_is_safe(src: zipfile.ZipFile, src_path: str, overrides: dict) -> bool:
+    infos = src.infolist()
+    if len(infos) + len(overrides) >= 0xFFFF:
+        return False
+    if os.path.getsize(src_path) + sum(len(d) for d in overrides.values()) >= _ZIP_LIMIT:
+        return False
+    return not any(i.flag_bits & 0x1 or i.file_size >= _ZIP_LIMIT for i in infos)
+
+
+def _write_zip_with_overrides(src_path: str, dst_path: str, overrides: dict):
+    """
+    Write a copy of the zip at src_path to dst_path, replacing the members named in
+    `overrides` (name -> bytes). Untouched members keep their raw compressed bytes, order,
+    names, timestamps and attributes; replaced and added members are deflated.
+    """
+    with zipfile.ZipFile(src_path) as src:
+        if not _zip_copy_is_safe(src, src_path, overrides):
+            return _recompress_zip_with_overrides(src, dst_path, overrides)
+        with open(src_path, "rb") as fsrc, open(dst_path, "wb") as out:
+            central = []
+            names = set()
+            for info in src.infolist():
+                names.add(info.filename)
+                fsrc.seek(info.header_offset)
+                header = _ZIP_LOCAL.unpack(fsrc.read(_ZIP_LOCAL.size))
+                name_len, extra_len = header[9], header[10]
+                fsrc.seek(name_len, os.SEEK_CUR)
+                local_extra = fsrc.read(extra_len)
+                if info.filename in overrides:
+                    data = overrides[info.filename]
+                    deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                    raw = deflater.compress(data) + deflater.flush()
+                    crc, size, method = zlib.crc32(data), len(data), zipfile.ZIP_DEFLATED
+                    flags = info.flag_bits & _ZIP_UTF8
+                    version = max(info.extract_version, 20)
+                else:
+                    raw = fsrc.read(info.compress_size)
+                    crc, size, method = info.CRC, info.file_size, info.compress_type
+                    flags = info.flag_bits & ~_ZIP_DESCRIPTOR
+                    version = info.extract_version
+                central.append(_zip_write_member(
+                    out, info.orig_filename, info.date_time, flags, method, version, crc, size,
+                    raw, local_extra, info.extra, info.comment,
+                    (info.create_system << 8) | info.create_version, info.external_attr,
+                    info.internal_attr))
+            for name, data in overrides.items():
+                if name in names:
+                    continue
+                deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                raw = deflater.compress(data) + deflater.flush()
+                central.append(_zip_write_member(
+                    out, name, time.localtime()[:6], 0, zipfile.ZIP_DEFLATED, 20,
+                    zlib.crc32(data), len(data), raw, b"", b"", b"", 20, 0o600 << 16, 0))
+            cd_offset = out.tell()
+            for record in central:
+                out.write(record)
+            comment = src.comment[:0xFFFF]
+            out.write(_ZIP_END.pack(b"PK\x05\x06", 0, 0, len(central), len(central),
+                                    out.tell() - cd_offset, cd_offset, len(comment)))
+            out.write(comment)
+
+
+def _zip_write_member(out, name, date_time, flags, method, version, crc, size, raw,
+                      local_extra, central_extra, comment, made_by, external_attr,
+                      internal_attr) -> bytes:
+    """Write one local header + data to `out`; return its central directory record."""
+    offset = out.tell()
+    name_bytes, flags = _zip_name_bytes(name, flags)
+    dos_time, dos_date = _zip_dos_time(date_time)
+    out.write(_ZIP_LOCAL.pack(b"PK\x03\x04", version, flags, method, dos_time, dos_date,
+                              crc, len(raw), size, len(name_bytes), len(local_extra)))
+    out.write(name_bytes)
+    out.write(local_extra)
+    out.write(raw)
+    return _ZIP_CENTRAL.pack(
+        b"PK\x01\x02", made_by, version, flags, method, dos_time, dos_date, crc, len(raw),
+        size, len(name_bytes), len(central_extra), len(comment), 0, internal_attr,
+        external_attr, offset) + name_bytes + central_extra + comment
+
+
+def _recompress_zip_with_overrides(src: zipfile.ZipFile, dst_path: str, overrides: dict):
+    """zipfile-based fallback for archives the raw writer does not handle."""
+    with zipfile.ZipFile(dst_path, "w", allowZip64=True) as dst:
+        names = set()
+        for info in src.infolist():
+            names.add(info.filename)
+            new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+            new_info.compress_type = info.compress_type
+            new_info.external_attr = info.external_attr
+            new_info.create_system = info.create_system
+            new_info.comment = info.comment
+            if info.filename in overrides:
+                new_info.compress_type = zipfile.ZIP_DEFLATED
+                dst.writestr(new_info, overrides[info.filename])
+            else:
+                dst.writestr(new_info, src.read(info))
+        for name, data in overrides.items():
+            if name not in names:
+                dst.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)
+
+
+def _save_docx_from_template(doc, template_path: str, output_path: str):
+    """
+    Save a python-docx Document that was loaded from `template_path`. Only the main
+    document part (the one placeholders are replaced in) is re-serialized; styles, images,
+    numbering, headers etc. keep the template's compressed bytes.
+    """
+    main_part = doc.part.partname.lstrip("/")
+    _write_zip_with_overrides(template_path, output_path, {main_part: doc.part.blob})
+
+def _libreoffice_convert_sync(doc_path: str, outdir: str, timeout: int = 180):
+    """
+    Convert a DOCX to PDF using LibreOffice headless.
+    Blocks until done (or raises on failure).
+    """
+    os.makedirs(outdir, exist_ok=True)
+    cmd = [
+        LIBREOFFICE_PATH,
+        "--headless",
+        "--convert-to", "pdf",
+        "--outdir", outdir,
+        doc_path,
+    ]
+    try:
+        completed = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+            check=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"LibreOffice returned {completed.returncode}: {completed.stderr.strip()}")
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            f"LibreOffice not found at {LIBREOFFICE_PATH}. "
+            "Install it from libreoffice.org and update LIBREOFFICE_PATH if needed."
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"LibreOffice conversion failed: {e.stderr or e.stdout}")
+
+
+def _convert_to_pdf(doc_path: str, outdir: str, use_libreoffice: bool = True, async_mode: bool = True):
+    """
+    Dispatch PDF conversion. If LibreOffice is available and requested, use it;
+    otherwise fall back to docx2pdf (Word). Optionally run async so the UI returns immediately.
+    """
+    def _worker():
+        try:
+            with timed("pdf_convert"):
+                if use_libreoffice and os.path.exists(LIBREOFFICE_PATH):
+                    _libreoffice_convert_sync(doc_path, outdir)
+                else:
+                    # Fallback to Word/docx2pdf (may pop Word)
+                    convert(doc_path, outdir)
+        except Exception as e:
+            print(f"PDF conversion failed: {e}")
+        finally:
+            PDF_CONVERSIONS_IN_FLIGHT.dec()
+            mirror_touch(outdir)
+
+    PDF_CONVERSIONS_IN_FLIGHT.inc()
+    if async_mode:
+        # Run in a copy of the current context so the conversion span joins the request's trace
+        threading.Thread(target=contextvars.copy_context().run, args=(_worker,), daemon=True).start()
+    else:
+        _worker()
+
+# ---- Stable proposal IDs & stage index ----
+# Each proposal folder carries a small ID file so it can be found again after it moves
+# between stages. The index (id -> stage + folder name) lives on local disk, so resolving
+# an ID is a dict lookup and never has to probe the network share.
+PROPOSAL_ID_FILE = ".pcs_id"
+
+_index_lock = threading.RLock()
+_proposal_index = {}      # id -> {"stage": ..., "folder": ...}
+_folder_ids = {}          # (stage, folder name) -> id
+_index_mtime_ns = None    # mtime of PROPOSAL_INDEX_PATH when last loaded/saved
+
+try:
+    import fcntl  # POSIX only; the desktop app runs single-process so no lock is needed there
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Inter-process lock so several gunicorn workers don't clobber a shared state file."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _new_proposal_id():
+    return uuid.uuid4().hex[:12]
+
+
+def _read_folder_id(folder_path: str):
+    try:
+        with open(os.path.join(folder_path, PROPOSAL_ID_FILE), "r", encoding="utf-8") as fh:
+            pid = fh.read().strip()
+        return pid or None
+    except OSError:
+        return None
+
+
+def _assign_folder_id(folder_path: str) -> str:
+    """Return the ID stored in the folder, writing a new one if it has none."""
+    pid = _read_folder_id(folder_path)
+    if pid:
+        return pid
+    pid = _new_proposal_id()
+    try:
+        with open(os.path.join(folder_path, PROPOSAL_ID_FILE), "w", encoding="utf-8") as fh:
+            fh.write(pid)
+    except OSError as e:
+        print(f"Warning: could not write proposal id in {folder_path}: {e}")
+    return pid
+
+
+def _set_index_entries(entries: dict):
+    global _proposal_index, _folder_ids
+    _proposal_index = entries
+    _folder_ids = {(e["stage"], e["folder"]): pid for pid, e in entries.items()}
+
+
+def _load_index_file_locked():
+    """(Re)load the index from disk if another process changed it. Caller holds _index_lock."""
+    global _index_mtime_ns
+    try:
+        mtime_ns = os.stat(PROPOSAL_INDEX_PATH).st_mtime_ns
+    except OSError:
+        return False
+    if mtime_ns == _index_mtime_ns:
+        return True
+    try:
+        with open(PROPOSAL_INDEX_PATH, "r", encoding="utf-8") as fh:
+            entries = json.load(fh).get("proposals", {})
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not read proposal index {PROPOSAL_INDEX_PATH}: {e}")
+        return False
+    _set_index_entries(entries)
+    _index_mtime_ns = mtime_ns
+    return True
+
+
+def _save_index_locked():
+    """Atomically replace the index file (write temp file, then os.replace)."""
+    global _index_mtime_ns
+    index_dir = os.path.dirname(os.path.abspath(PROPOSAL_INDEX_PATH))
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_path = f"{PROPOSAL_INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"version": 1, "proposals": _proposal_index}, fh, indent=1, sort_keys=True)
+    os.replace(tmp_path, PROPOSAL_INDEX_PATH)
+    _index_mtime_ns = os.stat(PROPOSAL_INDEX_PATH).st_mtime_ns
+
+
+def _update_index(mutator):
+    """Apply `mutator(entries)` to the freshest on-disk index and persist it in one step."""
+    with _index_lock, _file_lock(PROPOSAL_INDEX_PATH):
+        _load_index_file_locked()
+        entries = dict(_proposal_index)
+        mutator(entries)
+        _set_index_entries(entries)
+        _save_index_locked()
+
+
+def rebuild_proposal_index():
+    """Scan every stage directory once and rebuild the index from the folders' ID files."""
+    entries = {}
+    for stage, stage_dir in STAGE_DIRS.items():
+        try:
+            names = os.listdir(stage_dir)
+        except OSError:
+            continue
+        for name in names:
+            folder_path = os.path.join(stage_dir, name)
+            if not os.path.isdir(folder_path):
+                continue
+            pid = _assign_folder_id(folder_path)
+            if pid in entries:
+                # A copied folder kept its ID file; give the copy its own identity.
+                pid = _new_proposal_id()
+                with open(os.path.join(folder_path, PROPOSAL_ID_FILE), "w", encoding="utf-8") as fh:
+                    fh.write(pid)
+            entries[pid] = {"stage": stage, "folder": name}
+
+    def _replace(current):
+        # Archived proposals have no folder on disk; keep their entries
+        archived = {pid: e for pid, e in current.items() if e.get("archive") and pid not in entries}
+        current.clear()
+        current.update(entries)
+        current.update(archived)
+
+    _update_index(_replace)
+    return len(entries)
+
+
+def _ensure_index_loaded():
+    with _index_lock:
+        if _load_index_file_locked():
+            return
+    rebuild_proposal_index()
+
+
+def register_proposal_folder(stage: str, folder_path: str) -> str:
+    """Give a (new) folder an ID and record it in the index. Returns the ID."""
+    pid = _assign_folder_id(folder_path)
+    entry = {"stage": stage, "folder": os.path.basename(folder_path)}
+    _ensure_index_loaded()
+
+    def _add(entries):
+        entries[pid] = entry
+
+    _update_index(_add)
+    return pid
+
+
+def proposal_id_for(stage: str, folder_name: str):
+    """ID for a folder already known to the index, else None (no filesystem access)."""
+    _ensure_index_loaded()
+    with _index_lock:
+        return _folder_ids.get((stage, folder_name))
+
+
+def stage_path(stage: str, folder_name: str) -> str:
+    return os.path.join(STAGE_DIRS[stage], folder_name)
+
+
+def resolve_proposal(key: str, restore: bool = True):
+    """
+    Resolve a proposal ID (or a legacy folder name) to (id, stage, folder_path).
+    Archived proposals are unpacked back into their stage directory first unless
+    restore=False. Returns None if it cannot be found in any stage directory.
+    """
+    _ensure_index_loaded()
+    key = os.path.basename(key or "")
+    with _index_lock:
+        pid = key if key in _proposal_index else None
+        if pid is None:
+            # Legacy URL built from the folder name
+            pid = next((_folder_ids[(stage, key)] for stage in STAGE_DIRS if (stage, key) in _folder_ids), None)
+        entry = _proposal_index.get(pid) if pid else None
+    if entry:
+        if entry.get("archive") and restore:
+            restore_archived_proposal(pid)
+        return pid, entry["stage"], stage_path(entry["stage"], entry["folder"])
+    # Not indexed yet (e.g. created directly on the share): probe like the old code did
+    for stage in STAGE_DIRS:
+        folder_path = stage_path(stage, key)
+        if os.path.isdir(folder_path):
+            return register_proposal_folder(stage, folder_path), stage, folder_path
+    return None
+
+
+def _plan_move(pid: str, dest_stage: str):
+    """Validate a stage move. Returns (id, folder_name, src_path, dest_path) or raises."""
+    if dest_stage not in STAGE_DIRS:
+        raise KeyError(f"Unknown stage: {dest_stage}")
+    resolved = resolve_proposal(pid)
+    if not resolved:
+        raise FileNotFoundError(f"Unknown proposal: {pid}")
+    pid, src_stage, src_path = resolved
+    folder_name = os.path.basename(src_path)
+    dest_path = stage_path(dest_stage, folder_name)
+    if src_stage == dest_stage:
+        raise FileExistsError(f"Proposal '{folder_name}' is already in {dest_stage}.")
+    if src_stage not in STAGE_TRANSITIONS.get(dest_stage, ()):
+        allowed = ", ".join(sorted(STAGE_TRANSITIONS.get(dest_stage, ())))
+        reason = f"only {allowed} can move there" if allowed else "nothing can move there"
+        raise ValueError(f"Cannot move '{folder_name}' from {src_stage} to {dest_stage}: {reason}.")
+    if not os.path.exists(src_path):
+        raise FileNotFoundError(f"Source folder '{src_path}' does not exist.")
+    if os.path.exists(dest_path):
+        raise FileExistsError(f"Target folder '{dest_path}' already exists.")
+    with _move_jobs_lock:
+        for job in _move_jobs.values():
+            if job["proposal_id"] == pid and job["status"] in ("queued", "running"):
+                raise FileExistsError(f"Proposal '{folder_name}' is already being moved (job {job['id']}).")
+    return pid, folder_name, src_path, dest_path
+
+
+def _same_device(src_path: str, dest_dir: str) -> bool:
+    try:
+        os.makedirs(dest_dir, exist_ok=True)
+        return os.stat(src_path).st_dev == os.stat(dest_dir).st_dev
+    except OSError:
+        return False
+
+
+def move_proposals(ids, dest_stage: str):
+    """
+    Move many proposals to `dest_stage` in one operation.
+
+    Folders on the same device as the destination are moved with an atomic os.rename and
+    the index is written once for the whole batch. Cross-device folders are queued as
+    background copy jobs (see _run_move_job). Returns one result dict per requested ID.
+    """
+    results = []
+    renames = []
+    for pid in ids:
+        try:
+            pid, folder_name, src_path, dest_path = _plan_move(pid, dest_stage)
+        except (KeyError, ValueError, FileNotFoundError, FileExistsError) as e:
+            results.append({"id": pid, "status": "error", "error": str(e).strip("'\"")})
+            continue
+        result = {"id": pid, "folder": folder_name, "stage": dest_stage}
+        results.append(result)
+        # Local writes not yet on the share must travel with the folder
+        mirror_flush(src_path)
+        if _same_device(src_path, STAGE_DIRS[dest_stage]):
+            renames.append((result, src_path, dest_path))
+        else:
+            result.update(status="queued", job_id=_queue_move_job(pid, folder_name, src_path, dest_path, dest_stage))
+
+    if renames:
+        def _rename_all(entries):
+            for result, src_path, dest_path in renames:
+                try:
+                    os.rename(src_path, dest_path)
+                except OSError as e:
+                    if e.errno == errno.EXDEV:
+                        # st_dev can agree across some network mounts; fall back to a copy job
+                        result.update(status="queued", job_id=_queue_move_job(
+                            result["id"], result["folder"], src_path, dest_path, result["stage"]))
+                    else:
+                        result.update(status="error", error=str(e))
+                    continue
+                entries[result["id"]] = {"stage": result["stage"], "folder": result["folder"]}
+                result["status"] = "moved"
+                mirror_rename(src_path, dest_path)
+
+        with timed("folder_move"):
+            _update_index(_rename_all)
+        for result, _src_path, dest_path in renames:
+            if result.get("status") == "moved":
+                catalog_event("moved", result["id"], result["stage"], dest_path)
+    return results
+
+
+def move_proposal(pid: str, dest_stage: str) -> dict:
+    """Single-proposal convenience wrapper around move_proposals()."""
+    return move_proposals([pid], dest_stage)[0]
+
+
+# ---- Catalog events ----
+# Views derived from the proposals (rollups, search, ...) subscribe here instead of being
+# called from every code path that changes a proposal. "saved" fires once a proposal's files
+# have been (re)generated, "moved" once its folder is in the new stage. Listeners run in the
+# thread that made the change; a failing listener is reported and never fails the change.
+_catalog_listeners = []
+
+
+def on_catalog_event(func):
+    """Decorator: register func(kind, pid, stage, folder_path)."""
+    _catalog_listeners.append(func)
+    return func
+
+
+def catalog_event(kind: str, pid, stage: str, folder_path: str):
+    for listener in _catalog_listeners:
+        try:
+            listener(kind, pid, stage, folder_path)
+        except Exception as e:
+            print(f"Catalog listener {listener.__name__} failed on {kind} {pid}: {e}")
+
+
+def _stage_of_folder(folder_path: str):
+    """Stage whose directory holds folder_path (a share path), or None."""
+    parent = os.path.abspath(os.path.dirname(folder_path))
+    for stage, stage_dir in STAGE_DIRS.items():
+        if os.path.abspath(stage_dir) == parent:
+            return stage
+    return None
+
+
+# ---- Background cross-device move jobs ----
+# A job copies the folder into a hidden temp folder next to the destination, verifies every
+# file by size and SHA-256, renames the temp folder into place, updates the index and only
+# then deletes the source. Files already copied with a matching size/mtime are skipped, so a
+# job interrupted by a restart picks up where it left off.
+MOVE_JOBS_PATH = os.environ.get("MOVE_JOBS_PATH", "./move_jobs.json")
+
+_move_jobs_lock = threading.Lock()
+_move_jobs = {}           # job id -> job dict (this process)
+_move_queue = queue.Queue()
+_move_worker = None
+
+
+def _write_move_jobs_locked(jobs: dict):
+    """Replace the shared jobs file; the caller holds _file_lock(MOVE_JOBS_PATH)."""
+    # Keep the file small: drop finished jobs beyond the most recent 200
+    finished = sorted((j for j in jobs.values() if j["status"] in ("done", "failed")),
+                      key=lambda j: j.get("updated", 0))
+    for old in finished[:-200]:
+        jobs.pop(old["id"], None)
+    tmp_path = f"{MOVE_JOBS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"jobs": jobs}, fh, indent=1)
+    os.replace(tmp_path, MOVE_JOBS_PATH)
+
+
+def _persist_move_job(job: dict):
+    """Merge this job into the shared jobs file (other workers may own other jobs)."""
+    with _file_lock(MOVE_JOBS_PATH):
+        jobs = _load_move_jobs()
+        jobs[job["id"]] = dict(job)
+        _write_move_jobs_locked(jobs)
+
+
+def _load_move_jobs() -> dict:
+    try:
+        with open(MOVE_JOBS_PATH, "r", encoding="utf-8") as fh:
+            return json.load(fh).get("jobs", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _set_job(job: dict, **changes):
+    with _move_jobs_lock:
+        job.update(changes, updated=time.time())
+    _persist_move_job(job)
+
+
+def _queue_move_job(pid, folder_name, src_path, dest_path, dest_stage) -> str:
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "proposal_id": pid,
+        "folder": folder_name,
+        "src_path": src_path,
+        "dest_path": dest_path,
+        "stage": dest_stage,
+        "status": "queued",
+        "owner_pid": os.getpid(),
+        "files_total": 0,
+        "files_done": 0,
+        "bytes_total": 0,
+        "bytes_done": 0,
+        "error": None,
+        "queued_by_trace": current_trace_id(),
+        "trace_id": None,
+        "created": time.time(),
+        "updated": time.time(),
+    }
+    with _move_jobs_lock:
+        _move_jobs[job["id"]] = job
+    _persist_move_job(job)
+    _start_move_worker()
+    _move_queue.put(job["id"])
+    return job["id"]
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _run_move_job(job: dict):
+    src_path, dest_path = job["src_path"], job["dest_path"]
+    tmp_root = os.path.join(os.path.dirname(dest_path), f".{job['folder']}.moving-{job['id']}")
+    try:
+        _copy_move_job(job, src_path, dest_path, tmp_root)
+    except Exception:
+        # A failed job is not retried: don't leave its partial copy in the destination stage.
+        # (A process that dies mid-copy keeps tmp_root, and the resumed job picks it up.)
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        raise
+    shutil.rmtree(src_path, ignore_errors=True)
+    mirror_rename(src_path, dest_path)
+    catalog_event("moved", job["proposal_id"], job["stage"], dest_path)
+    _set_job(job, status="done")
+
+
+def _copy_move_job(job: dict, src_path: str, dest_path: str, tmp_root: str):
+    """Copy and verify src_path into tmp_root, then rename it to dest_path and update the index."""
+    files = []
+    for root, _dirs, names in os.walk(src_path):
+        os.makedirs(os.path.join(tmp_root, os.path.relpath(root, src_path)), exist_ok=True)
+        for name in names:
+            src_file = os.path.join(root, name)
+            files.append((src_file, os.path.relpath(src_file, src_path), os.path.getsize(src_file)))
+    _set_job(job, status="running", files_total=len(files), bytes_total=sum(f[2] for f in files),
+             files_done=0, bytes_done=0)
+
+    for src_file, rel, size in files:
+        dest_file = os.path.join(tmp_root, rel)
+        os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+        src_stat = os.stat(src_file)
+        try:
+            dest_stat = os.stat(dest_file)
+            already_copied = (dest_stat.st_size == src_stat.st_size
+                              and int(dest_stat.st_mtime) == int(src_stat.st_mtime))
+        except OSError:
+            already_copied = False
+        if not already_copied:
+            shutil.copy2(src_file, dest_file + ".part")
+            os.replace(dest_file + ".part", dest_file)
+        if _file_sha256(src_file) != _file_sha256(dest_file):
+            os.remove(dest_file)
+            raise IOError(f"Checksum mismatch copying {rel}")
+        with _move_jobs_lock:
+            job["files_done"] += 1
+            job["bytes_done"] += size
+
+    # Nothing else may have touched the temp copy: it must hold exactly the verified files
+    expected = {rel: size for _src_file, rel, size in files}
+    found = {}
+    for root, _dirs, names in os.walk(tmp_root):
+        for name in names:
+            full = os.path.join(root, name)
+            found[os.path.relpath(full, tmp_root)] = os.path.getsize(full)
+    if found != expected:
+        missing = sorted(set(expected) - set(found))
+        raise IOError(f"Copy of '{job['folder']}' changed before it was moved into place"
+                      + (f" (missing {', '.join(missing[:5])})" if missing else ""))
+    if os.path.exists(dest_path):
+        raise FileExistsError(f"Target folder '{dest_path}' already exists.")
+
+    def _commit(entries):
+        os.rename(tmp_root, dest_path)
+        entries[job["proposal_id"]] = {"stage": job["stage"], "folder": job["folder"]}
+
+    _update_index(_commit)
+
+
+def _move_worker_loop():
+    while True:
+        job_id = _move_queue.get()
+        with _move_jobs_lock:
+            job = _move_jobs.get(job_id)
+        if job is None:
+            continue
+        try:
+            with timed("move_job", trace_id=_new_trace_id(), job_id=job_id,
+                       folder=job["folder"], queued_by_trace=job.get("queued_by_trace")) as rec:
+                _set_job(job, trace_id=rec["trace_id"])
+                _run_move_job(job)
+        except Exception as e:
+            print(f"Move job {job_id} failed: {e}")
+            _set_job(job, status="failed", error=str(e))
+
+
+def _start_move_worker():
+    global _move_worker
+    with _move_jobs_lock:
+        if _move_worker is not None and _move_worker.is_alive():
+            return
+        _move_worker = threading.Thread(target=_move_worker_loop, name="move-jobs", daemon=True)
+        _move_worker.start()
+
+
+MOVE_JOBS_QUEUED = Gauge("pcs_move_jobs_queued", "Cross-device move jobs waiting for the worker.",
+                         callback=lambda: _move_queue.qsize())
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, ValueError, TypeError):
+        return False
+    return True
+
+
+def resume_move_jobs():
+    """
+    Re-queue unfinished jobs whose owning process is gone (e.g. after a restart). Every
+    gunicorn worker calls this at startup, so the claim is made under the jobs file lock:
+    a job is taken over by exactly one live process.
+    """
+    claimed = []
+    with _file_lock(MOVE_JOBS_PATH):
+        jobs = _load_move_jobs()
+        for job in jobs.values():
+            if job["status"] not in ("queued", "running"):
+                continue
+            if job.get("owner_pid") != os.getpid() and _pid_alive(job.get("owner_pid")):
+                continue
+            with _move_jobs_lock:
+                if job["id"] in _move_jobs:
+                    continue
+                job.update(owner_pid=os.getpid(), status="queued", updated=time.time())
+                _move_jobs[job["id"]] = job
+            claimed.append(job["id"])
+        if claimed:
+            _write_move_jobs_locked(jobs)
+    for job_id in claimed:
+        _start_move_worker()
+        _move_queue.put(job_id)
+    return len(claimed)
+
+
+def get_move_job(job_id: str):
+    with _move_jobs_lock:
+        job = _move_jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+    return _load_move_jobs().get(job_id)
+
+# ---- Background document generation ----
+# With BACKGROUND_GENERATION=1 (the desktop server turns it on) a save or create returns at
+# once and the Word/Excel/PDF regeneration runs on a small worker pool, so one long Excel
+# session doesn't hold up every other page. Excel automation is effectively single-instance,
+# hence one worker by default. Jobs run in a copy of the request's context so their spans
+# land in the same trace.
+BACKGROUND_GENERATION = os.environ.get("BACKGROUND_GENERATION", "").strip().lower() in ("1", "true", "yes")
+GENERATION_WORKERS = max(1, int(os.environ.get("GENERATION_WORKERS", "1")))
+GENERATION_JOBS_RETAIN = 200
+
+_generation_lock = threading.Lock()
+_generation_executor = None
+_generation_jobs = collections.OrderedDict()  # job id -> status dict, newest last
+GENERATION_JOBS_PENDING = Gauge("pcs_generation_jobs_pending", "Background generation jobs queued or running.",
+                                callback=lambda: sum(1 for j in list(_generation_jobs.values())
+                                                     if j["status"] in ("queued", "running")))
+
+
+def _generation_thread_init():
+    # xlwings/docx2pdf talk to Office over COM on Windows, which needs per-thread init
+    try:
+        import pythoncom
+        pythoncom.CoInitialize()
+    except ImportError:
+        pass
+
+
+def _generation_pool():
+    global _generation_executor
+    with _generation_lock:
+        if _generation_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _generation_executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS,
+                                                      thread_name_prefix="generation",
+                                                      initializer=_generation_thread_init)
+        return _generation_executor
+
+
+def submit_generation(folder_name: str, func, *args, **kwargs) -> str:
+    """Run func(*args, **kwargs) on the generation pool; returns a job id."""
+    job = {"id": uuid.uuid4().hex[:12], "folder": folder_name, "status": "queued", "error": None,
+           "trace_id": current_trace_id(), "created": time.time(), "updated": time.time()}
+    with _generation_lock:
+        _generation_jobs[job["id"]] = job
+        while len(_generation_jobs) > GENERATION_JOBS_RETAIN:
+            _generation_jobs.popitem(last=False)
+
+    def _run():
+        job.update(status="running", updated=time.time())
+        try:
+            func(*args, **kwargs)
+            job.update(status="done", updated=time.time())
+        except Exception as e:
+            print(f"Background generation for {folder_name} failed: {e}")
+            job.update(status="failed", error=str(e), updated=time.time())
+
+    _generation_pool().submit(contextvars.copy_context().run, _run)
+    return job["id"]
+
+
+def get_generation_job(job_id: str):
+    with _generation_lock:
+        job = _generation_jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def generating_folders() -> set:
+    with _generation_lock:
+        return {j["folder"] for j in _generation_jobs.values() if j["status"] in ("queued", "running")}
+
+
+def shutdown_generation(timeout: float = 300) -> bool:
+    """Stop taking jobs and wait up to `timeout` seconds for running ones. True if all finished."""
+    global _generation_executor
+    with _generation_lock:
+        executor, _generation_executor = _generation_executor, None
+    if executor is None:
+        return True
+    executor.shutdown(wait=False, cancel_futures=False)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if not generating_folders():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+@app.route('/api/generation-jobs/<job_id>')
+def generation_job_status(job_id):
+    job = get_generation_job(job_id)
+    if job is None:
+        return jsonify(error="unknown job"), 404
+    return jsonify(job)
+
+
+# ---- Local mirror of the share (write-back cache) ----
+# With MIRROR_DIR set, the hot stage directories (MIRROR_STAGES) and TEMPLATE_DIR are mirrored
+# to local disk. Listings, Excel imports, downloads and template reads come from the mirror,
+# and generated files are written there first; a background thread pushes them to the share
+# and pulls edits made directly on the share. manifest.json records, per file, the share's
+# size/mtime and SHA-256 as of the last sync plus the local size/mtime, so both sides'
+# changes can be told apart. Local deletes become tombstones until the share copy is removed.
+# When both sides changed a file the share wins and the local version is kept under
+# MIRROR_DIR/conflicts, as are unpushed files of a folder that was moved to another stage on
+# the share (pushing them would recreate the folder under its old stage). One process owns
+# the mirror: start_mirror_sync() takes an exclusive flock on MIRROR_DIR/owner.lock for the
+# life of the process. Any other process (further gunicorn workers, CLI commands) finds it
+# taken and reads and writes the share directly, as if MIRROR_DIR were unset; the share-side
+# changes it makes are pulled like anyone else's.
+MIRROR_DIR = os.environ.get("MIRROR_DIR", "").strip()
+MIRROR_STAGES = tuple(s.strip() for s in os.environ.get("MIRROR_STAGES", "proposals,contracts").split(",")
+                      if s.strip() in STAGE_DIRS)
+MIRROR_SYNC_INTERVAL = float(os.environ.get("MIRROR_SYNC_INTERVAL", "30"))
+MIRROR_DEEP_EVERY = max(1, int(os.environ.get("MIRROR_DEEP_EVERY", "10")))  # passes between full rescans
+MIRROR_SETTLE_SECONDS = 2.0   # files written more recently than this are left for the next pass
+_MIRROR_TEMPLATES = "_templates"
+_MIRROR_PART = ".mirror-part"
+
+_mirror_lock = threading.RLock()       # manifest data and the dirty set
+_mirror_sync_lock = threading.Lock()   # one push/pull touching files at a time
+_mirror_manifest = None
+_mirror_dirty = {}                     # folder key -> last touch time
+_mirror_wakeup = threading.Event()
+_mirror_thread = None
+_mirror_last_sync = None
+_mirror_owner = None                   # (pid, MIRROR_DIR, locked file) while this process owns the mirror
+
+MIRROR_FILES_SYNCED = Counter("pcs_mirror_files_synced_total", "Files copied or deleted by the mirror sync.",
+                              ("direction",))
+MIRROR_CONFLICTS = Counter("pcs_mirror_conflicts_total", "Files changed both locally and on the share.")
+MIRROR_DIRTY_FOLDERS = Gauge("pcs_mirror_dirty_folders", "Mirrored folders with local changes not yet pushed.",
+                             callback=lambda: len(_mirror_dirty))
+
+
+def _mirror_roots() -> dict:
+    """Mirror subdirectory -> share directory, for everything that is mirrored."""
+    roots = {stage: STAGE_DIRS[stage] for stage in MIRROR_STAGES}
+    roots[_MIRROR_TEMPLATES] = TEMPLATE_DIR
+    return roots
+
+
+def _mirror_key(path: str):
+    """'stage/folder/file'-style key for a share or mirror path, or None if it isn't mirrored."""
+    path = os.path.abspath(path)
+    if MIRROR_DIR:
+        mirror_root = os.path.abspath(MIRROR_DIR)
+        if path.startswith(mirror_root + os.sep):
+            key = os.path.relpath(path, mirror_root).replace(os.sep, "/")
+            return key if key.split("/", 1)[0] in _mirror_roots() else None
+    for root_key, share_root in _mirror_roots().items():
+        share_root = os.path.abspath(share_root)
+        if path == share_root:
+            return root_key
+        if path.startswith(share_root + os.sep):
+            return f"{root_key}/" + os.path.relpath(path, share_root).replace(os.sep, "/")
+    return None
+
+
+def _mirror_local(key: str) -> str:
+    return os.path.join(MIRROR_DIR, *key.split("/"))
+
+
+def _mirror_share(key: str) -> str:
+    root_key, _, rest = key.partition("/")
+    share_root = _mirror_roots()[root_key]
+    return os.path.join(share_root, *rest.split("/")) if rest else share_root
+
+
+def _mirror_folder_key(key: str) -> str:
+    """The synced unit a key belongs to: 'stage/folder', or the templates root."""
+    parts = key.split("/")
+    return parts[0] if parts[0] == _MIRROR_TEMPLATES else "/".join(parts[:2])
+
+
+def _load_mirror_manifest():
+    global _mirror_manifest
+    with _mirror_lock:
+        if _mirror_manifest is not None:
+            return _mirror_manifest
+        try:
+            with open(os.path.join(MIRROR_DIR, "manifest.json"), "r", encoding="utf-8") as fh:
+                manifest = json.load(fh)
+        except (OSError, ValueError):
+            manifest = {}
+        manifest.setdefault("version", 1)
+        manifest.setdefault("initialized", False)
+        manifest.setdefault("files", {})
+        manifest.setdefault("folders", {})
+        manifest.setdefault("conflicts", [])
+        _mirror_dirty.update({k: 0.0 for k in manifest.pop("dirty", [])})
+        _mirror_manifest = manifest
+        return manifest
+
+
+def _save_mirror_manifest():
+    with _mirror_lock:
+        # Copies: the sync thread may be updating entries while a request saves
+        manifest = dict(_mirror_manifest, files=dict(_mirror_manifest["files"]),
+                        folders=dict(_mirror_manifest["folders"]), dirty=sorted(_mirror_dirty))
+        os.makedirs(MIRROR_DIR, exist_ok=True)
+        path = os.path.join(MIRROR_DIR, "manifest.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def _claim_mirror() -> bool:
+    """Own MIRROR_DIR for the life of this process; False if another process already does."""
+    global _mirror_owner
+    with _mirror_lock:
+        if _mirror_owned():
+            return True
+        if fcntl is None:
+            _mirror_owner = (os.getpid(), MIRROR_DIR, None)
+            return True
+        os.makedirs(MIRROR_DIR, exist_ok=True)
+        fh = open(os.path.join(MIRROR_DIR, "owner.lock"), "a+")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.seek(0)
+            holder = fh.read().strip() or "another process"
+            fh.close()
+            print(f"Mirror {MIRROR_DIR} is owned by process {holder}; this process uses the share directly.")
+            return False
+        fh.truncate(0)
+        fh.write(str(os.getpid()))
+        fh.flush()
+        _mirror_owner = (os.getpid(), MIRROR_DIR, fh)
+        return True
+
+
+def _mirror_owned() -> bool:
+    owner = _mirror_owner
+    return owner is not None and owner[:2] == (os.getpid(), MIRROR_DIR)
+
+
+def mirror_active() -> bool:
+    """True in the process that owns the mirror, once it has completed a first full pull."""
+    return bool(MIRROR_DIR) and _mirror_owned() and _load_mirror_manifest()["initialized"]
+
+
+def mirror_read_path(path: str) -> str:
+    """Where to read a share file or directory from: its mirror copy if there is one."""
+    if not path or not mirror_active():
+        return path
+    key = _mirror_key(path)
+    if key is None:
+        return path
+    local = _mirror_local(key)
+    with _mirror_lock:
+        entry = _mirror_manifest["files"].get(key)
+    if entry and entry.get("deleted"):
+        return path
+    return local if os.path.exists(local) else path
+
+
+def mirror_write_path(path: str) -> str:
+    """Where to write into a share proposal folder: its mirror copy while the mirror is active."""
+    if not path or not mirror_active():
+        return path
+    key = _mirror_key(path)
+    if key is None or key.startswith(_MIRROR_TEMPLATES) or "/" not in key:
+        return path
+    return _mirror_local(key)
+
+
+def mirror_touch(path: str):
+    """Note that files under `path` (a mirror folder) changed; the sync thread pushes them."""
+    if not path or not mirror_active():
+        return
+    key = _mirror_key(path)
+    if key is None or "/" not in key:
+        return
+    with _mirror_lock:
+        _mirror_dirty[_mirror_folder_key(key)] = time.time()
+        _save_mirror_manifest()
+    _mirror_wakeup.set()
+
+
+def _mirror_stat_sig(st) -> list:
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _mirror_copy(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy2(src, dst + _MIRROR_PART)
+    os.replace(dst + _MIRROR_PART, dst)
+
+
+def _mirror_record(key: str, share_st, local_path: str, sha256: str):
+    local_st = os.stat(local_path)
+    _mirror_manifest["files"][key] = {
+        "share": _mirror_stat_sig(share_st),
+        "local": _mirror_stat_sig(local_st),
+        "sha256": sha256,
+    }
+
+
+def _mirror_conflict(key: str, reason: str):
+    """Keep the local copy aside, then take the share's version."""
+    local, share = _mirror_local(key), _mirror_share(key)
+    if os.path.exists(local):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        saved = os.path.join(MIRROR_DIR, "conflicts", *f"{key}.{stamp}".split("/"))
+        os.makedirs(os.path.dirname(saved), exist_ok=True)
+        shutil.copy2(local, saved)
+    else:
+        saved = None
+    print(f"Mirror conflict on {key} ({reason}); share version kept, local copy at {saved}")
+    MIRROR_CONFLICTS.inc()
+    with _mirror_lock:
+        conflicts = _mirror_manifest["conflicts"]
+        conflicts.append({"key": key, "reason": reason, "saved_as": saved, "at": time.time()})
+        del conflicts[:-100]
+    try:
+        share_st = os.stat(share)
+    except OSError:
+        _mirror_manifest["files"].pop(key, None)
+        return
+    _mirror_copy(share, local)
+    _mirror_record(key, share_st, local, _file_sha256(local))
+    MIRROR_FILES_SYNCED.inc(direction="pull")
+
+
+def _mirror_push_file(key: str, local_st):
+    local, share = _mirror_local(key), _mirror_share(key)
+    entry = _mirror_manifest["files"].get(key)
+    try:
+        share_st = os.stat(share)
+    except OSError:
+        share_st = None
+    local_hash = _file_sha256(local)
+    if share_st is not None and (entry is None or _mirror_stat_sig(share_st) != entry["share"]):
+        # The share copy changed since we last saw it (or we never saw it)
+        share_hash = _file_sha256(share)
+        if share_hash == local_hash:
+            _mirror_record(key, share_st, local, local_hash)
+            return
+        if entry is None or share_hash != entry["sha256"]:
+            _mirror_conflict(key, "changed on both sides")
+            return
+    _mirror_copy(local, share)
+    _mirror_record(key, os.stat(share), local, local_hash)
+    MIRROR_FILES_SYNCED.inc(direction="push")
+
+
+def _mirror_push_delete(key: str):
+    share = _mirror_share(key)
+    entry = _mirror_manifest["files"][key]
+    try:
+        share_st = os.stat(share)
+    except OSError:
+        _mirror_manifest["files"].pop(key, None)
+        return
+    if _mirror_stat_sig(share_st) != entry["share"] and _file_sha256(share) != entry["sha256"]:
+        # Edited on the share after we last synced: keep the edit instead of deleting it
+        _mirror_conflict(key, "deleted locally, changed on share")
+        return
+    os.remove(share)
+    _mirror_manifest["files"].pop(key, None)
+    MIRROR_FILES_SYNCED.inc(direction="delete_share")
+
+
+def _mirror_moved_on_share(fkey: str):
+    """
+    Where a mirrored folder that is missing from its share stage lives now, or None if it
+    was never moved (e.g. a new folder that has not been pushed yet). Looks the folder's
+    ID up in the (re-read) proposal index, then probes the other stages by name.
+    """
+    stage, _, folder = fkey.partition("/")
+    if stage not in STAGE_DIRS or not folder or os.path.isdir(_mirror_share(fkey)):
+        return None
+    pid = _read_folder_id(_mirror_local(fkey))
+    if pid:
+        _ensure_index_loaded()
+        with _index_lock:
+            entry = _proposal_index.get(pid)
+        if entry and (entry["stage"], entry["folder"]) != (stage, folder):
+            return stage_path(entry["stage"], entry["folder"])
+    for other in STAGE_DIRS:
+        if other != stage and os.path.isdir(stage_path(other, folder)):
+            return stage_path(other, folder)
+    return None
+
+
+def _mirror_push_folder(fkey: str, settle=None) -> bool:
+    """Push local changes in one folder. Returns False if something must wait for the next pass."""
+    settle = MIRROR_SETTLE_SECONDS if settle is None else settle
+    local_dir, share_dir = _mirror_local(fkey), _mirror_share(fkey)
+    files = _mirror_manifest["files"]
+    prefix = fkey + "/"
+    try:
+        names = [n for n in os.listdir(local_dir)
+                 if not n.endswith(_MIRROR_PART) and os.path.isfile(os.path.join(local_dir, n))]
+    except OSError:
+        names = None  # folder gone locally (moved away); nothing to push
+    if names:
+        moved_to = _mirror_moved_on_share(fkey)
+        if moved_to:
+            # Pushing would recreate the folder under its old stage. Keep the unpushed files
+            # aside as conflicts instead; the pull then drops the stale mirror folder.
+            for name in names:
+                entry = files.get(prefix + name)
+                st = os.stat(os.path.join(local_dir, name))
+                if not entry or entry.get("deleted") or _mirror_stat_sig(st) != entry["local"]:
+                    _mirror_conflict(prefix + name, f"folder moved on share to {moved_to}")
+            return True
+    settled = True
+    if names:
+        os.makedirs(share_dir, exist_ok=True)
+        now = time.time()
+        for name in names:
+            key = prefix + name
+            st = os.stat(os.path.join(local_dir, name))
+            if now - st.st_mtime < settle:
+                settled = False
+                continue
+            entry = files.get(key)
+            if entry and not entry.get("deleted") and _mirror_stat_sig(st) == entry["local"]:
+                continue
+            if entry and entry.get("deleted"):
+                entry.pop("deleted")
+            _mirror_push_file(key, st)
+    if names is not None:
+        present = set(names)
+        for key in [k for k in files if k.startswith(prefix) and "/" not in k[len(prefix):]]:
+            if key[len(prefix):] not in present:
+                files[key]["deleted"] = time.time()   # tombstone until the share copy is gone
+                _mirror_push_delete(key)
+    return settled
+
+
+def _mirror_push_dirty(settle=None):
+    with _mirror_lock:
+        dirty = dict(_mirror_dirty)
+    for fkey, touched in dirty.items():
+        with _mirror_sync_lock:
+            try:
+                settled = _mirror_push_folder(fkey, settle)
+            except OSError as e:
+                print(f"Mirror push of {fkey} failed: {e}")
+                continue
+        if settled:
+            with _mirror_lock:
+                if _mirror_dirty.get(fkey) == touched:
+                    del _mirror_dirty[fkey]
+
+
+def _mirror_pull_folder(fkey: str, deep: bool):
+    share_dir, local_dir = _mirror_share(fkey), _mirror_local(fkey)
+    files, folders = _mirror_manifest["files"], _mirror_manifest["folders"]
+    with _mirror_lock:
+        if fkey in _mirror_dirty:
+            return   # unpushed local changes; pulled after the push
+    dir_mtime = os.stat(share_dir).st_mtime_ns
+    if not deep and folders.get(fkey) == dir_mtime and os.path.isdir(local_dir):
+        return
+    prefix = fkey + "/"
+    names = set()
+    for name in os.listdir(share_dir):
+        share = os.path.join(share_dir, name)
+        if name.endswith(_MIRROR_PART) or name.startswith("~$") or not os.path.isfile(share):
+            continue
+        names.add(name)
+        key = prefix + name
+        share_st = os.stat(share)
+        entry = files.get(key)
+        if entry and (entry.get("deleted") or _mirror_stat_sig(share_st) == entry["share"]):
+            continue
+        local = os.path.join(local_dir, name)
+        # A local file we have no record of, or one edited since the last sync
+        try:
+            local_changed = _mirror_stat_sig(os.stat(local)) != (entry or {}).get("local")
+        except OSError:
+            local_changed = False  # nothing local yet
+        if local_changed:
+            with _mirror_lock:
+                _mirror_dirty.setdefault(fkey, time.time())   # let the push sort it out
+            continue
+        _mirror_copy(share, local)
+        _mirror_record(key, share_st, local, _file_sha256(local))
+        MIRROR_FILES_SYNCED.inc(direction="pull")
+    os.makedirs(local_dir, exist_ok=True)
+    for key in [k for k in files if k.startswith(prefix) and "/" not in k[len(prefix):]]:
+        name = key[len(prefix):]
+        if name in names or files[key].get("deleted"):
+            continue
+        # Deleted on the share: follow unless the local copy has unpushed changes
+        local = os.path.join(local_dir, name)
+        try:
+            unchanged = _mirror_stat_sig(os.stat(local)) == files[key]["local"]
+        except OSError:
+            unchanged = True
+        if unchanged:
+            with contextlib.suppress(OSError):
+                os.remove(local)
+            del files[key]
+            MIRROR_FILES_SYNCED.inc(direction="delete_local")
+        else:
+            del files[key]
+            with _mirror_lock:
+                _mirror_dirty.setdefault(fkey, time.time())
+    folders[fkey] = dir_mtime
+
+
+def _mirror_drop_folder(fkey: str):
+    shutil.rmtree(_mirror_local(fkey), ignore_errors=True)
+    prefix = fkey + "/"
+    for key in [k for k in _mirror_manifest["files"] if k.startswith(prefix)]:
+        del _mirror_manifest["files"][key]
+    _mirror_manifest["folders"].pop(fkey, None)
+
+
+def _mirror_pull(deep: bool):
+    """Bring share-side changes into the mirror. A share that can't be listed is skipped, never wiped."""
+    for root_key, share_root in _mirror_roots().items():
+        try:
+            names = os.listdir(share_root)
+        except OSError as e:
+            print(f"Mirror pull skipped {share_root}: {e}")
+            continue
+        if root_key == _MIRROR_TEMPLATES:
+            with _mirror_sync_lock:
+                _mirror_pull_folder(root_key, deep=True)
+            continue
+        folder_names = {n for n in names if os.path.isdir(os.path.join(share_root, n))
+                        and not n.startswith(".")}
+        for name in folder_names:
+            with _mirror_sync_lock:
+                try:
+                    _mirror_pull_folder(f"{root_key}/{name}", deep)
+                except OSError as e:
+                    print(f"Mirror pull of {root_key}/{name} failed: {e}")
+        # Folders gone from the share (moved or deleted there) leave the mirror too,
+        # unless they are new local folders that haven't been pushed yet
+        local_root = _mirror_local(root_key)
+        try:
+            local_names = os.listdir(local_root)
+        except OSError:
+            local_names = []
+        for name in local_names:
+            fkey = f"{root_key}/{name}"
+            with _mirror_lock:
+                pending = fkey in _mirror_dirty
+            if name not in folder_names and not pending:
+                with _mirror_sync_lock:
+                    _mirror_drop_folder(fkey)
+
+
+def mirror_sync_once(deep: bool = False):
+    """One full sync pass: push local changes, then pull share changes."""
+    global _mirror_last_sync
+    manifest = _load_mirror_manifest()
+    with timed("mirror_sync", deep=deep):
+        _mirror_push_dirty()
+        _mirror_pull(deep or not manifest["initialized"])
+        _mirror_push_dirty()
+    with _mirror_lock:
+        manifest["initialized"] = True
+        _mirror_last_sync = time.time()
+        _save_mirror_manifest()
+
+
+def mirror_flush(path: str):
+    """Push one folder's pending changes right now (used before it is moved)."""
+    if not mirror_active():
+        return
+    key = _mirror_key(path)
+    if key is None or "/" not in key:
+        return
+    fkey = _mirror_folder_key(key)
+    with _mirror_sync_lock:
+        _mirror_push_folder(fkey, settle=0)
+    with _mirror_lock:
+        _mirror_dirty.pop(fkey, None)
+        _save_mirror_manifest()
+
+
+def mirror_rename(src_path: str, dest_path: str):
+    """Follow a folder move on the share: rename the mirror copy, or drop it if dest isn't mirrored."""
+    if not mirror_active():
+        return
+    src_key, dest_key = _mirror_key(src_path), _mirror_key(dest_path)
+    if src_key is None or "/" not in src_key:
+        return
+    with _mirror_sync_lock, _mirror_lock:
+        if dest_key is None:
+            _mirror_drop_folder(src_key)
+        else:
+            files = _mirror_manifest["files"]
+            src_prefix = src_key + "/"
+            if os.path.isdir(_mirror_local(src_key)):
+                os.makedirs(os.path.dirname(_mirror_local(dest_key)), exist_ok=True)
+                os.rename(_mirror_local(src_key), _mirror_local(dest_key))
+            for key in [k for k in files if k.startswith(src_prefix)]:
+                files[dest_key + "/" + key[len(src_prefix):]] = files.pop(key)
+            _mirror_manifest["folders"].pop(src_key, None)
+            _mirror_manifest["folders"].pop(dest_key, None)
+        _mirror_dirty.pop(src_key, None)
+        _save_mirror_manifest()
+
+
+def _mirror_loop():
+    passes = 0
+    while True:
+        try:
+            mirror_sync_once(deep=passes % MIRROR_DEEP_EVERY == 0)
+        except Exception as e:
+            print(f"Mirror sync failed: {e}")
+        passes += 1
+        next_pull = time.time() + MIRROR_SYNC_INTERVAL
+        # Between pulls, push local writes shortly after they happen
+        while time.time() < next_pull:
+            if _mirror_wakeup.wait(timeout=max(0.0, next_pull - time.time())):
+                _mirror_wakeup.clear()
+                time.sleep(MIRROR_SETTLE_SECONDS)
+                try:
+                    _mirror_push_dirty()
+                    with _mirror_lock:
+                        _save_mirror_manifest()
+                except Exception as e:
+                    print(f"Mirror push failed: {e}")
+
+
+def start_mirror_sync():
+    global _mirror_thread
+    if not MIRROR_DIR or not _claim_mirror():
+        return
+    _load_mirror_manifest()
+    with _mirror_lock:
+        if _mirror_thread is not None and _mirror_thread.is_alive():
+            return
+        _mirror_thread = threading.Thread(target=_mirror_loop, name="mirror-sync", daemon=True)
+        _mirror_thread.start()
+
+
+@app.route('/admin/mirror')
+def mirror_status():
+    if not MIRROR_DIR:
+        return jsonify(enabled=False)
+    manifest = _load_mirror_manifest()
+    with _mirror_lock:
+        files = dict(manifest["files"])
+        return jsonify(
+            enabled=True,
+            active=mirror_active(),
+            owner=_mirror_owned(),
+            mirror_dir=os.path.abspath(MIRROR_DIR),
+            stages=list(MIRROR_STAGES),
+            files=sum(1 for e in files.values() if not e.get("deleted")),
+            tombstones=sorted(k for k, e in files.items() if e.get("deleted")),
+            dirty_folders=sorted(_mirror_dirty),
+            last_sync=_mirror_last_sync,
+            conflicts=manifest["conflicts"][-20:],
+        )
+
+
+# ---- Archive tier for completed / dead proposals ----
+# Aged folders are packed into batch zip files under ARCHIVE_DIR and removed from the stage
+# directory. The proposal index remembers which archive holds each proposal ("archive" key),
+# members are stored as "<id>/<relative path>", and a single file can be read straight from
+# the zip's central directory without extracting the rest. Opening an archived proposal
+# restores it into its stage directory (see resolve_proposal). Archive runs and restores are
+# serialized through ARCHIVE_DIR/archive-run.lock, archive names carry a random suffix, and a
+# finished archive never replaces an existing file. A restore unpacks into a hidden folder
+# beside the stage folder and renames it into place.
+ARCHIVABLE_STAGES = ("completed", "dead")
+
+_archive_lock = threading.Lock()
+
+
+def _folder_last_modified(folder_path: str) -> float:
+    latest = 0.0
+    for root, _dirs, names in os.walk(folder_path):
+        for name in names:
+            if name == PROPOSAL_ID_FILE:
+                continue
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                pass
+    return latest or os.path.getmtime(folder_path)
+
+
+def _aged_proposals(days: int, stages):
+    """{stage: [(id, folder name, folder path)]} of unarchived proposals untouched for `days` days."""
+    _ensure_index_loaded()
+    cutoff = time.time() - days * 86400
+    with _index_lock:
+        candidates = [(pid, dict(e)) for pid, e in _proposal_index.items()
+                      if e["stage"] in stages and not e.get("archive")]
+    by_stage = {}
+    for pid, entry in candidates:
+        folder_path = stage_path(entry["stage"], entry["folder"])
+        if os.path.isdir(folder_path) and _folder_last_modified(folder_path) < cutoff:
+            by_stage.setdefault(entry["stage"], []).append((pid, entry["folder"], folder_path))
+    return by_stage
+
+
+def _publish_no_replace(tmp_path: str, final_path: str):
+    """Give tmp_path its final name, failing with FileExistsError rather than replacing a file."""
+    try:
+        os.link(tmp_path, final_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links on this share: create the name exclusively and copy into it
+        with open(tmp_path, "rb") as src, open(final_path, "xb") as out:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+    os.remove(tmp_path)
+
+
+def archive_aged_proposals(days: int = ARCHIVE_AFTER_DAYS, stages=ARCHIVABLE_STAGES, dry_run: bool = False):
+    """
+    Pack every proposal in `stages` untouched for `days` days into one zip per stage.
+    Returns {stage: [folder names archived]}. One run at a time, across processes too.
+    """
+    if dry_run:
+        return {stage: [f for _pid, f, _path in items]
+                for stage, items in _aged_proposals(days, stages).items()}
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with _archive_lock, _file_lock(os.path.join(ARCHIVE_DIR, "archive-run")):
+        archived = {}
+        for stage, items in _aged_proposals(days, stages).items():
+            # The suffix keeps two runs in the same second from picking the same name
+            archive_name = f"{stage}-{datetime.datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.zip"
+            archive_path = os.path.join(ARCHIVE_DIR, archive_name)
+            tmp_path = archive_path + ".tmp"
+            try:
+                with zipfile.ZipFile(tmp_path, "x", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+                    for pid, _folder, folder_path in items:
+                        for root, _dirs, names in os.walk(folder_path):
+                            for name in names:
+                                full = os.path.join(root, name)
+                                zf.write(full, f"{pid}/{os.path.relpath(full, folder_path)}")
+                with zipfile.ZipFile(tmp_path) as zf:
+                    bad = zf.testzip()
+                if bad:
+                    raise IOError(f"Archive verification failed at member {bad}")
+                _publish_no_replace(tmp_path, archive_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            def _mark_archived(entries):
+                for pid, _folder, _path in items:
+                    if pid in entries:
+                        entries[pid] = dict(entries[pid], archive=archive_name)
+
+            _update_index(_mark_archived)
+            for _pid, _folder, folder_path in items:
+                shutil.rmtree(folder_path, ignore_errors=True)
+            archived[stage] = [f for _pid, f, _path in items]
+        return archived
+
+
+def _archive_entry(pid: str):
+    _ensure_index_loaded()
+    with _index_lock:
+        entry = _proposal_index.get(pid)
+    if not entry or not entry.get("archive"):
+        return None
+    return entry
+
+
+def list_archived_files(pid: str):
+    """Names of the files held for an archived proposal (reads only the zip directory)."""
+    entry = _archive_entry(pid)
+    if not entry:
+        return []
+    prefix = f"{pid}/"
+    with zipfile.ZipFile(os.path.join(ARCHIVE_DIR, entry["archive"])) as zf:
+        return [n[len(prefix):] for n in zf.namelist() if n.startswith(prefix)]
+
+
+def open_archived_file(pid: str, name: str):
+    """
+    Open one file of an archived proposal for reading without extracting anything else.
+    The caller must close the returned file object (closing it also closes the zip).
+    """
+    entry = _archive_entry(pid)
+    if not entry:
+        raise FileNotFoundError(f"Proposal {pid} is not archived")
+    zf = zipfile.ZipFile(os.path.join(ARCHIVE_DIR, entry["archive"]))
+    try:
+        member = zf.open(f"{pid}/{name}")
+    except KeyError:
+        zf.close()
+        raise FileNotFoundError(f"{name} not found in archive for {pid}")
+    member_close = member.close
+
+    def _close():
+        member_close()
+        zf.close()
+
+    member.close = _close
+    return member
+
+
+def restore_archived_proposal(pid: str) -> str:
+    """Unpack an archived proposal back into its stage directory. Returns the folder path."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with _archive_lock, _file_lock(os.path.join(ARCHIVE_DIR, "archive-run")):
+        # Re-read under the lock: another process may have restored it while we waited
+        entry = _archive_entry(pid)
+        if not entry:
+            with _index_lock:
+                current = _proposal_index[pid]
+            return stage_path(current["stage"], current["folder"])
+        archive_path = os.path.join(ARCHIVE_DIR, entry["archive"])
+        folder_path = stage_path(entry["stage"], entry["folder"])
+        if os.path.isdir(folder_path) and _read_folder_id(folder_path) == pid:
+            print(f"Archived proposal {entry['folder']} was already unpacked; finishing its restore")
+        else:
+            # Unpack next to the stage folder, then rename, so nobody sees a half-restored folder
+            tmp_dir = os.path.join(os.path.dirname(folder_path),
+                                   f".{entry['folder']}.restoring-{uuid.uuid4().hex[:8]}")
+            prefix = f"{pid}/"
+            try:
+                with zipfile.ZipFile(archive_path) as zf:
+                    for info in zf.infolist():
+                        if not info.filename.startswith(prefix) or info.is_dir():
+                            continue
+                        rel = info.filename[len(prefix):]
+                        dest = os.path.normpath(os.path.join(tmp_dir, rel))
+                        if not dest.startswith(os.path.normpath(tmp_dir) + os.sep):
+                            continue  # never write outside the proposal folder
+                        os.makedirs(os.path.dirname(dest), exist_ok=True)
+                        with zf.open(info) as src, open(dest, "wb") as out:
+                            shutil.copyfileobj(src, out, 1024 * 1024)
+                        mtime = time.mktime(info.date_time + (0, 0, -1))
+                        os.utime(dest, (mtime, mtime))
+                os.makedirs(tmp_dir, exist_ok=True)
+                try:
+                    os.rename(tmp_dir, folder_path)
+                except OSError as e:
+                    if e.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                        raise FileExistsError(f"Cannot restore {entry['folder']}: {folder_path} already exists "
+                                              f"and is not this proposal; {entry['archive']} is left as is")
+                    raise
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+
+        def _unmark(entries):
+            if pid in entries:
+                entries[pid] = {k: v for k, v in entries[pid].items() if k != "archive"}
+
+        _update_index(_unmark)
+        with _index_lock:
+            still_used = any(e.get("archive") == entry["archive"] for e in _proposal_index.values())
+        if not still_used:
+            # Every proposal in this batch has been reopened; the zip is dead weight now
+            try:
+                os.remove(archive_path)
+            except OSError:
+                pass
+        print(f"Restored archived proposal {entry['folder']} from {entry['archive']}")
+        return folder_path
+
+@app.cli.command("archive-proposals")
+@click.option("--days", default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help="Archive folders with no file modified in this many days.")
+@click.option("--stage", "stages", multiple=True, type=click.Choice(ARCHIVABLE_STAGES),
+              help="Stage(s) to archive (default: completed and dead).")
+@click.option("--dry-run", is_flag=True, help="List what would be archived without changing anything.")
+def archive_proposals_command(days, stages, dry_run):
+    """Pack aged completed/dead proposals into ARCHIVE_DIR."""
+    result = archive_aged_proposals(days=days, stages=stages or ARCHIVABLE_STAGES, dry_run=dry_run)
+    for stage, folders in result.items():
+        verb = "Would archive" if dry_run else "Archived"
+        click.echo(f"{verb} {len(folders)} {stage} proposal(s)")
+        for folder in folders:
+            click.echo(f"  {folder}")
+    if not result:
+        click.echo("Nothing to archive.")
+
+
+@app.cli.command("mirror-sync")
+@click.option("--deep", is_flag=True, help="Rescan every mirrored folder, not just changed ones.")
+def mirror_sync_command(deep):
+    """Run one push/pull pass of the local mirror (MIRROR_DIR)."""
+    if not MIRROR_DIR:
+        click.echo("MIRROR_DIR is not set.")
+        return
+    if not _claim_mirror():
+        click.echo("The mirror is owned by a running server, which keeps it in sync.")
+        return
+    mirror_sync_once(deep=deep)
+    with _mirror_lock:
+        click.echo(f"Mirror in sync: {len(_mirror_manifest['files'])} file(s), "
+                   f"{len(_mirror_dirty)} folder(s) still pending, "
+                   f"{len(_mirror_manifest['conflicts'])} conflict(s) recorded")
+
+
+@app.cli.command("compile-templates")
+@click.argument("target", default="precompiled_templates")
+def compile_templates_command(target):
+    """Precompile templates/ to Python modules in TARGET (bundled by PCS Proposals.spec)."""
+    names = _template_names()
+    shutil.rmtree(target, ignore_errors=True)
+    app.jinja_env.compile_templates(target, zip=None, filter_func=lambda n: n in names, ignore_errors=False)
+    click.echo(f"Compiled {len(names)} template(s) to {target}")
+
+
+@app.cli.command("warm-templates")
+def warm_templates_command():
+    """Compile and render every page once, filling the bytecode cache."""
+    click.echo(f"Warmed {warm_templates()} template(s)")
+
+
+# Base prices
+PCS_BASE_LABOR_RATE = 3250
+GACO_S42_BASE_PRICE = 210
+GACO_PATCH_BASE_PRICE = 125
+BLEED_TRAP_BASE_PRICE = 168
+DRAINAGE_MAT_BASE_PRICE = 150
+UNIFLEX_BASE_PRICE = 240
+SW_1FLASH_BASE_PRICE = 162
+SW_BLEED_BLOCK_BASE_PRICE = 100
+GACO_FOAM_BASE_PRICE = 2430
+UNIFLEX_FOAM_BASE_PRICE = 2490
+RFC_LABOR_RATE = 250
+BASE_OFFICE_FEE_PCT = 0.03
+DAVIDS_OFFICE_FEE_PCT = 0.05
+PROFIT_SHARE_PCT = 0.10
+
+COMMISSION_PCT = 0.10
+
+# ---- Proposal record schema ----
+# One row per proposal field: (name, cell written on save, cell read on import, value on a
+# blank form). None for a cell means "not written" / "not read"; _UNSET as the blank value
+# leaves the field out of the blank form so the template falls back to its own default.
+_UNSET = object()
+
+PROPOSAL_SCHEMA = (
+    # Header
+    ("customer_name",         "C1",  "C1",  _UNSET),
+    ("street_address",        "H1",  "H1",  ""),
+    ("city",                  "N1",  "N1",  ""),
+    ("state",                 "S1",  "S1",  ""),
+    ("zip_code",              "U1",  "U1",  ""),
+    ("squares",               "E3",  "E3",  0),
+    ("current_roof",          "E5",  "E5",  ""),         # force user to choose
+    ("product",               "H3",  "H3",  "Uniflex"),  # default per request
+    ("warranty_incl",         "H5",  "H5",  "Yes"),      # default Yes because product is Uniflex
+    ("submitted_by",          "H7",  "H7",  ""),         # force user to choose
+    ("labor_days",            "E7",  "E7",  0),
+    ("price_per_sq_10",       "M3",  "M3",  0),
+    ("price_per_sq_15",       None,  "M5",  0),
+    ("price_per_sq_20",       None,  "M7",  0),
+    ("total_price_10",        None,  "P3",  0),
+    ("total_price_15",        None,  "P5",  0),
+    ("total_price_20",        None,  "P7",  0),
+    # Materials: units, unit price, line total
+    ("silicone_units_10",     "C11", "C11", 0),
+    ("silicone_price",        "D11", "D11", 0),
+    ("silicone_total",        None,  "E11", _UNSET),
+    ("gaco_patch_units",      "C12", "C12", 0),
+    ("gaco_patch_price",      "D12", "D12", 0),
+    ("gaco_patch_total",      None,  "E12", _UNSET),
+    ("bleed_trap_units",      "C13", "C13", 0),
+    ("bleed_trap_price",      "D13", "D13", 0),
+    ("bleed_trap_total",      None,  "E13", _UNSET),
+    ("sw_1flash_units",       "C14", "C14", 0),
+    ("sw_1flash_price",       "D14", "D14", 0),
+    ("sw_1flash_total",       None,  "E14", _UNSET),
+    ("sw_bleed_block_units",  "C15", "C15", 0),
+    ("sw_bleed_block_price",  "D15", "D15", 0),
+    ("sw_bleed_block_total",  None,  "E15", _UNSET),
+    ("drainage_mat_units",    "C16", "C16", 0),
+    ("drainage_mat_price",    "D16", "D16", 0),
+    ("drainage_mat_total",    None,  "E16", _UNSET),
+    ("foam_units",            "C17", "C17", 0),
+    ("foam_price",            "D17", "D17", 0),
+    ("foam_total",            None,  "E17", _UNSET),
+    ("rfc_labor_price",       "D18", "D18", 0),
+    ("rfc_labor_total",       None,  "E18", 0),
+    ("scarifying_total",      "E19", "E19", 0),
+    ("pcs_labor_price",       "D20", "D20", 0),
+    ("pcs_labor_total",       None,  "E20", 0),
+    ("travel_total",          "E21", "E21", 0),
+    ("misc_costs_total",      "E22", "E22", 0),
+    # Results (formula cells in the workbook)
+    ("warranty_10_total",     None,  "E23", 0),
+    ("warranty_15_total",     None,  None,  _UNSET),
+    ("warranty_20_total",     None,  None,  _UNSET),
+    ("office_fee_total",      None,  "E24", 0),
+    ("total_cost",            None,  "E26", 0),
+    ("pcs_profit",            None,  "E28", 0),
+    ("profit_pct",            None,  "E29", 0),
+    ("daily_profit",          None,  "E30", 0),
+    ("profit_share",          None,  "E31", 0),
+    ("commission_amt",        None,  "E32", 0),
+    # Free text
+    ("proposal_note",         "C40", "C40", ""),
+    ("proposal_language",     "C41", "C41", _UNSET),
+    ("includes_text",         None,  "C41", _UNSET),
+    # Calculation inputs and outputs that live only in the form
+    ("commission_pct",        None,  None,  0),
+    ("office_fee_pct",        None,  None,  None),       # None so calc uses Submitted By default
+    ("adjusted_coverage",     None,  None,  0),
+    ("coverage_10",           None,  None,  0),
+    ("coverage_15",           None,  None,  0),
+    ("coverage_20",           None,  None,  0),
+    ("silicone_units_15",     None,  None,  _UNSET),
+    ("silicone_units_20",     None,  None,  _UNSET),
+    # Round-trip state: what the form held before this submit
+    ("previous_squares",      None,  None,  0),
+    ("previous_roof_type",    None,  None,  ""),
+    ("previous_product",      None,  None,  "Uniflex"),
+    ("previous_warranty_incl", None, None,  "Yes"),
+    ("previous_adjusted_coverage", None, None, 0),
+    ("previous_submitted_by", None,  "H7",  ""),
+    ("previous_silicone_units_10", None, None, _UNSET),
+)
+
+PROPOSAL_FIELDS = tuple(row[0] for row in PROPOSAL_SCHEMA)
+_PROPOSAL_FIELD_SET = frozenset(PROPOSAL_FIELDS)
+# Field -> cell written to the Profit Summary on save
+EXCEL_CELL_MAP = {name: write for name, write, _read, _blank in PROPOSAL_SCHEMA if write}
+# Fields the workbook computes by formula; read back on import, never written
+PROFIT_SUMMARY_RESULT_CELLS = {name: read for name, write, read, _blank in PROPOSAL_SCHEMA
+                               if read and not write and not name.startswith(("previous_", "includes_"))}
+# Fields carried from a submitted form into the Excel/Word write on create and save
+FORM_MAPPED_NUMBER_FIELDS = (
+    "price_per_sq_10", "labor_days",
+    "silicone_units_10", "gaco_patch_units", "bleed_trap_units", "sw_1flash_units",
+    "sw_bleed_block_units", "drainage_mat_units", "foam_units",
+    "silicone_price", "gaco_patch_price", "bleed_trap_price", "sw_1flash_price",
+    "sw_bleed_block_price", "drainage_mat_price", "foam_price",
+    "rfc_labor_price", "pcs_labor_price", "scarifying_total", "travel_total", "misc_costs_total",
+    "total_price_10", "total_price_15", "total_price_20",
+)
+FORM_MAPPED_TEXT_FIELDS = ("proposal_note", "proposal_language")
+# Calculation argument -> record field, where the names differ
+_CALC_ARG_FIELDS = {"roof_type": "current_roof"}
+
+
+def _cell_index(cell: str):
+    """'E3' -> (2, 4): zero-based (row, column) into a header=None read_excel grid."""
+    letters = cell.rstrip("0123456789")
+    col = 0
+    for ch in letters:
+        col = col * 26 + (ord(ch.upper()) - 64)
+    return int(cell[len(letters):]) - 1, col - 1
+
+
+_PROPOSAL_READ_INDEX = tuple((name, _cell_index(read)) for name, _w, read, _b in PROPOSAL_SCHEMA if read)
+_PROPOSAL_BLANKS = tuple((name, blank) for name, _w, _r, blank in PROPOSAL_SCHEMA if blank is not _UNSET)
+
+
+class ProposalRecord:
+    """
+    The proposal fields shared by import, calculation, the Excel writer and the template.
+    Unset fields behave like missing dict keys: get() returns the default, [] raises
+    KeyError and the template sees them as undefined.
+    """
+    __slots__ = PROPOSAL_FIELDS
+
+    def __init__(self, values=None, **kwargs):
+        if values:
+            self.update(values)
+        if kwargs:
+            self.update(kwargs)
+
+    @classmethod
+    def blank(cls):
+        """Defaults for starting a proposal without Excel."""
+        record = cls()
+        for name, value in _PROPOSAL_BLANKS:
+            setattr(record, name, value)
+        return record
+
+    @classmethod
+    def from_grid(cls, grid):
+        """Read the Profit Summary cells out of a pd.read_excel(header=None) grid."""
+        record = cls()
+        for name, (row, col) in _PROPOSAL_READ_INDEX:
+            try:
+                value = grid[row][col]
+            except IndexError:
+                value = "" if name in FORM_MAPPED_TEXT_FIELDS or name == "includes_text" else None
+            setattr(record, name, value)
+        return record
+
+    @classmethod
+    def from_form_mapped(cls, form):
+        """The fields a create/save writes to Excel and Word, taken from submitted form data."""
+        return cls(decode_mapped_form(form)[0])
+
+    # -- mapping protocol --
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except (AttributeError, TypeError):
+            raise KeyError(name) from None
+
+    def __setitem__(self, name, value):
+        try:
+            setattr(self, name, value)
+        except AttributeError:
+            raise KeyError(f"'{name}' is not a proposal field") from None
+
+    def __contains__(self, name):
+        return isinstance(name, str) and hasattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in _PROPOSAL_FIELD_SET else default
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def keys(self):
+        return [name for name in PROPOSAL_FIELDS if hasattr(self, name)]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in PROPOSAL_FIELDS if hasattr(self, name)]
+
+    def update(self, values=None, **kwargs):
+        for source in (values or {}, kwargs):
+            for name, value in source.items():
+                self[name] = value
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def copy(self):
+        return ProposalRecord(self)
+
+    def __repr__(self):
+        return f"ProposalRecord({self.to_dict()!r})"
+
+    # -- Excel and calculation views --
+    def write_to_sheet(self, sht):
+        """Write every mapped cell; unset fields clear their cell."""
+        for name, cell in EXCEL_CELL_MAP.items():
+            sht.range(cell).value = getattr(self, name, None)
+
+    def calc_kwargs(self) -> dict:
+        """Keyword arguments for calculation_routine taken from this record."""
+        return {arg: self[_CALC_ARG_FIELDS.get(arg, arg)] for arg in CALC_PARAMS}
+
+
+# ---- Analytics export (Parquet) ----
+# `flask export-parquet TARGET` writes one row per proposal and one column per Profit Summary
+# field read on import to TARGET/stage=<stage>/part-0.parquet. These are hive-style
+# partitions, so pd.read_parquet(TARGET) adds a `stage` column. Each row carries its source
+# file's size and mtime. A rerun keeps rows whose file is unchanged and re-parses only the
+# rest, on a process pool because read_excel is CPU bound. Archived proposals are read
+# straight from their zip.
+EXPORT_TEXT_FIELDS = ("customer_name", "street_address", "city", "state", "zip_code", "current_roof",
+                      "product", "warranty_incl", "submitted_by", "proposal_note", "proposal_language")
+EXPORT_FIELDS = tuple(name for name, _cell in _PROPOSAL_READ_INDEX
+                      if name not in ("previous_submitted_by", "includes_text"))
+EXPORT_META_COLUMNS = ("proposal_id", "folder", "source_file", "source_size", "source_mtime_ns", "archive")
+EXPORT_PARTITION_FILE = "part-0.parquet"
+
+
+def _export_text(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # e.g. a ZIP code Excel stored as a number
+    return str(value).strip()
+
+
+def _export_number(value):
+    number, ok = _to_float(value) if not isinstance(value, bool) else (None, False)
+    return number if ok else math.nan
+
+
+def _export_row(record) -> dict:
+    return {name: (_export_text if name in EXPORT_TEXT_FIELDS else _export_number)(record.get(name))
+            for name in EXPORT_FIELDS}
+
+
+def _export_folder_source(stage: str, folder_path: str):
+    """Export source for one on-disk proposal folder, or None if it has no Profit Summary."""
+    read_folder = mirror_read_path(folder_path)
+    names = list_artifact_files(read_folder)
+    profit = next((n for n in names if n.startswith("Profit Summary") and n.endswith((".xlsm", ".xlsx"))), None)
+    if not profit:
+        return None
+    path = os.path.join(read_folder, profit)
+    st = os.stat(path)
+    name = os.path.basename(folder_path)
+    source = {"stage": stage, "folder": name, "proposal_id": proposal_id_for(stage, name),
+              "source_file": profit, "source_size": st.st_size,
+              "source_mtime_ns": st.st_mtime_ns, "archive": None, "path": path, "document": None}
+    # The generated proposal (used by the search index)
+    document = next((n for n in names if n.lower().endswith(".docx")), None)
+    if document:
+        doc_st = os.stat(os.path.join(read_folder, document))
+        source.update(document=os.path.join(read_folder, document),
+                      document_sig=[document, doc_st.st_size, doc_st.st_mtime_ns])
+    return source
+
+
+def _export_sources() -> list:
+    """Every Profit Summary to export: on-disk folders in all stages plus archived proposals."""
+    _ensure_index_loaded()
+    sources = []
+    for stage, stage_dir in STAGE_DIRS.items():
+        try:
+            names = os.listdir(mirror_read_path(stage_dir))
+        except OSError:
+            continue
+        for name in names:
+            source = _export_folder_source(stage, os.path.join(stage_dir, name))
+            if source:
+                sources.append(source)
+    with _index_lock:
+        archived = [(pid, dict(e)) for pid, e in _proposal_index.items() if e.get("archive")]
+    by_archive = {}
+    for pid, entry in archived:
+        by_archive.setdefault(entry["archive"], []).append((pid, entry))
+    for archive_name, entries in by_archive.items():
+        archive_path = os.path.join(ARCHIVE_DIR, archive_name)
+        try:
+            zf = zipfile.ZipFile(archive_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"Export: skipping unreadable archive {archive_path}: {e}")
+            continue
+        with zf:
+            members, documents = {}, {}
+            for info in zf.infolist():
+                pid, _, name = info.filename.partition("/")
+                if name.startswith("Profit Summary") and name.endswith((".xlsm", ".xlsx")):
+                    members.setdefault(pid, info)
+                elif name.lower().endswith(".docx") and "/" not in name:
+                    documents.setdefault(pid, info)
+        for pid, entry in entries:
+            info = members.get(pid)
+            if info is None:
+                continue
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            source = {"stage": entry["stage"], "folder": entry["folder"], "proposal_id": pid,
+                      "source_file": info.filename.partition("/")[2], "source_size": info.file_size,
+                      "source_mtime_ns": int(mtime * 1e9), "archive": archive_name,
+                      "path": archive_path, "member": info.filename, "document": None}
+            doc_info = documents.get(pid)
+            if doc_info is not None:
+                source.update(document=doc_info.filename,
+                              document_sig=[doc_info.filename, doc_info.file_size, list(doc_info.date_time)])
+            sources.append(source)
+    return sources
+
+
+def _export_parse(source):
+    """Process-pool worker: (source, row or None, error or None)."""
+    try:
+        if source["archive"]:
+            with zipfile.ZipFile(source["path"]) as zf:
+                data = zf.read(source["member"])
+            grid = pd.read_excel(io.BytesIO(data), header=None).values.tolist()
+        else:
+            grid = pd.read_excel(source["path"], header=None).values.tolist()
+        return source, _export_row(ProposalRecord.from_grid(grid)), None
+    except Exception as e:
+        return source, None, str(e)
+
+
+def _parse_export_sources(sources: list, workers=None, parse=_export_parse):
+    """Yield parse(source) results; a process pool unless workers == 0 or there are only a few."""
+    from concurrent.futures import ProcessPoolExecutor
+    if workers == 0 or len(sources) <= 4:
+        yield from map(parse, sources)   # not worth starting processes
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(parse, sources, chunksize=16)
+
+
+def _export_partition_path(target: str, stage: str) -> str:
+    return os.path.join(target, f"stage={stage}", EXPORT_PARTITION_FILE)
+
+
+def _export_load_existing(target: str) -> dict:
+    """(stage, folder) -> row from a previous export."""
+    existing = {}
+    for stage in STAGE_DIRS:
+        path = _export_partition_path(target, stage)
+        if not os.path.exists(path):
+            continue
+        try:
+            frame = pd.read_parquet(path)
+        except Exception as e:
+            print(f"Export: ignoring unreadable partition {path}: {e}")
+            continue
+        if list(frame.columns) != list(EXPORT_META_COLUMNS + EXPORT_FIELDS):
+            continue  # written by an older schema; re-parse that stage
+        frame = frame.astype(object).where(frame.notna(), None)   # NaN/NA -> None, as freshly parsed
+        for row in frame.to_dict("records"):
+            for name in EXPORT_FIELDS:
+                if row[name] is None and name not in EXPORT_TEXT_FIELDS:
+                    row[name] = math.nan
+            existing[(stage, row["folder"])] = row
+    return existing
+
+
+def _export_write_partition(target: str, stage: str, rows: list):
+    path = _export_partition_path(target, stage)
+    if not rows:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        return
+    frame = pd.DataFrame(rows, columns=EXPORT_META_COLUMNS + EXPORT_FIELDS)
+    frame.sort_values("folder", inplace=True, key=lambda s: s.str.lower())
+    for name in EXPORT_TEXT_FIELDS + ("proposal_id", "folder", "source_file", "archive"):
+        frame[name] = frame[name].astype(object).where(frame[name].notna(), None)
+    for name in EXPORT_FIELDS:
+        if name not in EXPORT_TEXT_FIELDS:
+            frame[name] = frame[name].astype("float64")
+    frame["source_size"] = frame["source_size"].astype("int64")
+    frame["source_mtime_ns"] = frame["source_mtime_ns"].astype("int64")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    frame.to_parquet(tmp_path, engine="pyarrow", index=False)
+    os.replace(tmp_path, path)
+
+
+def export_parquet(target: str, workers=None, full: bool = False) -> dict:
+    """Refresh the Parquet dataset at `target`. Returns counts of what was done."""
+    import pyarrow  # noqa: F401  (fail before scanning thousands of folders)
+
+    sources = _export_sources()
+    existing = {} if full else _export_load_existing(target)
+    rows = {stage: [] for stage in STAGE_DIRS}
+    changed = set()
+    to_parse = []
+    stats = {"parsed": 0, "reused": 0, "failed": 0, "removed": 0}
+    seen = set()
+    for source in sources:
+        key = (source["stage"], source["folder"])
+        seen.add(key)
+        old = existing.get(key)
+        if old and all(old[k] == source[k] for k in ("source_file", "source_size", "source_mtime_ns", "archive")):
+            rows[source["stage"]].append(dict(old, proposal_id=source["proposal_id"] or old["proposal_id"]))
+            stats["reused"] += 1
+        else:
+            to_parse.append(source)
+    for stage, _folder in set(existing) - seen:
+        changed.add(stage)
+        stats["removed"] += 1
+
+    def _collect(results):
+        for source, row, error in results:
+            changed.add(source["stage"])
+            if error:
+                print(f"Export: could not read {source['stage']}/{source['folder']}: {error}")
+                stats["failed"] += 1
+                continue
+            meta = {k: source[k] for k in EXPORT_META_COLUMNS}
+            rows[source["stage"]].append(dict(meta, **row))
+            stats["parsed"] += 1
+
+    with timed("parquet_export", files=len(to_parse)):
+        _collect(_parse_export_sources(to_parse, workers))
+        for stage in STAGE_DIRS:
+            if full or stage in changed or not os.path.exists(_export_partition_path(target, stage)):
+                _export_write_partition(target, stage, rows[stage])
+    stats["rows"] = sum(len(r) for r in rows.values())
+    return stats
+
+
+@app.cli.command("export-parquet")
+@click.argument("target", default="analytics")
+@click.option("--workers", type=int, default=None, help="Parser processes (default: one per CPU).")
+@click.option("--full", is_flag=True, help="Re-parse every Profit Summary, not just changed ones.")
+def export_parquet_command(target, workers, full):
+    """Export every Profit Summary to a stage-partitioned Parquet dataset in TARGET."""
+    started = time.perf_counter()
+    stats = export_parquet(target, workers=workers, full=full)
+    click.echo(f"{stats['rows']} row(s) in {target}: {stats['parsed']} parsed, {stats['reused']} unchanged, "
+               f"{stats['removed']} removed, {stats['failed']} failed ({time.perf_counter() - started:.1f}s)")
+
+
+# ---- Pipeline rollups ----
+# Sums of ROLLUP_MEASURES per stage, overall and by product, roof type, submitter and month
+# (the month the Profit Summary was last saved). Each proposal's contribution is stored in
+# ROLLUPS_PATH, a local JSON file like the proposal index. Catalog events add or subtract a
+# single contribution, so a save or move costs one Profit Summary read at most. Amounts are
+# kept in integer cents so subtracting never drifts. After every change the whole response
+# is serialized once, and /api/rollups returns those bytes: constant time, and every
+# aggregate in a response comes from the same version.
+ROLLUPS_PATH = os.environ.get("ROLLUPS_PATH", "./rollups.json")
+ROLLUPS_REFRESH_MIN_AGE = float(os.environ.get("ROLLUPS_REFRESH_MIN_AGE", "300"))  # seconds
+ROLLUP_MEASURES = ("total_price_10", "pcs_profit", "commission_amt", "profit_share")
+ROLLUP_DIMENSIONS = ("product", "roof_type", "submitter", "month")
+
+_rollup_lock = threading.RLock()
+_rollup_entries = {}      # id -> contribution
+_rollup_groups = {}       # (stage, dimension, key) -> [count, cents per measure...]
+_rollup_snapshot = None   # serialized /api/rollups body
+_rollup_mtime_ns = None
+_rollup_refreshed_at = None
+_rollup_version = 0
+
+
+def _rollup_entry(stage: str, row: dict, source: dict) -> dict:
+    def cents(value):
+        return 0 if value is None or math.isnan(value) else int(round(value * 100))
+
+    return {
+        "stage": stage,
+        "product": row.get("product") or "",
+        "roof_type": row.get("current_roof") or "",
+        "submitter": row.get("submitted_by") or "",
+        "month": datetime.datetime.fromtimestamp(source["source_mtime_ns"] / 1e9).strftime("%Y-%m"),
+        "cents": [cents(row.get(m)) for m in ROLLUP_MEASURES],
+        "source": [source["source_file"], source["source_size"], source["source_mtime_ns"], source["archive"]],
+    }
+
+
+def _rollup_apply(entry: dict, sign: int):
+    stage = entry["stage"]
+    keys = [(stage, "all", "")] + [(stage, dim, entry[dim]) for dim in ROLLUP_DIMENSIONS]
+    for key in keys:
+        group = _rollup_groups.setdefault(key, [0] * (1 + len(ROLLUP_MEASURES)))
+        group[0] += sign
+        for i, amount in enumerate(entry["cents"], 1):
+            group[i] += sign * amount
+        if group[0] == 0:
+            del _rollup_groups[key]
+
+
+def _rollup_set(pid: str, entry):
+    old = _rollup_entries.pop(pid, None)
+    if old:
+        _rollup_apply(old, -1)
+    if entry:
+        _rollup_entries[pid] = entry
+        _rollup_apply(entry, +1)
+
+
+def _rollup_publish():
+    global _rollup_snapshot, _rollup_version
+    _rollup_version += 1
+
+    def sums(group):
+        out = {"count": group[0]}
+        out.update({m: group[i] / 100 for i, m in enumerate(ROLLUP_MEASURES, 1)})
+        return out
+
+    stages = {}
+    for (stage, dim, key), group in sorted(_rollup_groups.items()):
+        view = stages.setdefault(stage, {"totals": None, **{f"by_{d}": {} for d in ROLLUP_DIMENSIONS}})
+        if dim == "all":
+            view["totals"] = sums(group)
+        else:
+            view[f"by_{dim}"][key] = sums(group)
+    _rollup_snapshot = json.dumps({
+        "version": _rollup_version,
+        "as_of": datetime.datetime.now().isoformat(timespec="seconds"),
+        "refreshed_at": _rollup_refreshed_at,
+        "proposals": len(_rollup_entries),
+        "measures": list(ROLLUP_MEASURES),
+        "stages": stages,
+    }).encode("utf-8")
+
+
+def _load_rollups_locked(force=False):
+    """Reload contributions if another process rewrote the file. Caller holds _rollup_lock."""
+    global _rollup_mtime_ns, _rollup_refreshed_at
+    try:
+        mtime_ns = os.stat(ROLLUPS_PATH).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    if mtime_ns == _rollup_mtime_ns and _rollup_snapshot is not None and not force:
+        return
+    entries = {}
+    if mtime_ns is not None:
+        try:
+            with open(ROLLUPS_PATH, "r", encoding="utf-8") as fh:
+                saved = json.load(fh)
+            entries = saved.get("proposals", {})
+            _rollup_refreshed_at = saved.get("refreshed_at")
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read rollups {ROLLUPS_PATH}: {e}")
+    _rollup_entries.clear()
+    _rollup_groups.clear()
+    for pid, entry in entries.items():
+        _rollup_set(pid, entry)
+    _rollup_mtime_ns = mtime_ns
+    _rollup_publish()
+
+
+def _update_rollups(mutator):
+    """Apply mutator(set_entry) to the freshest contributions, persist and republish."""
+    global _rollup_mtime_ns
+    with _rollup_lock, _file_lock(ROLLUPS_PATH):
+        _load_rollups_locked()
+        mutator(_rollup_set)
+        os.makedirs(os.path.dirname(os.path.abspath(ROLLUPS_PATH)), exist_ok=True)
+        tmp_path = f"{ROLLUPS_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"version": 1, "refreshed_at": _rollup_refreshed_at, "proposals": _rollup_entries}, fh)
+        os.replace(tmp_path, ROLLUPS_PATH)
+        _rollup_mtime_ns = os.stat(ROLLUPS_PATH).st_mtime_ns
+        _rollup_publish()
+
+
+def _rollup_source_changed(entry, source) -> bool:
+    return not entry or entry["source"] != [source["source_file"], source["source_size"],
+                                            source["source_mtime_ns"], source["archive"]]
+
+
+def refresh_rollups(full: bool = False, workers=0) -> dict:
+    """Reconcile the rollups with every Profit Summary, re-reading only changed files."""
+    with _rollup_lock:
+        _load_rollups_locked()
+        known = dict(_rollup_entries)
+    sources = [s for s in _export_sources() if s["proposal_id"]]
+    to_parse = [s for s in sources if full or _rollup_source_changed(known.get(s["proposal_id"]), s)]
+    parsed = {}
+    with timed("rollups_refresh", files=len(to_parse)):
+        for source, row, error in _parse_export_sources(to_parse, workers):
+            if error:
+                print(f"Rollups: could not read {source['stage']}/{source['folder']}: {error}")
+                continue
+            parsed[source["proposal_id"]] = _rollup_entry(source["stage"], row, source)
+    current = {s["proposal_id"]: s for s in sources}
+
+    def _reconcile(set_entry):
+        global _rollup_refreshed_at
+        for pid in [p for p in _rollup_entries if p not in current]:
+            set_entry(pid, None)
+        for pid, entry in parsed.items():
+            set_entry(pid, entry)
+        for pid, source in current.items():
+            entry = _rollup_entries.get(pid)
+            if entry and entry["stage"] != source["stage"]:
+                set_entry(pid, dict(entry, stage=source["stage"]))
+        _rollup_refreshed_at = time.time()
+
+    _update_rollups(_reconcile)
+    return {"proposals": len(current), "parsed": len(parsed), "unchanged": len(current) - len(to_parse)}
+
+
+@on_catalog_event
+def _rollups_on_catalog_event(kind, pid, stage, folder_path):
+    if not pid:
+        return
+    if kind == "moved":
+        with _rollup_lock:
+            _load_rollups_locked()
+            entry = _rollup_entries.get(pid)
+        if entry:
+            _update_rollups(lambda set_entry: set_entry(pid, dict(entry, stage=stage)))
+            return
+    source = _export_folder_source(stage, folder_path)
+    if source is None:
+        return
+    source["proposal_id"] = pid
+    _source, row, error = _export_parse(source)
+    if error:
+        raise IOError(error)
+    entry = _rollup_entry(stage, row, source)
+    _update_rollups(lambda set_entry: set_entry(pid, entry))
+
+
+def _refresh_rollups_if_stale():
+    """Background catch-up with edits made outside the app (skipped if another process just did it)."""
+    with _rollup_lock:
+        _load_rollups_locked()
+        refreshed_at = _rollup_refreshed_at
+    if refreshed_at and time.time() - refreshed_at < ROLLUPS_REFRESH_MIN_AGE:
+        return
+    try:
+        print(f"Rollups refreshed: {refresh_rollups()}")
+    except Exception as e:
+        print(f"Rollups refresh failed: {e}")
+
+
+@app.route('/api/rollups')
+def pipeline_rollups():
+    with _rollup_lock:
+        _load_rollups_locked()
+        body = _rollup_snapshot
+    return Response(body, mimetype="application/json")
+
+
+@app.cli.command("refresh-rollups")
+@click.option("--full", is_flag=True, help="Re-read every Profit Summary, not just changed ones.")
+@click.option("--workers", type=int, default=None, help="Parser processes (default: one per CPU).")
+def refresh_rollups_command(full, workers):
+    """Rebuild the pipeline rollups served at /api/rollups."""
+    click.echo(f"Rollups: {refresh_rollups(full=full, workers=workers)}")
+
+
+# ---- Full-text search ----
+# An inverted index over each proposal's customer, address, note (C40), language (C41) and
+# the text of its generated Word document. It lives in memory and is kept on local disk, so
+# a query never touches the share. Catalog events re-index one proposal on save and relabel
+# it on move. A change is appended to a log next to SEARCH_INDEX_PATH (one JSON line per
+# proposal) instead of rewriting the whole file; every process tails that log from a
+# background thread. Once the log passes SEARCH_LOG_COMPACT_BYTES it is compacted: under
+# the file lock a new log is started and the old one ends with a pointer to it, then the
+# snapshot is serialized outside any lock and swapped in, and the old log is deleted. Ranking is BM25 over field-weighted
+# term counts, and every query term must match. Word documents from the same template share
+# most paragraphs, so a paragraph's text and token counts are held once for all proposals.
+SEARCH_INDEX_PATH = os.environ.get("SEARCH_INDEX_PATH", "./search_index.json")
+SEARCH_REFRESH_MIN_AGE = float(os.environ.get("SEARCH_REFRESH_MIN_AGE", "300"))  # seconds
+SEARCH_FIELD_WEIGHTS = {"customer": 3.0, "address": 2.5, "note": 2.0, "language": 1.5, "document": 1.0}
+SEARCH_DOCUMENT_MAX_CHARS = 50000
+SEARCH_INDEX_VERSION = 2          # bump when documents gain fields; older files are rebuilt
+SEARCH_SYNC_INTERVAL = float(os.environ.get("SEARCH_SYNC_INTERVAL", "1"))  # seconds
+SEARCH_LOG_COMPACT_BYTES = int(os.environ.get("SEARCH_LOG_COMPACT_BYTES", str(32 * 1024 * 1024)))
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+_SEARCH_TOKEN_RE = re.compile(r"[^\W_]+")
+
+_search_lock = threading.RLock()
+_search_docs = {}                                 # id -> {"stage", "folder", "fields", "paragraphs", "sig"}
+_search_doc_terms = {}                            # id -> {term: weighted count}
+_search_doc_len = {}                              # id -> weighted token count
+_search_postings = collections.defaultdict(dict)  # term -> {id: weighted count}
+_search_total_len = 0.0
+_search_refreshed_at = None
+_search_log_gen = None                            # change log this process has applied (None: not loaded)
+_search_log_pos = 0                               # bytes of that log already applied
+_search_compact_lock = threading.Lock()
+_search_sync_thread = None
+_search_sync_wake = threading.Event()             # set after a local change to sync without waiting
+_paragraph_counts_cache = {}                      # paragraph text -> Counter, shared by documents
+
+
+def _search_tokens(text: str) -> list:
+    return [t for t in _SEARCH_TOKEN_RE.findall(text.lower()) if len(t) > 1 or t.isdigit()]
+
+
+def _paragraph_counts(text: str):
+    counts = _paragraph_counts_cache.get(text)
+    if counts is None:
+        if len(_paragraph_counts_cache) > 200000:
+            _paragraph_counts_cache.clear()
+        counts = _paragraph_counts_cache[text] = collections.Counter(_search_tokens(text))
+    return counts
+
+
+def _search_weigh(doc: dict):
+    terms = collections.Counter()
+    for field, text in doc["fields"].items():
+        for token in _search_tokens(text):
+            terms[token] += SEARCH_FIELD_WEIGHTS[field]
+    weight = SEARCH_FIELD_WEIGHTS["document"]
+    for paragraph in doc["paragraphs"]:
+        for token, n in _paragraph_counts(paragraph).items():
+            terms[token] += weight * n
+    return terms, sum(terms.values())
+
+
+def _search_set(pid: str, doc):
+    """Replace one proposal's postings (doc=None removes it). Caller holds _search_lock."""
+    global _search_total_len
+    for term in _search_doc_terms.pop(pid, {}):
+        postings = _search_postings[term]
+        postings.pop(pid, None)
+        if not postings:
+            del _search_postings[term]
+    _search_total_len -= _search_doc_len.pop(pid, 0.0)
+    old = _search_docs.pop(pid, None)
+    _suggest_set(pid, old, doc)
+    _address_set(pid, old, doc)
+    if doc:
+        terms, length = _search_weigh(doc)
+        _search_docs[pid] = doc
+        _search_doc_terms[pid] = terms
+        _search_doc_len[pid] = length
+        _search_total_len += length
+        for term, weight in terms.items():
+            _search_postings[term][pid] = weight
+
+
+def _search_log_path(gen: str) -> str:
+    return f"{SEARCH_INDEX_PATH}.{gen}.log"
+
+
+def _reload_search_locked() -> bool:
+    """Re-read the last compacted snapshot, re-indexing only documents that differ."""
+    global _search_refreshed_at, _search_log_gen, _search_log_pos
+    try:
+        with open(SEARCH_INDEX_PATH, "r", encoding="utf-8") as fh:
+            saved = json.load(fh)
+    except FileNotFoundError:
+        saved = {}
+    except ValueError as e:
+        print(f"Warning: search index {SEARCH_INDEX_PATH} is unreadable ({e}); it will be rebuilt.")
+        saved = {}
+    except OSError as e:
+        print(f"Warning: could not read search index {SEARCH_INDEX_PATH}: {e}")
+        return False
+    if saved and saved.get("version") != SEARCH_INDEX_VERSION:
+        print(f"Search index {SEARCH_INDEX_PATH} has an older format; it will be rebuilt.")
+        saved = {}
+    paragraphs = saved.get("paragraphs", [])
+    docs = saved.get("proposals", {})
+    for pid in [p for p in _search_docs if p not in docs]:
+        _search_set(pid, None)
+    for pid, doc in docs.items():
+        current = _search_docs.get(pid)
+        if current and all(current[k] == doc[k] for k in ("sig", "stage", "folder")):
+            continue
+        _search_set(pid, dict(doc, paragraphs=[paragraphs[i] for i in doc["paragraphs"]]))
+    _search_refreshed_at = saved.get("refreshed_at")
+    _search_log_gen, _search_log_pos = saved.get("log", "0"), 0
+    return True
+
+
+def _tail_search_log_locked() -> bool:
+    """Apply changes appended since the last call; False if the log was compacted away."""
+    global _search_refreshed_at, _search_log_gen, _search_log_pos
+    while True:
+        try:
+            with open(_search_log_path(_search_log_gen), "rb") as fh:
+                fh.seek(_search_log_pos)
+                data = fh.read()
+        except FileNotFoundError:
+            # Nothing logged yet, unless a compaction has written a snapshot since
+            return _search_log_gen == "0" and not os.path.exists(SEARCH_INDEX_PATH)
+        end = data.rfind(b"\n") + 1      # a line still being written is read next time
+        next_gen = None
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"Warning: skipping a damaged line in {_search_log_path(_search_log_gen)}")
+                continue
+            if "next" in entry:
+                next_gen = entry["next"]
+                break
+            if "id" in entry:
+                _search_set(entry["id"], entry["doc"])
+            if "refreshed_at" in entry:
+                _search_refreshed_at = entry["refreshed_at"]
+        if next_gen is None:
+            _search_log_pos += end
+            return True
+        _search_log_gen, _search_log_pos = next_gen, 0
+
+
+def _load_search_locked():
+    """Pick up changes any process saved. Caller holds _search_lock."""
+    if _search_log_gen is not None and _tail_search_log_locked():
+        return
+    if _reload_search_locked():
+        _tail_search_log_locked()
+
+
+def _append_search_log_locked(entries: list):
+    """Append entries to the current log. Caller holds _search_lock and the file lock."""
+    global _search_log_pos
+    if _search_log_gen is None:
+        raise IOError(f"search index {SEARCH_INDEX_PATH} is not loaded")
+    os.makedirs(os.path.dirname(os.path.abspath(SEARCH_INDEX_PATH)), exist_ok=True)
+    with open(_search_log_path(_search_log_gen), "ab") as fh:
+        if fh.tell() != _search_log_pos:
+            fh.write(b"\n")             # end a line torn by a writer that crashed mid-append
+        fh.write("".join(json.dumps(e) + "\n" for e in entries).encode("utf-8"))
+        _search_log_pos = fh.tell()
+
+
+def _update_search(mutator):
+    """Apply mutator(set_doc) to the freshest index and log the documents it changed."""
+    with _search_lock, _file_lock(SEARCH_INDEX_PATH):
+        _load_search_locked()
+        refreshed_at = _search_refreshed_at
+        changed = {}
+
+        def _set_doc(pid, doc):
+            _search_set(pid, doc)
+            changed[pid] = doc
+
+        result = mutator(_set_doc)
+        entries = [{"id": pid, "doc": doc} for pid, doc in changed.items()]
+        if _search_refreshed_at != refreshed_at:
+            entries.append({"refreshed_at": _search_refreshed_at})
+        if entries:
+            _append_search_log_locked(entries)
+    if changed:
+        _search_sync_wake.set()
+    return result
+
+
+def compact_search_index() -> bool:
+    """Fold the change log into a new snapshot; False if another process got there first."""
+    global _search_log_gen, _search_log_pos
+    with _search_compact_lock:
+        with _search_lock, _file_lock(SEARCH_INDEX_PATH):
+            _load_search_locked()
+            old_gen, new_gen = _search_log_gen, uuid.uuid4().hex
+            open(_search_log_path(new_gen), "ab").close()
+            _append_search_log_locked([{"next": new_gen}])
+            _search_log_gen, _search_log_pos = new_gen, 0
+            docs, refreshed_at = dict(_search_docs), _search_refreshed_at
+        # Documents are replaced, never changed in place, so the copy can be written unlocked
+        tmp_path = f"{SEARCH_INDEX_PATH}.{os.getpid()}.tmp"
+        with timed("search_compact", proposals=len(docs)):
+            table, saved = {}, {}
+            for pid, doc in docs.items():
+                saved[pid] = dict(doc, paragraphs=[table.setdefault(p, len(table)) for p in doc["paragraphs"]])
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({"version": SEARCH_INDEX_VERSION, "refreshed_at": refreshed_at, "log": new_gen,
+                           "paragraphs": list(table), "proposals": saved}, fh)
+        with _file_lock(SEARCH_INDEX_PATH):
+            # A compaction that started later and finished first already deleted new_gen
+            current = os.path.exists(_search_log_path(new_gen))
+            if current:
+                os.replace(tmp_path, SEARCH_INDEX_PATH)
+            else:
+                os.remove(tmp_path)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(_search_log_path(old_gen))
+    return current
+
+
+def _search_sync_loop():
+    while True:
+        _search_sync_wake.clear()
+        try:
+            with _search_lock:
+                _load_search_locked()
+                log_size = _search_log_pos
+            if any(_suggest_changed.values()):
+                _build_suggest_snapshot()
+            if log_size > SEARCH_LOG_COMPACT_BYTES:
+                compact_search_index()
+        except Exception as e:
+            print(f"Search index sync failed: {e}")
+        _search_sync_wake.wait(SEARCH_SYNC_INTERVAL)
+
+
+def start_search_sync():
+    global _search_sync_thread
+    with _search_lock:
+        if _search_sync_thread is not None and _search_sync_thread.is_alive():
+            return
+        _search_sync_thread = threading.Thread(target=_search_sync_loop, name="search-sync", daemon=True)
+        _search_sync_thread.start()
+
+
+def _search_sig(source: dict) -> list:
+    return [source["source_file"], source["source_size"], source["source_mtime_ns"], source["archive"],
+            source.get("document_sig")]
+
+
+def _docx_paragraphs(source: dict) -> list:
+    if not source.get("document"):
+        return []
+    if source["archive"]:
+        with zipfile.ZipFile(source["path"]) as zf:
+            doc = Document(io.BytesIO(zf.read(source["document"])))
+    else:
+        doc = Document(source["document"])
+    paragraphs = list(doc.paragraphs)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                paragraphs.extend(cell.paragraphs)
+    texts, seen, total = [], set(), 0
+    for paragraph in paragraphs:
+        text = paragraph.text.strip()
+        if not text or text in seen:
+            continue
+        seen.add(text)
+        texts.append(text)
+        total += len(text)
+        if total > SEARCH_DOCUMENT_MAX_CHARS:
+            break
+    return texts
+
+
+def _search_extract(source: dict):
+    """Process-pool worker: (source, search document or None, error or None)."""
+    _source, row, error = _export_parse(source)
+    if error:
+        return source, None, error
+    try:
+        paragraphs = _docx_paragraphs(source)
+    except Exception as e:
+        print(f"Search: could not read the document for {source['folder']}: {e}")
+        paragraphs = []
+    address = " ".join(str(row[f]) for f in ("street_address", "city", "state", "zip_code") if row.get(f))
+    fields = {"customer": row.get("customer_name") or "", "address": address,
+              "note": row.get("proposal_note") or "", "language": row.get("proposal_language") or ""}
+    # What the new-proposal form offers to fill in when this customer or address comes up again
+    prior = {f: row.get(f) or "" for f in SUGGEST_PRIOR_FIELDS}
+    squares = row.get("squares")
+    prior.update(squares=None if squares is None or math.isnan(squares) else squares,
+                 saved_ns=source["source_mtime_ns"])
+    return source, {"stage": source["stage"], "folder": source["folder"], "fields": fields,
+                    "paragraphs": paragraphs, "prior": prior, "sig": _search_sig(source)}, None
+
+
+def refresh_search_index(full: bool = False, workers=0) -> dict:
+    """Reconcile the index with every proposal, re-reading only changed files."""
+    with _search_lock:
+        _load_search_locked()
+        known = {pid: doc["sig"] for pid, doc in _search_docs.items()}
+    sources = [s for s in _export_sources() if s["proposal_id"]]
+    to_parse = [s for s in sources if full or known.get(s["proposal_id"]) != _search_sig(s)]
+    parsed = {}
+    with timed("search_refresh", files=len(to_parse)):
+        for source, doc, error in _parse_export_sources(to_parse, workers, parse=_search_extract):
+            if error:
+                print(f"Search: could not read {source['stage']}/{source['folder']}: {error}")
+                continue
+            parsed[source["proposal_id"]] = doc
+    current = {s["proposal_id"]: s for s in sources}
+
+    def _reconcile(set_doc):
+        global _search_refreshed_at
+        for pid in [p for p in _search_docs if p not in current]:
+            set_doc(pid, None)
+        for pid, doc in parsed.items():
+            set_doc(pid, doc)
+        for pid, source in current.items():
+            doc = _search_docs.get(pid)
+            if doc and (doc["stage"], doc["folder"]) != (source["stage"], source["folder"]):
+                set_doc(pid, dict(doc, stage=source["stage"], folder=source["folder"]))
+        _search_refreshed_at = time.time()
+
+    _update_search(_reconcile)
+    return {"proposals": len(current), "parsed": len(parsed), "unchanged": len(current) - len(to_parse)}
+
+
+@on_catalog_event
+def _search_on_catalog_event(kind, pid, stage, folder_path):
+    if not pid:
+        return
+    if kind == "moved":
+        def _relabel(set_doc):
+            doc = _search_docs.get(pid)
+            if doc:
+                set_doc(pid, dict(doc, stage=stage, folder=os.path.basename(folder_path)))
+            return doc is not None
+
+        if _update_search(_relabel):
+            return
+    source = _export_folder_source(stage, folder_path)
+    if source is None:
+        return
+    source["proposal_id"] = pid
+    _source, doc, error = _search_extract(source)
+    if error:
+        raise IOError(error)
+    _update_search(lambda set_doc: set_doc(pid, doc))
+
+
+def _refresh_search_if_stale():
+    with _search_lock:
+        _load_search_locked()
+        refreshed_at = _search_refreshed_at
+    if refreshed_at and time.time() - refreshed_at < SEARCH_REFRESH_MIN_AGE:
+        return
+    try:
+        print(f"Search index refreshed: {refresh_search_index()}")
+    except Exception as e:
+        print(f"Search index refresh failed: {e}")
+
+
+def _highlight(text: str, pattern, width: int = 160):
+    """HTML snippet of `text` around the first match, matches wrapped in <mark>; None if no match."""
+    first = pattern.search(text)
+    if not first:
+        return None
+    start = max(0, first.start() - width // 3)
+    end = min(len(text), start + width)
+    snippet = text[start:end]
+    parts, pos = [], 0
+    for m in pattern.finditer(snippet):
+        parts.append(str(escape(snippet[pos:m.start()])))
+        parts.append(f"<mark>{escape(m.group())}</mark>")
+        pos = m.end()
+    parts.append(str(escape(snippet[pos:])))
+    return ("&hellip;" if start else "") + "".join(parts) + ("&hellip;" if end < len(text) else "")
+
+
+def search_proposals(query: str, limit: int = 20, stage=None) -> dict:
+    """Ranked proposals matching every term of `query`, with highlighted snippets."""
+    terms = list(dict.fromkeys(_search_tokens(query or "")))
+    result = {"query": query, "terms": terms, "total": 0, "results": []}
+    if not terms:
+        return result
+    with _search_lock:
+        _load_search_locked()
+        postings = [_search_postings.get(t) for t in terms]
+        if not all(postings):
+            return result
+        postings.sort(key=len)
+        n_docs = len(_search_docs)
+        avg_len = (_search_total_len / n_docs) or 1.0
+        idf = [math.log(1 + (n_docs - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+        scored = []
+        for pid in postings[0]:
+            if stage and _search_docs[pid]["stage"] != stage:
+                continue
+            if not all(pid in p for p in postings[1:]):
+                continue
+            norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * _search_doc_len[pid] / avg_len)
+            score = sum(w * p[pid] * (_BM25_K1 + 1) / (p[pid] + norm) for w, p in zip(idf, postings))
+            scored.append((score, pid))
+        top = heapq.nlargest(limit, scored)
+        docs = [(score, pid, _search_docs[pid]) for score, pid in top]
+    result["total"] = len(scored)
+
+    pattern = re.compile(r"(?<![^\W_])(?:" + "|".join(re.escape(t) for t in terms) + r")(?![^\W_])", re.IGNORECASE)
+    for score, pid, doc in docs:
+        highlights = {}
+        for field, text in doc["fields"].items():
+            snippet = _highlight(text, pattern)
+            if snippet:
+                highlights[field] = snippet
+        for paragraph in doc["paragraphs"]:
+            snippet = _highlight(paragraph, pattern)
+            if snippet:
+                highlights["document"] = snippet
+                break
+        result["results"].append({"id": pid, "stage": doc["stage"], "folder": doc["folder"],
+                                  "score": round(score, 4), "highlights": highlights})
+    return result
+
 
-# Excel-style rounding (ROUND_HALF_UP) to match Excel's ROUND behavior
-def excel_round(value, digits=0):
+def _search_args():
+    stage = request.args.get("stage") or None
     try:
-        q = Decimal('1') if digits == 0 else Decimal(f'1e-{digits}')
-        return float(Decimal(str(value)).quantize(q, rounding=ROUND_HALF_UP))
-    except Exception:
-        # Fallback: return original value if rounding fails
-        return value
+        limit = max(1, min(int(request.args.get("limit", 20)), 200))
+    except ValueError:
+        limit = 20
+    return request.args.get("q", ""), limit, stage if stage in STAGE_DIRS else None
 
 
-def _delete_old_artifacts(proposal_folder: str):
-    """Remove generated files before regenerating."""
-    patterns = [
-        os.path.join(proposal_folder, "Gaco S42 Proposal - *.docx"),
-        os.path.join(proposal_folder, "Uniflex Proposal - *.docx"),
-        os.path.join(proposal_folder, "*.pdf"),
-        os.path.join(proposal_folder, "Profit Summary - *.xlsm"),
-    ]
-    for patt in patterns:
-        for path in glob.glob(patt):
-            try:
-                os.remove(path)
-            except Exception as e:
-                print(f"Warning: could not remove {path}: {e}")
+@app.route('/api/search')
+def search_api():
+    started = time.perf_counter()
+    result = search_proposals(*_search_args())
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(result)
 
-def _libreoffice_convert_sync(doc_path: str, outdir: str, timeout: int = 180):
-    """
-    Convert a DOCX to PDF using LibreOffice headless.
-    Blocks until done (or raises on failure).
-    """
-    os.makedirs(outdir, exist_ok=True)
-    cmd = [
-        LIBREOFFICE_PATH,
-        "--headless",
-        "--convert-to", "pdf",
-        "--outdir", outdir,
-        doc_path,
-    ]
-    try:
-        completed = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=timeout,
-            check=True,
-            text=True,
-        )
-        if completed.returncode != 0:
-            raise RuntimeError(f"LibreOffice returned {completed.returncode}: {completed.stderr.strip()}")
-    except FileNotFoundError:
-        raise FileNotFoundError(
-            f"LibreOffice not found at {LIBREOFFICE_PATH}. "
-            "Install it from libreoffice.org and update LIBREOFFICE_PATH if needed."
-        )
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"LibreOffice conversion failed: {e.stderr or e.stdout}")
 
+@app.route('/search')
+def search_page():
+    query, limit, stage = _search_args()
+    return render_template("search.html", query=query, stage=stage, stages=list(STAGE_DIRS),
+                           result=search_proposals(query, limit, stage))
 
-def _convert_to_pdf(doc_path: str, outdir: str, use_libreoffice: bool = True, async_mode: bool = True):
-    """
-    Dispatch PDF conversion. If LibreOffice is available and requested, use it;
-    otherwise fall back to docx2pdf (Word). Optionally run async so the UI returns immediately.
-    """
-    def _worker():
-        try:
-            if use_libreoffice and os.path.exists(LIBREOFFICE_PATH):
-                _libreoffice_convert_sync(doc_path, outdir)
-            else:
-                # Fallback to Word/docx2pdf (may pop Word)
-                convert(doc_path, outdir)
-        except Exception as e:
-            print(f"PDF conversion failed: {e}")
 
-    if async_mode:
-        threading.Thread(target=_worker, daemon=True).start()
-    else:
-        _worker()
+@app.cli.command("refresh-search")
+@click.option("--full", is_flag=True, help="Re-read every proposal, not just changed ones.")
+@click.option("--workers", type=int, default=None, help="Parser processes (default: one per CPU).")
+def refresh_search_command(full, workers):
+    """Rebuild the full-text search index."""
+    click.echo(f"Search index: {refresh_search_index(full=full, workers=workers)}")
+    compact_search_index()
 
-# Base prices
-PCS_BASE_LABOR_RATE = 3250
-GACO_S42_BASE_PRICE = 210
-GACO_PATCH_BASE_PRICE = 125
-BLEED_TRAP_BASE_PRICE = 168
-DRAINAGE_MAT_BASE_PRICE = 150
-UNIFLEX_BASE_PRICE = 240
-SW_1FLASH_BASE_PRICE = 162
-SW_BLEED_BLOCK_BASE_PRICE = 100
-GACO_FOAM_BASE_PRICE = 2430
-UNIFLEX_FOAM_BASE_PRICE = 2490
-RFC_LABOR_RATE = 250
-BASE_OFFICE_FEE_PCT = 0.03
-DAVIDS_OFFICE_FEE_PCT = 0.05
-PROFIT_SHARE_PCT = 0.10
 
-COMMISSION_PCT = 0.10
+# ---- Autocomplete ----
+# Prefix suggestions for the customer and street address boxes on the new-proposal form,
+# taken from every proposal in the search index (archived ones included). Each field keeps
+# a sorted list of distinct normalized values next to a value -> proposals map, so a
+# keystroke costs one bisect plus a walk over at most `limit` neighbours, however long the
+# history. The lists are updated whenever the search index changes a document, under
+# _search_lock. Keystrokes never take that lock: they read _suggest_snapshot, sorted tuples
+# of values and ready-made suggestions that the search-sync thread rebuilds after a change
+# and swaps in with one assignment.
+SUGGEST_PRIOR_FIELDS = ("customer_name", "street_address", "city", "state", "zip_code",
+                        "product", "current_roof", "submitted_by")
+SUGGEST_LIMIT = 8
 
-# ---- Central Excel mapping & writer ----
-EXCEL_CELL_MAP = {
-    # Header (known)
-    "customer_name": "C1",
-    "street_address": "H1",
-    "city": "N1",
-    "state": "S1",
-    "zip_code": "U1",
-    "squares": "E3",
-    "current_roof": "E5",
-    "product": "H3",
-    "warranty_incl": "H5",
-    "submitted_by": "H7",
-    "price_per_sq_10": "M3",
-    "price_per_sq_15": None,  # do not update
-    "price_per_sq_20": None,  # do not update
-    "labor_days": "E7",
-    "total_price_10": None,   # do not update
-    "total_price_15": None,   # do not update
-    "total_price_20": None,   # do not update
-    "silicone_units_10": "C11",
-    "gaco_patch_units": "C12",
-    "bleed_trap_units": "C13",
-    "sw_1flash_units": "C14",
-    "sw_bleed_block_units": "C15",
-    "drainage_mat_units": "C16",
-    "foam_units": "C17",
-    "silicone_price": "D11",
-    "gaco_patch_price": "D12",
-    "bleed_trap_price": "D13",
-    "sw_1flash_price": "D14",
-    "sw_bleed_block_price": "D15",
-    "drainage_mat_price": "D16",
-    "foam_price": "D17",
-    "rfc_labor_price": "D18",
-    "pcs_labor_price": "D20",
-    "scarifying_total": "E19",
-    "travel_total": "E21",
-    "misc_costs_total": "E22",
-    "adjusted_coverage": None, 
-    "office_fee_pct": None,     
-    "proposal_note": "C40",     
-    "proposal_language": "C41",  
+_suggest_keys = {"customer": [], "address": []}  # field -> sorted normalized values
+_suggest_ids = {"customer": {}, "address": {}}   # field -> normalized value -> {id: saved_ns}
+_suggest_snapshot = None                         # field -> (values, suggestions); replaced, never changed
+_suggest_changed = {"customer": set(), "address": set()}  # field -> values changed since the snapshot
+
+
+def _suggest_norm(text: str) -> str:
+    return " ".join(str(text).casefold().split())
+
+
+def _suggest_key(doc, field: str):
+    prior = doc and doc.get("prior")
+    if not prior:
+        return None
+    if field == "customer":
+        return _suggest_norm(prior["customer_name"]) or None
+    if not prior["street_address"]:
+        return None
+    return _suggest_norm(" ".join(prior[f] for f in ("street_address", "city", "state", "zip_code")))
+
+
+def _suggest_set(pid: str, old, new):
+    """Move one proposal between suggestion values. Caller holds _search_lock."""
+    for field, keys in _suggest_keys.items():
+        ids = _suggest_ids[field]
+        old_key, new_key = _suggest_key(old, field), _suggest_key(new, field)
+        if old_key and old_key != new_key:
+            entries = ids.get(old_key, {})
+            entries.pop(pid, None)
+            if not entries:
+                ids.pop(old_key, None)
+                i = bisect.bisect_left(keys, old_key)
+                if i < len(keys) and keys[i] == old_key:
+                    del keys[i]
+        if new_key:
+            if new_key not in ids:
+                ids[new_key] = {}
+                bisect.insort(keys, new_key)
+            ids[new_key][pid] = new["prior"]["saved_ns"]
+        _suggest_changed[field].update(k for k in (old_key, new_key) if k)
+
+
+def _build_suggest_snapshot() -> dict:
+    """Freeze the suggestion lists into the tuples suggest() reads without locking."""
+    global _suggest_snapshot
+    with _search_lock, timed("suggest_snapshot"):
+        snapshot = {}
+        for field, keys in _suggest_keys.items():
+            changed = _suggest_changed[field]
+            # Suggestions for unchanged values are reused from the previous snapshot
+            previous = dict(zip(*_suggest_snapshot[field])) if _suggest_snapshot else {}
+            rows = []
+            for key in keys:
+                if key in previous and key not in changed:
+                    rows.append(previous[key])
+                    continue
+                entries = _suggest_ids[field][key]
+                pid = max(entries, key=entries.get)
+                doc = _search_docs[pid]
+                prior = doc["prior"]
+                value = prior["customer_name"] if field == "customer" else prior["street_address"]
+                rows.append(dict(prior, value=value, roof_type=prior["current_roof"], id=pid,
+                                 stage=doc["stage"], folder=doc["folder"], proposals=len(entries)))
+            snapshot[field] = (tuple(keys), tuple(rows))
+            changed.clear()
+        _suggest_snapshot = snapshot
+    return snapshot
+
+
+def suggest(prefix: str, field: str = "customer", limit: int = SUGGEST_LIMIT) -> list:
+    """Distinct past customers or addresses starting with `prefix`, with their latest bid."""
+    prefix = _suggest_norm(prefix or "")
+    if not prefix or field not in _suggest_keys:
+        return []
+    snapshot = _suggest_snapshot
+    if snapshot is None:
+        snapshot = _build_suggest_snapshot()
+    keys, rows = snapshot[field]
+    suggestions = []
+    i = bisect.bisect_left(keys, prefix)
+    while i < len(keys) and len(suggestions) < limit and keys[i].startswith(prefix):
+        suggestions.append(dict(rows[i]))
+        i += 1
+    return suggestions
+
+
+@app.route('/api/suggest')
+def suggest_api():
+    started = time.perf_counter()
+    field = request.args.get("field", "customer")
+    try:
+        limit = max(1, min(int(request.args.get("limit", SUGGEST_LIMIT)), 50))
+    except ValueError:
+        limit = SUGGEST_LIMIT
+    query = request.args.get("q", "")
+    suggestions = suggest(query, field, limit)
+    return jsonify({"query": query, "field": field, "suggestions": suggestions,
+                    "took_ms": round((time.perf_counter() - started) * 1000, 2)})
+
+
+# ---- Duplicate addresses ----
+# The same building typed two ways ("12 N Main Street" / "12 North Main St.") used to get two
+# folders and two competing bids. Street addresses from the search index documents are
+# normalized (USPS-style abbreviations, no punctuation) and indexed by character trigrams.
+# A candidate's score is the Dice similarity of the trigram sets, halved when the house
+# numbers or the zip/city disagree. Above 0.5 a different house number can never match,
+# so a lookup only reads the proposals with the same number. Without a number, it reads the
+# candidates that share one of the query's rarest trigrams (prefix filtering). Either way a
+# check reads a few entries in memory and never lists the share.
+DUPLICATE_MIN_SCORE = float(os.environ.get("DUPLICATE_MIN_SCORE", "0.75"))
+ADDRESS_ABBREVIATIONS = {
+    "street": "st", "str": "st", "avenue": "ave", "av": "ave", "road": "rd", "drive": "dr",
+    "boulevard": "blvd", "parkway": "pkwy", "pky": "pkwy", "court": "ct", "lane": "ln",
+    "place": "pl", "circle": "cir", "highway": "hwy", "terrace": "ter", "trail": "trl",
+    "square": "sq", "north": "n", "south": "s", "east": "e", "west": "w",
+    "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw",
+    "suite": "ste", "apartment": "apt",
 }
 
-def write_fields_to_profit_summary(wb_profit, data: dict):
+_address_keys = {}                                  # id -> (trigrams, house number, (zip5, city))
+_address_postings = collections.defaultdict(set)    # trigram -> ids
+_address_by_number = collections.defaultdict(set)   # house number -> ids
+
+
+def normalize_address(street: str) -> str:
+    tokens = re.findall(r"[a-z0-9]+", str(street or "").casefold())
+    return " ".join(ADDRESS_ABBREVIATIONS.get(t, t) for t in tokens)
+
+
+def _address_key(street: str, city: str, zip_code: str):
+    """(trigrams, house number, (zip5, city)) for a street address, or None if it is blank."""
+    normalized = normalize_address(street)
+    if not normalized:
+        return None
+    padded = f" {normalized} "
+    grams = frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+    location = (re.sub(r"\D", "", str(zip_code or ""))[:5], _suggest_norm(city or ""))
+    return grams, normalized.split(" ", 1)[0], location
+
+
+def _address_set(pid: str, old, new):
+    """Re-index one proposal's street address. Caller holds _search_lock."""
+    key = _address_keys.pop(pid, None)
+    if key:
+        for gram in key[0]:
+            _address_postings[gram].discard(pid)
+            if not _address_postings[gram]:
+                del _address_postings[gram]
+        _address_by_number[key[1]].discard(pid)
+        if not _address_by_number[key[1]]:
+            del _address_by_number[key[1]]
+    prior = new and new.get("prior")
+    key = prior and _address_key(prior["street_address"], prior["city"], prior["zip_code"])
+    if key:
+        _address_keys[pid] = key
+        for gram in key[0]:
+            _address_postings[gram].add(pid)
+        _address_by_number[key[1]].add(pid)
+
+
+def _address_score(key, other) -> float:
+    (grams, number, (zip_code, city)), (other_grams, other_number, (other_zip, other_city)) = key, other
+    score = 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+    if number != other_number and (number.isdigit() or other_number.isdigit()):
+        score *= 0.5
+    if (zip_code and other_zip and zip_code != other_zip) or (
+            not (zip_code and other_zip) and city and other_city and city != other_city):
+        score *= 0.5
+    return score
+
+
+def _address_candidates(key, min_score: float):
+    """Ids that could score >= min_score against key. Caller holds _search_lock."""
+    grams, number, _location = key
+    if min_score > 0.5 and number.isdigit():
+        return _address_by_number.get(number, ())
+    # Dice >= t needs at least ceil(t*|A| / (2-t)) shared grams, so a match must contain one
+    # of the |A| - that + 1 rarest grams of the query
+    needed = math.ceil(min_score * len(grams) / (2 - min_score)) if min_score > 0 else 0
+    by_rarity = sorted(grams, key=lambda g: len(_address_postings.get(g, ())))
+    candidates = set()
+    for gram in by_rarity[:max(1, len(grams) - needed + 1)]:
+        candidates.update(_address_postings.get(gram, ()))
+    return candidates
+
+
+def find_duplicate_addresses(street_address: str, city: str = "", state: str = "", zip_code: str = "",
+                             min_score: float = None, limit: int = 10, exclude=None) -> list:
+    """Existing proposals whose address is likely the same building, best match first."""
+    min_score = DUPLICATE_MIN_SCORE if min_score is None else min_score
+    key = _address_key(street_address, city, zip_code)
+    if not key:
+        return []
+    matches = []
+    with _search_lock:
+        _load_search_locked()
+        for pid in _address_candidates(key, min_score):
+            if pid == exclude:
+                continue
+            score = _address_score(key, _address_keys[pid])
+            if score >= min_score:
+                doc = _search_docs[pid]
+                prior = doc["prior"]
+                matches.append({"id": pid, "stage": doc["stage"], "folder": doc["folder"],
+                                "street_address": prior["street_address"], "city": prior["city"],
+                                "state": prior["state"], "zip_code": prior["zip_code"],
+                                "customer_name": prior["customer_name"], "score": round(score, 3)})
+    matches.sort(key=lambda m: (-m["score"], m["folder"]))
+    return matches[:limit]
+
+
+def duplicate_address_pairs(min_score: float = None) -> list:
+    """(score, id, id) for every pair of proposals, archived ones included, that look like the same building."""
+    min_score = DUPLICATE_MIN_SCORE if min_score is None else min_score
+    pairs = []
+    with _search_lock:
+        _load_search_locked()
+        for pid, key in _address_keys.items():
+            for other in _address_candidates(key, min_score):
+                if pid < other:
+                    score = _address_score(key, _address_keys[other])
+                    if score >= min_score:
+                        pairs.append((round(score, 3), pid, other))
+    pairs.sort(key=lambda p: (-p[0], p[1], p[2]))
+    return pairs
+
+
+@app.route('/api/duplicates')
+def duplicates_api():
+    started = time.perf_counter()
+    args = request.args
+    try:
+        min_score = float(args["min_score"]) if args.get("min_score") else None
+    except ValueError:
+        min_score = None
+    matches = find_duplicate_addresses(args.get("street_address", ""), args.get("city", ""),
+                                       args.get("state", ""), args.get("zip_code", ""),
+                                       min_score=min_score, exclude=args.get("exclude"))
+    return jsonify({"normalized": normalize_address(args.get("street_address", "")), "duplicates": matches,
+                    "took_ms": round((time.perf_counter() - started) * 1000, 2)})
+
+
+@app.cli.command("dedupe-report")
+@click.option("--min-score", type=float, default=None, help="Similarity threshold (default: DUPLICATE_MIN_SCORE).")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write CSV here instead of stdout.")
+def dedupe_report_command(min_score, output):
+    """List proposals in all stages and the archive that look like the same building."""
+    refresh_search_index()
+    pairs = duplicate_address_pairs(min_score)
+    with _search_lock:
+        docs = dict(_search_docs)
+    columns = ("score", "stage_a", "folder_a", "address_a", "stage_b", "folder_b", "address_b")
+    fh = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+    try:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for score, a, b in pairs:
+            row = [score]
+            for pid in (a, b):
+                prior = docs[pid]["prior"]
+                address = ", ".join(v for v in (prior["street_address"], prior["city"], prior["state"],
+                                                prior["zip_code"]) if v)
+                row += [docs[pid]["stage"], docs[pid]["folder"], address]
+            writer.writerow(row)
+    finally:
+        if output:
+            fh.close()
+    if output:
+        click.echo(f"{len(pairs)} likely duplicate pairs written to {output}")
+
+
+# ---- Form decoding ----
+# Submitted proposal forms are described declaratively and compiled once into a decoder
+# that returns every typed value in one pass. Each spec is
+#   (field, kind, aliases, default, empty_is_missing)
+# kinds:
+#   raw           value as posted (default when missing)
+#   text          stripped text
+#   float         "$1,200" -> 1200.0; blank or invalid -> default
+#   float_or_none blank -> None; invalid -> 0.0
+#   int           int(value); blank or invalid -> default
+#   percent       blank -> None; "5", "5%" or 0.05 -> 0.05; invalid -> 0.0
+#   amount        "$1,200" -> 1200.0; unparseable text kept as typed; blank -> left out
+# Aliases are legacy form names tried in order when the main one is blank. A callable
+# default is called with the values decoded so far. empty_is_missing=False keeps a posted
+# empty string instead of falling back to the default (for raw/text fields).
+# Invalid non-blank values keep their legacy fallback but are reported as errors, which the
+# routes show to the user (see _report_form_errors).
+
+
+def _form_field(name, kind="text", aliases=(), default=None, empty_is_missing=True):
+    return (name, kind, tuple(aliases), default, empty_is_missing)
+
+
+def _strip_currency(val: str) -> str:
+    return val.replace('$', '').replace(',', '').strip()
+
+
+def _to_float(raw):
+    """Parse a posted number the way the form always has; returns (value, ok)."""
+    if not isinstance(raw, str):
+        try:
+            return float(raw), True
+        except (TypeError, ValueError):
+            return None, False
+    try:
+        return float(_strip_currency(raw)), True
+    except ValueError:
+        return None, False
+
+
+def _is_blank_form_value(raw) -> bool:
+    return raw is None or str(raw).strip() == '' or (isinstance(raw, str) and _strip_currency(raw) == '')
+
+
+def _compile_form_field(name, kind, aliases, default, empty_is_missing):
+    keys = (name,) + aliases
+    call_default = callable(default)
+
+    def fetch(form):
+        raw = form.get(keys[0])
+        for key in keys[1:]:
+            if not raw:
+                raw = form.get(key)
+        return raw
+
+    def fallback(values):
+        return default(values) if call_default else default
+
+    if kind in ("raw", "text"):
+        strip = kind == "text"
+
+        def decode(form, values, errors):
+            raw = fetch(form)
+            if raw is None or (empty_is_missing and not raw):
+                raw = fallback(values)
+            values[name] = raw.strip() if strip and isinstance(raw, str) else raw
+    elif kind == "float":
+        def decode(form, values, errors):
+            raw = fetch(form)
+            if _is_blank_form_value(raw):
+                values[name] = fallback(values)
+                return
+            value, ok = _to_float(raw)
+            if not ok:
+                errors.append((name, raw, "not a number"))
+                value = fallback(values)
+            values[name] = value
+    elif kind in ("float_or_none", "percent"):
+        percent = kind == "percent"
+
+        def decode(form, values, errors):
+            raw = fetch(form)
+            if raw is None or str(raw).strip() == '':
+                values[name] = None
+                return
+            if percent and isinstance(raw, str):
+                raw = raw.replace('%', '')
+            value, ok = _to_float(raw) if not _is_blank_form_value(raw) else (0.0, True)
+            if not ok:
+                errors.append((name, raw, "not a number"))
+                value = 0.0
+            if percent and value > 1:
+                value = value / 100.0  # e.g., "5" -> 0.05
+            values[name] = value
+    elif kind == "int":
+        def decode(form, values, errors):
+            raw = fetch(form)
+            try:
+                values[name] = int(raw)
+            except (TypeError, ValueError):
+                if not _is_blank_form_value(raw):
+                    errors.append((name, raw, "not a whole number"))
+                values[name] = fallback(values)
+    elif kind == "amount":
+        def decode(form, values, errors):
+            raw = fetch(form)
+            if raw is None or str(raw).strip() == '':
+                return
+            try:
+                values[name] = float(raw.replace('$', '').replace(',', ''))
+            except Exception:
+                values[name] = raw
+    else:
+        raise ValueError(f"Unknown form field kind '{kind}' for {name}")
+    return decode
+
+
+def compile_form_schema(schema):
+    """Turn a list of _form_field specs into decode(form) -> (values, errors)."""
+    steps = tuple(_compile_form_field(*spec) for spec in schema)
+
+    def decode(form):
+        values, errors = {}, []
+        for step in steps:
+            step(form, values, errors)
+        return values, errors
+
+    decode.fields = tuple(spec[0] for spec in schema)
+    return decode
+
+
+_TEXT_FIELDS = ("proposal_note", "proposal_language", "customer_name", "street_address", "city", "state", "zip_code")
+
+# Recalc/save round trip of the proposal details form
+UPDATE_FORM_SCHEMA = (
+    _form_field("squares", "float", default=0.0),
+    _form_field("product", "raw", empty_is_missing=False),
+    _form_field("current_roof", "raw", empty_is_missing=False),
+    _form_field("labor_days", "int", default=0),
+    _form_field("warranty_incl", "text", default="No", empty_is_missing=False),
+    _form_field("previous_warranty_incl", "raw", default=lambda v: v["warranty_incl"], empty_is_missing=False),
+    _form_field("price_per_sq_10", "float", default=0.0),
+    _form_field("commission_pct", "float", default=0.0),
+    _form_field("submitted_by", "raw", empty_is_missing=False),
+    _form_field("previous_submitted_by", "raw", default="", empty_is_missing=False),
+    _form_field("office_fee_pct", "percent"),  # blank -> default from Submitted By in calc
+    _form_field("adjusted_coverage", "float_or_none", aliases=("adjust_coverage",)),
+    _form_field("silicone_units_10", "float_or_none"),
+    _form_field("silicone_price", "float_or_none"),
+    _form_field("gaco_patch_units", "float_or_none"),
+    _form_field("gaco_patch_price", "float_or_none"),
+    _form_field("bleed_trap_units", "float_or_none", aliases=("sw_bleed_trap_units",)),
+    _form_field("bleed_trap_price", "float_or_none", aliases=("sw_bleed_trap_price",)),
+    _form_field("sw_1flash_units", "float_or_none"),
+    _form_field("sw_1flash_price", "float_or_none"),
+    _form_field("sw_bleed_block_units", "float_or_none"),
+    _form_field("sw_bleed_block_price", "float_or_none"),
+    _form_field("drainage_mat_units", "float_or_none"),
+    _form_field("drainage_mat_price", "float_or_none"),
+    _form_field("foam_units", "float_or_none"),
+    _form_field("foam_price", "float_or_none"),
+    _form_field("rfc_labor_price", "float_or_none"),
+    _form_field("pcs_labor_price", "float", default=0.0),
+    _form_field("scarifying_total", "float", default=0.0),
+    _form_field("travel_total", "float", default=0.0),
+    _form_field("misc_costs_total", "float", default=0.0),
+    # Explicit fallbacks that reflect a prior/blank state so changes are detectable
+    _form_field("previous_squares", "float", default=0.0),  # default to 0, not current squares
+    _form_field("previous_roof_type", "raw", default="", empty_is_missing=False),
+    _form_field("previous_product", "raw", default="", empty_is_missing=False),
+    _form_field("previous_adjusted_coverage", "float", default=0.0),
+    # Default to current silicone_units_10 if the hidden field is missing on first render
+    _form_field("previous_silicone_units_10", "float", default=lambda v: v["silicone_units_10"] or 0.0),
+) + tuple(_form_field(name, "text", default="") for name in _TEXT_FIELDS)
+
+# Header fields of the blank form's Create button
+CREATE_FORM_SCHEMA = (
+    _form_field("customer_name", "text", default=""),
+    _form_field("street_address", "text", default=""),
+    _form_field("city", "text", default=""),
+    _form_field("state", "text", default=""),
+    _form_field("zip_code", "text", default=""),
+    _form_field("current_roof", "text", aliases=("roof_type",), default=""),
+    _form_field("squares", "float", default=0),
+    _form_field("warranty_incl", "text", default="No"),
+    _form_field("product", "text", default=""),
+    _form_field("submitted_by", "text", default=""),
+    _form_field("proposal_language", "text", aliases=("includes_text",), default=""),
+)
+
+# Fields carried into the Excel/Word write on create and save; blank numbers are left out
+MAPPED_FORM_SCHEMA = (
+    tuple(_form_field(name, "amount") for name in FORM_MAPPED_NUMBER_FIELDS)
+    + tuple(_form_field(name, "text", default="") for name in FORM_MAPPED_TEXT_FIELDS)
+)
+
+decode_update_form = compile_form_schema(UPDATE_FORM_SCHEMA)
+decode_create_form = compile_form_schema(CREATE_FORM_SCHEMA)
+decode_mapped_form = compile_form_schema(MAPPED_FORM_SCHEMA)
+
+
+# ---- Central Excel mapping & writer ----
+def write_fields_to_profit_summary(wb_profit, data):
     """
-    Writes values from `data` to the first sheet of wb_profit based on EXCEL_CELL_MAP.
-    Fields with mapping None are skipped.
+    Writes values from `data` (a ProposalRecord or a dict) to the first sheet of wb_profit
+    based on EXCEL_CELL_MAP.
     """
-    sht = wb_profit.sheets[0]
-    for field, cell in EXCEL_CELL_MAP.items():
-        if cell:
-            sht.range(cell).value = data.get(field)
+    if not isinstance(data, ProposalRecord):
+        data = ProposalRecord({k: v for k, v in data.items() if k in _PROPOSAL_FIELD_SET})
+    data.write_to_sheet(wb_profit.sheets[0])
+
 
 # ---- Blank defaults for starting without Excel ----
 def make_blank_data():
-    return {
-        "squares": 0,
-        "product": "Uniflex",            # default per request
-        "current_roof": "",               # force user to choose
-        "warranty_incl": "Yes",          # default Yes because product is Uniflex
-        "labor_days": 0,
-        "commission_pct": 0,
-        "submitted_by": "",               # force user to choose
-        "price_per_sq_10": 0,
-        "price_per_sq_15": 0,
-        "price_per_sq_20": 0,
-        "total_price_10": 0,
-        "total_price_15": 0,
-        "total_price_20": 0,
-        "silicone_units_10": 0,
-        "silicone_price": 0,
-        "gaco_patch_units": 0,
-        "gaco_patch_price": 0,
-        "bleed_trap_units": 0,
-        "bleed_trap_price": 0,
-        "sw_1flash_units": 0,
-        "sw_1flash_price": 0,
-        "sw_bleed_block_units": 0,
-        "sw_bleed_block_price": 0,
-        "drainage_mat_units": 0,
-        "drainage_mat_price": 0,
-        "foam_units": 0,
-        "foam_price": 0,
-        "rfc_labor_price": 0,
-        "pcs_labor_price": 0,
-        "scarifying_total": 0,
-        "travel_total": 0,
-        "misc_costs_total": 0,
-        "warranty_10_total": 0,
-        "office_fee_total": 0,
-        "total_cost": 0,
-        "pcs_labor_total": 0,
-        "rfc_labor_total": 0,
-        "pcs_profit": 0,
-        "profit_pct": 0,
-        "daily_profit": 0,
-        "profit_share": 0,
-        "commission_amt": 0,
-        "coverage_10": 0,
-        "coverage_15": 0,
-        "coverage_20": 0,
-        "adjusted_coverage": 0,
-        "office_fee_pct": None,  # None so calc uses Submitted By default
-        "previous_squares": 0,
-        "previous_roof_type": "",         
-        "previous_product": "Uniflex",
-        "previous_warranty_incl": "Yes",
-        "previous_adjusted_coverage": 0,
-        "previous_submitted_by": "",
-        "proposal_note": "",
-        "street_address": "",
-        "city": "",
-        "state": "",
-        "zip_code": "",
-    }
+    return ProposalRecord.blank()
 
 
 # Coverage amounts for Gaco and Uniflex by roof type and warranty duration
@@ -450,6 +4260,19 @@ coverage_amounts = {
     }
 }
 
+def _is_blank_zero_or_nan(v):
+    """True for None, NaN, 0 and anything that is not a number: the routine's "use the default"."""
+    if v is None:
+        return True
+    if isinstance(v, float) and math.isnan(v):
+        return True
+    try:
+        return float(v) == 0.0
+    except (TypeError, ValueError):
+        return True
+
+
+@instrumented("calculation", trace=False)
 def calculation_routine(
     squares,
     product,
@@ -504,16 +4327,6 @@ def calculation_routine(
 
     # Set price_per_sq_* with safe defaults. Allow user override only for 10-yr price.
     # 15/20 are always derived from the pricing tables based on roof_type.
-    def _is_blank_zero_or_nan(v):
-        if v is None:
-            return True
-        if isinstance(v, float) and math.isnan(v):
-            return True
-        try:
-            return float(v) == 0.0
-        except (TypeError, ValueError):
-            return True
-
     try:
         roof_type_index = roof_types.index(roof_type)
         base_pps10 = pricing10[roof_type_index]
@@ -609,15 +4422,6 @@ def calculation_routine(
     if recalc_trigger:
         silicone_units_10 = calc_units_10
     else:
-        def _is_blank_zero_or_nan(v):
-            if v is None:
-                return True
-            if isinstance(v, float) and math.isnan(v):
-                return True
-            try:
-                return float(v) == 0.0
-            except (TypeError, ValueError):
-                return True
         if _is_blank_zero_or_nan(silicone_units_10):
             silicone_units_10 = calc_units_10
 
@@ -1002,25 +4806,386 @@ def calculation_routine(
     return result
 
 
+# ---- Calculation memo ----
+# calculation_routine is a pure function of its arguments, and a recalc round trip usually
+# resubmits exactly the inputs it was last given. Results are kept in a bounded LRU keyed on
+# the arguments, each tagged with its type so that 350, 350.0 and "350" never share an entry
+# (the routine echoes some inputs back unchanged). All NaNs share one key, and the two
+# inputs the routine only ever reads through its blank/zero/NaN check collapse to one key
+# when blank. Callers always get their own copy of the result dict.
+CALC_CACHE_SIZE = int(os.environ.get("CALC_CACHE_SIZE", "1024"))
+CALC_PARAMS = tuple(inspect.signature(calculation_routine).parameters)
+_BLANK_WHEN_ZERO_PARAMS = frozenset(("price_per_sq_10", "office_fee_pct"))
+_NAN_KEY = ("nan",)
+_BLANK_KEY = ("blank",)
+
+_calc_cache = collections.OrderedDict()
+_calc_cache_lock = threading.Lock()
+CALC_CACHE_REQUESTS = Counter("pcs_calculation_cache_requests_total",
+                              "calculation_routine_cached lookups by result.", ("result",))
+CALC_CACHE_ENTRIES = Gauge("pcs_calculation_cache_entries", "Entries in the calculation memo.",
+                           callback=lambda: len(_calc_cache))
+_calc_cache_stats = collections.Counter()   # hit / miss / bypass, kept by the memo itself
+
+
+def _calc_cache_hit_ratio() -> float:
+    with _calc_cache_lock:
+        hits, misses = _calc_cache_stats["hit"], _calc_cache_stats["miss"]
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+CALC_CACHE_HIT_RATIO = Gauge("pcs_calculation_cache_hit_ratio",
+                             "Share of cacheable calculation lookups answered from the memo.",
+                             callback=_calc_cache_hit_ratio)
+
+
+def _calc_arg_key(name, value):
+    if name in _BLANK_WHEN_ZERO_PARAMS and _is_blank_zero_or_nan(value):
+        return _BLANK_KEY
+    if isinstance(value, float) and math.isnan(value):
+        return _NAN_KEY
+    return (type(value).__name__, value)
+
+
+def _calc_cache_key(args, kwargs):
+    bound = dict(zip(CALC_PARAMS, args))
+    bound.update(kwargs)
+    if len(bound) != len(CALC_PARAMS) or len(args) > len(CALC_PARAMS):
+        return None  # let calculation_routine raise its own TypeError
+    try:
+        key = tuple(_calc_arg_key(name, bound[name]) for name in CALC_PARAMS)
+        hash(key)
+    except (KeyError, TypeError):
+        return None  # unknown keyword or unhashable argument: not cacheable
+    return key
+
+
+def calculation_routine_cached(*args, **kwargs) -> dict:
+    """calculation_routine with an LRU memo in front of it; same arguments, same result."""
+    key = _calc_cache_key(args, kwargs) if CALC_CACHE_SIZE > 0 else None
+    if key is None:
+        with _calc_cache_lock:
+            _calc_cache_stats["bypass"] += 1
+        CALC_CACHE_REQUESTS.inc(result="bypass")
+        return calculation_routine(*args, **kwargs)
+    with _calc_cache_lock:
+        cached = _calc_cache.get(key)
+        if cached is not None:
+            _calc_cache.move_to_end(key)
+        _calc_cache_stats["hit" if cached is not None else "miss"] += 1
+    if cached is not None:
+        CALC_CACHE_REQUESTS.inc(result="hit")
+        return dict(cached)
+    CALC_CACHE_REQUESTS.inc(result="miss")
+    result = calculation_routine(*args, **kwargs)
+    with _calc_cache_lock:
+        _calc_cache[key] = dict(result)
+        while len(_calc_cache) > CALC_CACHE_SIZE:
+            _calc_cache.popitem(last=False)
+    return result
+
+
+# ---- Goal seek ----
+# Finds the lowest 10-yr price per square (on a `step` grid) whose recalculated profit_pct,
+# daily_profit or pcs_profit reaches a target, or the most labor days the current price
+# still allows. The calculation is evaluated exactly as a recalc would, so its whole-dollar
+# roundings and ceilings are honoured rather than approximated. Those roundings (office
+# fee, commission, profit share) keep profit within _GOAL_WOBBLE dollars of a straight line
+# in the price, so after the binary search only a short strip can still hold a lower
+# answer, and it is scanned point by point.
+GOAL_METRICS = ("profit_pct", "daily_profit", "pcs_profit")
+GOAL_MAX_PRICE = float(os.environ.get("GOAL_MAX_PRICE", "10000"))   # per square
+GOAL_MAX_LABOR_DAYS = int(os.environ.get("GOAL_MAX_LABOR_DAYS", "1000"))
+_GOAL_WOBBLE = 2.0
+
+
+def _goal_excess(result: dict, metric: str, target: float) -> float:
+    """Smooth stand-in for result[metric] - target, in dollars of PCS profit (>= 0 when met)."""
+    if metric == "profit_pct":     # ROUND(profit / price, 2) >= t  <=>  profit >= (t - 0.005) * price
+        return result["pcs_profit"] - (target - 0.005) * result["total_price_10"]
+    if metric == "daily_profit":   # ROUND(profit / days, 0) >= t  <=>  profit >= (t - 0.5) * days
+        return result["pcs_profit"] - (target - 0.5) * result["labor_days"]
+    return result["pcs_profit"] - target
+
+
+def _goal_extreme(meets, excess, bound: int, lo: int, hi: int) -> int:
+    """The met point nearest `bound`, given not meets(lo), meets(hi) and lo between bound and hi."""
+    step = 1 if hi > lo else -1
+    span = abs(hi - bound)
+    # Lower bound on how much the excess grows per grid point towards hi
+    slope = (excess(hi) - excess(bound) - 2 * _GOAL_WOBBLE) / span if span else 0.0
+    while abs(hi - lo) > 1:
+        mid = (lo + hi) // 2
+        if meets(mid):
+            hi = mid
+        else:
+            lo = mid
+    # A met point beyond lo would have to be within 2 * _GOAL_WOBBLE of lo's excess
+    reach = int(2 * _GOAL_WOBBLE / slope) + 1 if slope > 0 else abs(lo - bound)
+    start = max(bound, lo - reach) if step == 1 else min(bound, lo + reach)
+    for k in range(start, hi, step):
+        if meets(k):
+            return k
+    return hi
+
+
+def goal_seek(calc_kwargs: dict, metric: str, target: float, solve: str = "price", step: float = 1.0) -> dict:
+    """Lowest price_per_sq_10 (or highest labor_days) at which `metric` reaches `target`.
+
+    Raises ValueError if the target cannot be reached within GOAL_MAX_PRICE / GOAL_MAX_LABOR_DAYS.
+    """
+    if metric not in GOAL_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; expected one of {', '.join(GOAL_METRICS)}.")
+    if solve not in ("price", "labor_days"):
+        raise ValueError("solve must be 'price' or 'labor_days'.")
+    if not step or step <= 0:
+        raise ValueError("step must be positive.")
+    current = calculation_routine_cached(**calc_kwargs)
+    # Feed back what the recalc returned, as the form does: with previous_* equal to the current
+    # inputs the routine keeps the price, labor days and office fee it is given
+    fixed = dict(calc_kwargs)
+    fixed.update({name: current[name] for name in CALC_PARAMS if name in current})
+    evaluated = {}   # probes also go through the memo, so re-running a goal seek is cheap
+
+    def evaluate(name, value):
+        if value not in evaluated:
+            evaluated[value] = calculation_routine_cached(**dict(fixed, **{name: value}))
+        return evaluated[value]
+
+    if solve == "price":
+        def at(k):
+            return evaluate("price_per_sq_10", round(k * step, 6))
+        limit = int(GOAL_MAX_PRICE // step)
+        hi = max(2, math.ceil((current["price_per_sq_10"] or step) / step))
+        lo = 1
+        # Price 0 means "use the table price" to the routine, so the grid starts at one step
+        if at(1)[metric] >= target:
+            hi = 1
+        else:
+            while at(hi)[metric] < target:
+                if hi >= limit:
+                    raise ValueError(f"{metric} {target} is not reached below ${GOAL_MAX_PRICE:,.0f} per square.")
+                lo, hi = hi, min(hi * 2, limit)
+            hi = _goal_extreme(lambda k: at(k)[metric] >= target,
+                               lambda k: _goal_excess(at(k), metric, target), 1, lo, hi)
+        best = at(hi)
+    else:
+        def at(d):
+            return evaluate("labor_days", d)
+        if at(1)[metric] < target:
+            raise ValueError(f"{metric} {target} is not reached at this price even with one labor day.")
+        met = 1
+        fail = max(2, int(current["labor_days"] or 1))
+        while at(fail)[metric] >= target:
+            if fail >= GOAL_MAX_LABOR_DAYS:
+                raise ValueError(f"{metric} {target} is still met at {GOAL_MAX_LABOR_DAYS} labor days.")
+            met, fail = fail, min(fail * 2, GOAL_MAX_LABOR_DAYS)
+        bound = min(fail * 2, GOAL_MAX_LABOR_DAYS)
+        best = at(_goal_extreme(lambda d: at(d)[metric] >= target,
+                                lambda d: _goal_excess(at(d), metric, target), bound, fail, met))
+
+    def summary(result):
+        return {name: result[name] for name in ("price_per_sq_10", "labor_days", "total_price_10",
+                                                "pcs_profit", "profit_pct", "daily_profit")}
+
+    return {"metric": metric, "target": target, "solve": solve, "step": step,
+            "price_per_sq_10": best["price_per_sq_10"], "labor_days": best["labor_days"],
+            "result": summary(best), "current": summary(current), "evaluations": len(evaluated)}
+
+
+@app.route('/api/goal-seek', methods=['POST'])
+def goal_seek_api():
+    """Solve on the posted proposal form; goal_metric, goal_target, goal_solve and goal_step pick the goal."""
+    started = time.perf_counter()
+    fields, form_errors = decode_update_form(request.form)
+    form_messages = _report_form_errors("goal-seek", form_errors)
+    data = ProposalRecord(fields, coverage_10=0, coverage_15=0, coverage_20=0)
+    metric = request.form.get("goal_metric", "profit_pct")
+    target, ok = _to_float(request.form.get("goal_target", ""))
+    if not ok or target is None:
+        return jsonify({"error": "goal_target must be a number."}), 400
+    if metric == "profit_pct" and target > 1:
+        target /= 100   # "35" means 35%
+    step, ok = _to_float(request.form.get("goal_step") or "1")
+    try:
+        with timed("goal_seek", metric=metric):
+            result = goal_seek(data.calc_kwargs(), metric, target, request.form.get("goal_solve", "price"),
+                               step if ok else 1.0)
+    except ValueError as e:
+        return jsonify({"error": str(e), "form_errors": form_messages}), 422
+    result["form_errors"] = form_messages
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(result)
+
+
+# ---- Margin risk simulation ----
+# A proposal shows one pcs_profit, but jobs overrun their labor days and material counts and
+# supplier prices move. /api/simulate draws multipliers for those inputs and recomputes the
+# cost side of calculation_routine for every draw at once with NumPy, with the same
+# whole-number rounding. The price side does not change between draws, so total price,
+# office fee and commission come from a single normal calculation. Distributions apply to
+# a group ("labor_days", "coverage" for every material count, "unit_prices" for every
+# material price) or to one field such as "foam_units", which wins over its group.
+SIMULATION_MAX_DRAWS = int(os.environ.get("SIMULATION_MAX_DRAWS", "200000"))
+SIMULATION_MATERIALS = (
+    ("silicone_units_10", "silicone_price"), ("gaco_patch_units", "gaco_patch_price"),
+    ("bleed_trap_units", "bleed_trap_price"), ("sw_bleed_block_units", "sw_bleed_block_price"),
+    ("sw_1flash_units", "sw_1flash_price"), ("drainage_mat_units", "drainage_mat_price"),
+    ("foam_units", "foam_price"),
+)
+SIMULATION_GROUPS = {
+    "labor_days": ("labor_days",),
+    "coverage": tuple(units for units, _price in SIMULATION_MATERIALS),
+    "unit_prices": tuple(price for _units, price in SIMULATION_MATERIALS),
+}
+# Multipliers on the proposal's own values
+SIMULATION_DEFAULTS = {
+    "labor_days": {"dist": "triangular", "low": 0.9, "mode": 1.0, "high": 1.5},
+    "coverage": {"dist": "triangular", "low": 0.95, "mode": 1.0, "high": 1.25},
+    "unit_prices": {"dist": "triangular", "low": 0.97, "mode": 1.0, "high": 1.10},
+}
+SIMULATION_PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+_CEILED_UNITS = frozenset(("silicone_units_10",))   # the routine rounds these up, not half-up
+
+
+def _excel_round_array(values, digits=0):
+    """excel_round(v, digits) for an array: halves round away from zero, like Decimal ROUND_HALF_UP."""
+    scale = 10.0 ** digits
+    # excel_round rounds the repr (str) of the float; 9 places absorbs the binary noise it hides
+    magnitude = np.round(np.abs(values) * scale, 9)
+    rounded = np.floor(magnitude)
+    rounded += (magnitude - rounded) >= 0.5
+    return np.copysign(rounded, values) / scale
+
+
+def _sample_multipliers(rng, spec: dict, draws: int):
+    kind = spec.get("dist", "triangular")
+    if kind == "fixed":
+        return np.full(draws, float(spec.get("value", 1.0)))
+    if kind == "uniform":
+        return rng.uniform(float(spec["low"]), float(spec["high"]), draws)
+    if kind == "triangular":
+        low, high = float(spec["low"]), float(spec["high"])
+        mode = float(spec.get("mode", (low + high) / 2))
+        if not low <= mode <= high or low == high:
+            raise ValueError(f"triangular needs low <= mode <= high and low < high, got {spec}")
+        return rng.triangular(low, mode, high, draws)
+    if kind == "normal":
+        return np.maximum(rng.normal(float(spec.get("mean", 1.0)), float(spec["sd"]), draws), 0.0)
+    if kind == "lognormal":   # median and sigma of the log
+        return float(spec.get("median", 1.0)) * rng.lognormal(0.0, float(spec["sigma"]), draws)
+    raise ValueError(f"Unknown distribution {kind!r}; use fixed, uniform, triangular, normal or lognormal.")
+
+
+def simulate_margin(calc_kwargs: dict, distributions=None, draws: int = 10000, seed=None) -> dict:
+    """Profit percentiles and probability of loss under random overruns of the proposal's inputs."""
+    if not 1 <= draws <= SIMULATION_MAX_DRAWS:
+        raise ValueError(f"draws must be between 1 and {SIMULATION_MAX_DRAWS}.")
+    specs = dict(SIMULATION_DEFAULTS)
+    specs.update(distributions or {})
+    unknown = set(specs) - set(SIMULATION_GROUPS) - {f for fields in SIMULATION_GROUPS.values() for f in fields}
+    if unknown:
+        raise ValueError(f"Unknown simulation inputs: {', '.join(sorted(unknown))}.")
+    for spec in specs.values():
+        _sample_multipliers(np.random.default_rng(0), spec, 1)   # reject bad specs before any work
+    current = calculation_routine_cached(**calc_kwargs)
+    rng = np.random.default_rng(seed)
+
+    def value(name):
+        v = current.get(name)
+        return 0.0 if v is None or (isinstance(v, float) and math.isnan(v)) else float(v)
+
+    def sampled(name, group):
+        spec = specs.get(name) or specs.get(group)
+        base = value(name)
+        if not spec or base == 0:
+            return np.full(draws, base)
+        return base * _sample_multipliers(rng, spec, draws)
+
+    # Whole labor days, as the routine's ceil(squares / rate) produces; 0 stays 0
+    labor_days = np.ceil(sampled("labor_days", "labor_days"))
+    materials = np.zeros(draws)
+    for units, price in SIMULATION_MATERIALS:
+        counts = sampled(units, "coverage")
+        counts = np.ceil(counts) if units in _CEILED_UNITS else _excel_round_array(counts)
+        materials += counts * _excel_round_array(sampled(price, "unit_prices"))
+
+    total_price = value("total_price_10")
+    fixed_costs = sum(value(name) for name in (
+        "rfc_labor_total", "scarifying_total", "travel_total", "misc_costs_total", "warranty_10_total",
+        "office_fee_total", "commission_amt"))
+    total_cost = materials + value("pcs_labor_price") * labor_days + fixed_costs
+    profit_share = _excel_round_array(PROFIT_SHARE_PCT * (total_price - total_cost))
+    pcs_profit = total_price - total_cost - profit_share
+    profit_pct = _excel_round_array(pcs_profit / total_price, 2) if total_price else np.zeros(draws)
+    has_days = labor_days > 0
+    daily_profit = np.where(has_days, _excel_round_array(pcs_profit / np.where(has_days, labor_days, 1.0)), 0.0)
+
+    def stats(values):
+        points = np.percentile(values, SIMULATION_PERCENTILES)
+        return {"mean": float(values.mean()), "std": float(values.std()),
+                "percentiles": {f"p{p}": float(v) for p, v in zip(SIMULATION_PERCENTILES, points)}}
+
+    return {
+        "draws": draws, "seed": seed, "distributions": specs,
+        "deterministic": {name: current[name] for name in ("pcs_profit", "profit_pct", "daily_profit",
+                                                            "labor_days", "total_price_10")},
+        "pcs_profit": stats(pcs_profit), "profit_pct": stats(profit_pct), "daily_profit": stats(daily_profit),
+        "probability_of_loss": float((pcs_profit < 0).mean()),
+        "probability_below_deterministic": float((pcs_profit < current["pcs_profit"]).mean()),
+    }
+
+
+@app.route('/api/simulate', methods=['POST'])
+def simulate_api():
+    """Monte Carlo on the posted proposal form, or on JSON {"inputs", "distributions", "draws", "seed"}."""
+    started = time.perf_counter()
+    if request.is_json:
+        body = request.get_json(silent=True) or {}
+        inputs, distributions = body.get("inputs") or {}, body.get("distributions")
+        draws, seed = body.get("draws", 10000), body.get("seed")
+    else:
+        inputs = request.form
+        try:
+            distributions = json.loads(request.form.get("sim_distributions") or "null")
+        except ValueError:
+            return jsonify({"error": "sim_distributions must be JSON."}), 400
+        draws, seed = request.form.get("sim_draws", 10000), request.form.get("sim_seed") or None
+    fields, form_errors = decode_update_form(inputs)
+    form_messages = _report_form_errors("simulate", form_errors)
+    data = ProposalRecord(fields, coverage_10=0, coverage_15=0, coverage_20=0)
+    try:
+        with timed("simulate", draws=draws):
+            result = simulate_margin(data.calc_kwargs(), distributions, int(draws),
+                                     None if seed is None else int(seed))
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid simulation request: {e}", "form_errors": form_messages}), 400
+    result["form_errors"] = form_messages
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(result)
+
+
 @app.route('/')
 def proposal_list():
     # Which tab is selected: 'open' (default) or 'under'
     status = (request.args.get('status') or 'open').strip().lower()
 
-    # Collect Open Proposals from PROPOSALS_DIR
+    # Collect Open Proposals from PROPOSALS_DIR (or its local mirror)
+    proposals_dir = mirror_read_path(PROPOSALS_DIR)
     try:
         open_folders = [
-            f for f in os.listdir(PROPOSALS_DIR)
-            if os.path.isdir(os.path.join(PROPOSALS_DIR, f))
+            f for f in os.listdir(proposals_dir)
+            if os.path.isdir(os.path.join(proposals_dir, f))
         ]
     except Exception:
         open_folders = []
 
-    # Collect Under Contract from CONTRACTS_DIR
+    # Collect Under Contract from CONTRACTS_DIR (or its local mirror)
+    contracts_dir = mirror_read_path(CONTRACTS_DIR)
     try:
         contract_folders = [
-            f for f in os.listdir(CONTRACTS_DIR)
-            if os.path.isdir(os.path.join(CONTRACTS_DIR, f))
+            f for f in os.listdir(contracts_dir)
+            if os.path.isdir(os.path.join(contracts_dir, f))
         ]
     except Exception:
         contract_folders = []
@@ -1028,14 +5193,23 @@ def proposal_list():
     open_folders.sort(key=str.lower)
     contract_folders.sort(key=str.lower)
 
+    # Link by stable ID where the folder is indexed; unindexed folders fall back to their name
+    folder_ids = {}
+    for stage, folders in (("proposals", open_folders), ("contracts", contract_folders)):
+        for f in folders:
+            folder_ids[f] = proposal_id_for(stage, f) or f
+
     return render_template(
         'proposal_list.html',
         open_folders=open_folders,
         contract_folders=contract_folders,
+        folder_ids=folder_ids,
+        generating=generating_folders(),
         status=status,
     )
 
 def find_profit_summary_file(folder_path):
+    folder_path = mirror_read_path(folder_path)
     # Safely handle missing/non-existent folder
     if not folder_path or not os.path.isdir(folder_path):
         return None
@@ -1046,12 +5220,221 @@ def find_profit_summary_file(folder_path):
 
 
 
+# ---- Artifact downloads ----
+# Files are served with send_file so the WSGI server can use sendfile(2); conditional=True
+# gives 304s for matching ETags and honours Range requests. ETags are strong, built from
+# size + mtime_ns + inode, so they change whenever a save regenerates the file.
+ARTIFACT_EXTENSIONS = (".pdf", ".docx", ".xlsm", ".xlsx")
+_DOWNLOAD_CHUNK = 1024 * 1024
+
+
+def list_artifact_files(folder_path: str):
+    """Downloadable files in a proposal folder, sorted by name."""
+    try:
+        names = os.listdir(folder_path)
+    except OSError:
+        return []
+    return sorted(f for f in names if f.lower().endswith(ARTIFACT_EXTENSIONS) and not f.startswith((".", "~$")))
+
+
+def _file_etag(st) -> str:
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}-{st.st_ino:x}"
+
+
+@app.route('/proposal/<proposal_id>/files')
+def list_artifacts(proposal_id):
+    resolved = resolve_proposal(proposal_id, restore=False)
+    if not resolved:
+        return jsonify(error="unknown proposal"), 404
+    pid, stage, folder_path = resolved
+    if _archive_entry(pid):
+        names = [n for n in list_archived_files(pid) if n.lower().endswith(ARTIFACT_EXTENSIONS)]
+    else:
+        names = list_artifact_files(mirror_read_path(folder_path))
+    return jsonify(
+        id=pid,
+        stage=stage,
+        files=[{"name": n, "url": url_for('download_artifact', proposal_id=pid, filename=n)} for n in names],
+        zip_url=url_for('download_folder_zip', proposal_id=pid),
+    )
+
+
+@app.route('/proposal/<proposal_id>/files/<filename>')
+def download_artifact(proposal_id, filename):
+    filename = os.path.basename(filename)
+    if not filename.lower().endswith(ARTIFACT_EXTENSIONS):
+        return "Not a proposal artifact", 404
+    resolved = resolve_proposal(proposal_id, restore=False)
+    if not resolved:
+        return "Proposal not found", 404
+    pid, _stage, folder_path = resolved
+    as_attachment = request.args.get('download') in ('1', 'true', 'yes')
+
+    entry = _archive_entry(pid)
+    if entry:
+        # Serve straight out of the archive without restoring the folder. Archives are
+        # immutable, so the archive name identifies the bytes; zip members are streamed
+        # without Range support since their length isn't known up front.
+        try:
+            member = open_archived_file(pid, filename)
+        except FileNotFoundError:
+            return "File not found", 404
+        return send_file(
+            member,
+            download_name=filename,
+            as_attachment=as_attachment,
+            conditional=True,
+            etag=f"{entry['archive']}-{pid}-{filename}",
+        )
+
+    path = os.path.join(mirror_read_path(folder_path), filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "File not found", 404
+    return send_file(
+        path,
+        as_attachment=as_attachment,
+        conditional=True,
+        etag=_file_etag(st),
+        last_modified=st.st_mtime,
+        max_age=0,
+    )
+
+
+class _ZipStreamBuffer:
+    """Write-only sink for zipfile; drained after every chunk so memory use stays constant."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_folder_zip(members):
+    """
+    Yield a zip file built on the fly from (arcname, opener, date_time) tuples.
+    No temporary file is written; each member is streamed in 1 MB chunks.
+    """
+    buf = _ZipStreamBuffer()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for arcname, opener, date_time in members:
+            zinfo = zipfile.ZipInfo(arcname, date_time=date_time)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with opener() as src, zf.open(zinfo, "w") as dest:
+                for chunk in iter(lambda: src.read(_DOWNLOAD_CHUNK), b""):
+                    dest.write(chunk)
+                    data = buf.drain()
+                    if data:
+                        yield data
+            data = buf.drain()
+            if data:
+                yield data
+    yield buf.drain()
+
+
+@app.route('/proposal/<proposal_id>/download.zip')
+def download_folder_zip(proposal_id):
+    resolved = resolve_proposal(proposal_id, restore=False)
+    if not resolved:
+        return "Proposal not found", 404
+    pid, _stage, folder_path = resolved
+    folder_name = os.path.basename(folder_path)
+
+    members = []
+    if _archive_entry(pid):
+        now = datetime.datetime.now().timetuple()[:6]
+        for name in list_archived_files(pid):
+            if name.lower().endswith(ARTIFACT_EXTENSIONS):
+                members.append((name, functools.partial(open_archived_file, pid, name), now))
+    else:
+        read_folder = mirror_read_path(folder_path)
+        for name in list_artifact_files(read_folder):
+            path = os.path.join(read_folder, name)
+            date_time = time.localtime(os.path.getmtime(path))[:6]
+            members.append((name, functools.partial(open, path, "rb"), date_time))
+    if not members:
+        return "No files to download", 404
+
+    return Response(
+        _iter_folder_zip(members),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(folder_name)}.zip"},
+    )
+
+
+def _flash_move_result(result: dict, label: str, done_msg: str):
+    if result["status"] == "error":
+        flash(result["error"], "error")
+    elif result["status"] == "queued":
+        flash(f"{label} '{result['folder']}' is being copied to another volume; "
+              f"it will move when the copy is verified (job {result['job_id']}).", "success")
+    else:
+        flash(f"{label} '{result['folder']}' {done_msg}", "success")
+
+
+@app.route('/api/proposals/move', methods=['POST'])
+def bulk_move_proposals():
+    """
+    Move many proposals in one call.
+    Body: JSON {"ids": [...], "stage": "dead"} or form fields ids=...&stage=...
+    """
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get("ids") or request.form.getlist("ids")
+    stage = (payload.get("stage") or request.form.get("stage") or "").strip().lower()
+    if stage not in STAGE_DIRS:
+        return jsonify(error=f"stage must be one of {', '.join(STAGE_DIRS)}"), 400
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) and i.strip() for i in ids):
+        return jsonify(error="ids must be a non-empty list of proposal IDs"), 400
+    results = move_proposals(ids, stage)
+    summary = {s: sum(1 for r in results if r["status"] == s) for s in ("moved", "queued", "error")}
+    return jsonify(results=results, **summary)
+
+
+@app.route('/api/move-jobs/<job_id>')
+def move_job_status(job_id):
+    job = get_move_job(job_id)
+    if job is None:
+        return jsonify(error="unknown job"), 404
+    return jsonify(job)
+
+
+def _report_form_errors(folder_name, errors) -> list:
+    """Log the invalid form values that were ignored; returns one message per value for the user."""
+    if errors:
+        print(f"Proposal {folder_name}: ignored invalid form values: "
+              + "; ".join(f"{name}={raw!r} ({message})" for name, raw, message in errors))
+    return [f"{name.replace('_', ' ')}: {raw!r} is {message}" for name, raw, message in errors]
+
+
+def _flash_form_errors(folder_name, errors):
+    for message in _report_form_errors(folder_name, errors):
+        flash(f"Ignored invalid value, {message}.", "warning")
+
+
 @app.route('/update-proposal/<folder_name>', methods=['POST'])
 def update_proposal(folder_name):
-    folder_path = os.path.join(PROPOSALS_DIR, folder_name)
     allow_blank = (folder_name in ("NEW", "__blank__"))
+    folder_path = None
+    stage = None
+    if not allow_blank:
+        resolved = resolve_proposal(folder_name)
+        if resolved:
+            stage, folder_path = resolved[1], resolved[2]
 
     action = (request.form.get('action') or '').strip().lower()
+    if action == 'save' and stage in CLOSED_STAGES:
+        return f"Proposal {folder_name} is {stage} and can no longer be saved.", 403
 
     excel_file = None
     if not allow_blank:
@@ -1059,193 +5442,57 @@ def update_proposal(folder_name):
         if not excel_file:
             return f"No 'Profit Summary' Excel file found in {folder_name}", 404
 
-    # Collect updated data from the form and convert to appropriate types
-    def parse_float(val, default=0.0):
-        try:
-            if val is None:
-                return default
-            if isinstance(val, str):
-                cleaned = val.replace('$', '').replace(',', '').strip()
-                if cleaned == '':
-                    return default
-                return float(cleaned)
-            return float(val)
-        except (TypeError, ValueError):
-            return default
-
-    def parse_int(val, default=0):
-        try:
-            return int(val)
-        except (TypeError, ValueError):
-            return default
-
     # If the Blank Proposal flow hits the Create button, build artifacts and redirect
+    duplicates = []
     if allow_blank and action == 'create':
         # Pull the minimal required fields from the posted form
-        customer_name = (request.form.get('customer_name') or '').strip()
-        street_address = (request.form.get('street_address') or '').strip()
-        city = (request.form.get('city') or '').strip()
-        state = (request.form.get('state') or '').strip()
-        zip_code = (request.form.get('zip_code') or '').strip()
-        roof_type = (request.form.get('current_roof') or request.form.get('roof_type') or '').strip()
+        fields, form_errors = decode_create_form(request.form)
+        _flash_form_errors(folder_name, form_errors)
+        # The same building under another spelling: show the form again with the matches,
+        # and create on the second press (which posts confirm_duplicate)
+        if request.form.get("confirm_duplicate") != "1":
+            with timed("duplicate_check"):
+                duplicates = find_duplicate_addresses(fields["street_address"], fields["city"],
+                                                      fields["state"], fields["zip_code"])
+    if allow_blank and action == 'create' and not duplicates:
         try:
-            total_squares = int(parse_float(request.form.get('squares'), 0))
+            total_squares = int(fields["squares"])
         except Exception:
             total_squares = 0
-        warranty_incl = (request.form.get('warranty_incl') or 'No').strip()
-        product = (request.form.get('product') or '').strip()
-        submitted_by = (request.form.get('submitted_by') or '').strip()
-        includes_text = (request.form.get('includes_text') or '').strip()
-        proposal_language = (request.form.get('proposal_language') or includes_text or '').strip()
-
-        # Collect any additional mapped fields present on the form for initial write
-        def _pf(name, default=None):
-            val = request.form.get(name)
-            if val is None or str(val).strip() == '':
-                return default
-            try:
-                return float(val.replace('$','').replace(',',''))
-            except Exception:
-                return val
-
-        mapped_data_full = {
-            "price_per_sq_10": _pf("price_per_sq_10"),
-            "labor_days": _pf("labor_days"),
-            "silicone_units_10": _pf("silicone_units_10"),
-            "gaco_patch_units": _pf("gaco_patch_units"),
-            "bleed_trap_units": _pf("bleed_trap_units"),
-            "sw_1flash_units": _pf("sw_1flash_units"),
-            "sw_bleed_block_units": _pf("sw_bleed_block_units"),
-            "drainage_mat_units": _pf("drainage_mat_units"),
-            "foam_units": _pf("foam_units"),
-            "silicone_price": _pf("silicone_price"),
-            "gaco_patch_price": _pf("gaco_patch_price"),
-            "bleed_trap_price": _pf("bleed_trap_price"),
-            "sw_1flash_price": _pf("sw_1flash_price"),
-            "sw_bleed_block_price": _pf("sw_bleed_block_price"),
-            "drainage_mat_price": _pf("drainage_mat_price"),
-            "foam_price": _pf("foam_price"),
-            "rfc_labor_price": _pf("rfc_labor_price"),
-            "pcs_labor_price": _pf("pcs_labor_price"),
-            "scarifying_total": _pf("scarifying_total"),
-            "travel_total": _pf("travel_total"),
-            "misc_costs_total": _pf("misc_costs_total"),
-            "proposal_note": (request.form.get("proposal_note") or "").strip(),
-            "proposal_language": (request.form.get("proposal_language") or "").strip(),
-            "total_price_10": _pf("total_price_10"),
-            "total_price_15": _pf("total_price_15"),
-            "total_price_20": _pf("total_price_20"),
-        }
-        # Remove Nones to avoid overwriting with blanks
-        mapped_data_full = {k: v for k, v in mapped_data_full.items() if v is not None}
+
+        # Fields present on the form for the Excel/Word write (blank numbers are left out)
+        mapped_data_full = ProposalRecord.from_form_mapped(request.form)
 
         # Create artifacts using the helper (same behavior as /new)
-        new_folder = create_proposal_from_fields(
-            customer_name=customer_name,
-            street_address=street_address,
-            city=city,
-            state=state,
-            zip_code=zip_code,
-            roof_type=roof_type,
+        generate = functools.partial(
+            create_proposal_from_fields,
+            customer_name=fields["customer_name"],
+            street_address=fields["street_address"],
+            city=fields["city"],
+            state=fields["state"],
+            zip_code=fields["zip_code"],
+            roof_type=fields["current_roof"],
             total_squares=total_squares,
-            warranty_incl=warranty_incl,
-            product=product,
-            proposal_language=proposal_language,
-            submitted_by=submitted_by,
+            warranty_incl=fields["warranty_incl"],
+            product=fields["product"],
+            proposal_language=fields["proposal_language"],
+            submitted_by=fields["submitted_by"],
             mapped_data=mapped_data_full,
-            pdf_async=True,
+            pdf_async=not BACKGROUND_GENERATION,
             use_libreoffice=True,
         )
-        return redirect(url_for('proposal_list'))
-
-    squares = parse_float(request.form.get('squares'))
-    product = request.form.get('product')
-    roof_type = request.form.get('current_roof')
-    labor_days = parse_int(request.form.get('labor_days'))
-    warranty_incl = request.form.get('warranty_incl', 'No').strip()
-    previous_warranty_incl = request.form.get('previous_warranty_incl', warranty_incl)
-    price_per_sq_10 = parse_float(request.form.get('price_per_sq_10'))
-    commission_pct = parse_float(request.form.get('commission_pct'))
-
-    submitted_by = request.form.get('submitted_by')
-    previous_submitted_by = request.form.get('previous_submitted_by', '')
-
-    raw_office_fee_pct = request.form.get('office_fee_pct')
-    if raw_office_fee_pct is None or str(raw_office_fee_pct).strip() == '':
-        office_fee_pct = None  # allow defaulting based on Submitted By in calc
-    else:
-        cleaned_office = str(raw_office_fee_pct).replace('%', '').strip()
-        office_fee_value = parse_float(cleaned_office)
-        if office_fee_value is None:
-            office_fee_pct = None
-        elif office_fee_value > 1:
-            office_fee_pct = office_fee_value / 100.0  # e.g., "5" -> 0.05
+        if BACKGROUND_GENERATION:
+            submit_generation(f"{fields['customer_name']} - {fields['street_address']}", generate)
         else:
-            office_fee_pct = office_fee_value         # already decimal like 0.05
-
-    raw_adjusted_coverage = request.form.get('adjusted_coverage') or request.form.get('adjust_coverage')
-    adjusted_coverage = None if raw_adjusted_coverage is None or str(raw_adjusted_coverage).strip() == '' else parse_float(raw_adjusted_coverage)
-    raw_silicone_units_10 = request.form.get('silicone_units_10')
-    silicone_units_10 = None if raw_silicone_units_10 is None or str(raw_silicone_units_10).strip() == '' else parse_float(raw_silicone_units_10)
-    raw_silicone_price = request.form.get('silicone_price')
-    silicone_price = None if raw_silicone_price is None or str(raw_silicone_price).strip() == '' else parse_float(raw_silicone_price)
-    raw_gaco_patch_units = request.form.get('gaco_patch_units')
-    gaco_patch_units = None if raw_gaco_patch_units is None or str(raw_gaco_patch_units).strip() == '' else parse_float(raw_gaco_patch_units)
-    raw_gaco_patch_price = request.form.get('gaco_patch_price')
-    gaco_patch_price = None if raw_gaco_patch_price is None or str(raw_gaco_patch_price).strip() == '' else parse_float(raw_gaco_patch_price)
-    raw_bleed_trap_units = request.form.get('bleed_trap_units') or request.form.get('sw_bleed_trap_units')
-    bleed_trap_units = None if raw_bleed_trap_units is None or str(raw_bleed_trap_units).strip() == '' else parse_float(raw_bleed_trap_units)
-    raw_bleed_trap_price = request.form.get('bleed_trap_price') or request.form.get('sw_bleed_trap_price')
-    bleed_trap_price = None if raw_bleed_trap_price is None or str(raw_bleed_trap_price).strip() == '' else parse_float(raw_bleed_trap_price)
-    raw_sw_1flash_units = request.form.get('sw_1flash_units')
-    sw_1flash_units = None if raw_sw_1flash_units is None or str(raw_sw_1flash_units).strip() == '' else parse_float(raw_sw_1flash_units)
-    raw_sw_1flash_price = request.form.get('sw_1flash_price')
-    sw_1flash_price = None if raw_sw_1flash_price is None or str(raw_sw_1flash_price).strip() == '' else parse_float(raw_sw_1flash_price)
-    raw_sw_bleed_block_units = request.form.get('sw_bleed_block_units')
-    sw_bleed_block_units = None if raw_sw_bleed_block_units is None or str(raw_sw_bleed_block_units).strip() == '' else parse_float(raw_sw_bleed_block_units)
-    raw_sw_bleed_block_price = request.form.get('sw_bleed_block_price')
-    sw_bleed_block_price = None if raw_sw_bleed_block_price is None or str(raw_sw_bleed_block_price).strip() == '' else parse_float(raw_sw_bleed_block_price)
-    raw_drainage_mat_units = request.form.get('drainage_mat_units')
-    drainage_mat_units = None if raw_drainage_mat_units is None or str(raw_drainage_mat_units).strip() == '' else parse_float(raw_drainage_mat_units)
-    raw_drainage_mat_price = request.form.get('drainage_mat_price')
-    drainage_mat_price = None if raw_drainage_mat_price is None or str(raw_drainage_mat_price).strip() == '' else parse_float(raw_drainage_mat_price)
-    raw_foam_units = request.form.get('foam_units')
-    foam_units = None if raw_foam_units is None or str(raw_foam_units).strip() == '' else parse_float(raw_foam_units)
-    raw_foam_price = request.form.get('foam_price')
-    foam_price = None if raw_foam_price is None or str(raw_foam_price).strip() == '' else parse_float(raw_foam_price)
-    raw_rfc_labor_price = request.form.get('rfc_labor_price')
-    rfc_labor_price = None if raw_rfc_labor_price is None or str(raw_rfc_labor_price).strip() == '' else parse_float(raw_rfc_labor_price)
-    pcs_labor_price = parse_float(request.form.get('pcs_labor_price'))
-    raw_scarifying_total = request.form.get('scarifying_total')
-    scarifying_total = parse_float(raw_scarifying_total)
-    travel_total = parse_float(request.form.get('travel_total'))
-    misc_costs_total = parse_float(request.form.get('misc_costs_total'))
-    # Use explicit fallbacks that reflect a prior/blank state so changes are detectable
-    _prev_sq_raw = request.form.get('previous_squares')
-    previous_squares = parse_float(_prev_sq_raw, 0.0)  # default to 0, not current squares
-
-    previous_roof_type = request.form.get('previous_roof_type', '')  # default to '' so a change is caught
-
-    previous_product = request.form.get('previous_product', '')  # safe default; not used for labor_days but consistent
-
-    _prev_adj_raw = request.form.get('previous_adjusted_coverage')
-    previous_adjusted_coverage = parse_float(_prev_adj_raw, 0.0)
-
-    _prev_units_raw = request.form.get('previous_silicone_units_10')
-    # Default to current silicone_units_10 if the hidden field is missing on first render
-    previous_silicone_units_10 = parse_float(_prev_units_raw, (silicone_units_10 or 0.0))
+            generate()
+        return redirect(url_for('proposal_list'))
 
-    # Simple text field; persist across recalcs
-    proposal_note = (request.form.get('proposal_note') or '').strip()
-    proposal_language = (request.form.get('proposal_language') or '').strip()
-    customer_name = (request.form.get('customer_name') or '').strip()
-    street_address = (request.form.get('street_address') or '').strip()
-    city = (request.form.get('city') or '').strip()
-    state = (request.form.get('state') or '').strip()
-    zip_code = (request.form.get('zip_code') or '').strip()
+    # Decode every input in one pass
+    fields, form_errors = decode_update_form(request.form)
+    _flash_form_errors(folder_name, form_errors)
 
     # Use proposal_language as the single source of truth for downstream Word/Excel writes
-    includes_text = proposal_language
+    fields["includes_text"] = fields["proposal_language"]
 
     # Carry read-only flag through POST round-trips, supporting both new and legacy formats
     # New: read_only = "Yes"/"No"; Legacy: readonly = "1"/"0"
@@ -1255,170 +5502,54 @@ def update_proposal(folder_name):
     else:
         readonly = (request.form.get('readonly') == '1')
 
-    # Prepare data dictionary for template (may include more fields as needed)
-    data = {
-        'squares': squares,
-        'product': product,
-        'current_roof': roof_type,
-        'labor_days': labor_days,
-        'warranty_incl': warranty_incl,
-        'price_per_sq_10': price_per_sq_10,
-        'commission_pct': commission_pct,
-        'adjusted_coverage': adjusted_coverage,
-        'silicone_units_10': silicone_units_10,
-        'silicone_price': silicone_price,
-        'gaco_patch_units': gaco_patch_units,
-        'gaco_patch_price': gaco_patch_price,
-        'sw_1flash_units': sw_1flash_units,
-        'sw_1flash_price': sw_1flash_price,
-        'bleed_trap_units': bleed_trap_units,
-        'bleed_trap_price': bleed_trap_price,
-        'sw_bleed_block_units': sw_bleed_block_units,
-        'sw_bleed_block_price': sw_bleed_block_price,
-        'drainage_mat_units': drainage_mat_units,
-        'drainage_mat_price': drainage_mat_price,
-        'foam_units': foam_units,
-        'foam_price': foam_price,
-        'rfc_labor_price': rfc_labor_price,
-        'pcs_labor_price': pcs_labor_price,
-        'scarifying_total': scarifying_total,
-        'travel_total': travel_total,
-        'misc_costs_total': misc_costs_total,
-        'previous_squares': previous_squares,
-        'previous_roof_type': previous_roof_type,
-        'previous_product': previous_product,
-        'previous_warranty_incl': previous_warranty_incl,
-        'previous_adjusted_coverage': previous_adjusted_coverage,
-        'previous_silicone_units_10': previous_silicone_units_10,
-        'coverage_10': 0,
-        'coverage_15': 0,
-        'coverage_20': 0,
-        'submitted_by': submitted_by,
-        'office_fee_pct': office_fee_pct,
-        'previous_submitted_by': previous_submitted_by,
-        'proposal_note': proposal_note,
-        'proposal_language': proposal_language,
-        'customer_name': customer_name,
-        'street_address': street_address,
-        'city': city,
-        'state': state,
-        'zip_code': zip_code,
-        'includes_text': includes_text,
-    }
+    # Prepare the record for the calculation and the template
+    data = ProposalRecord(fields, coverage_10=0, coverage_15=0, coverage_20=0)
 
     # If saving an existing proposal, delete old artifacts and regenerate in the same folder
     if action == 'save' and not allow_blank and folder_name:
         proposal_folder = folder_path
-        _delete_old_artifacts(proposal_folder)
-        # Collect any additional mapped fields present on the form for initial write
-        def _pf(name, default=None):
-            val = request.form.get(name)
-            if val is None or str(val).strip() == '':
-                return default
-            try:
-                return float(val.replace('$','').replace(',',''))
-            except Exception:
-                return val
-
-        mapped_data_full = {
-            "price_per_sq_10": _pf("price_per_sq_10"),
-            "labor_days": _pf("labor_days"),
-            "silicone_units_10": _pf("silicone_units_10"),
-            "gaco_patch_units": _pf("gaco_patch_units"),
-            "bleed_trap_units": _pf("bleed_trap_units"),
-            "sw_1flash_units": _pf("sw_1flash_units"),
-            "sw_bleed_block_units": _pf("sw_bleed_block_units"),
-            "drainage_mat_units": _pf("drainage_mat_units"),
-            "foam_units": _pf("foam_units"),
-            "silicone_price": _pf("silicone_price"),
-            "gaco_patch_price": _pf("gaco_patch_price"),
-            "bleed_trap_price": _pf("bleed_trap_price"),
-            "sw_1flash_price": _pf("sw_1flash_price"),
-            "sw_bleed_block_price": _pf("sw_bleed_block_price"),
-            "drainage_mat_price": _pf("drainage_mat_price"),
-            "foam_price": _pf("foam_price"),
-            "rfc_labor_price": _pf("rfc_labor_price"),
-            "pcs_labor_price": _pf("pcs_labor_price"),
-            "scarifying_total": _pf("scarifying_total"),
-            "travel_total": _pf("travel_total"),
-            "misc_costs_total": _pf("misc_costs_total"),
-            "proposal_note": (request.form.get("proposal_note") or "").strip(),
-            "proposal_language": (request.form.get("proposal_language") or "").strip(),
-            "total_price_10": _pf("total_price_10"),
-            "total_price_15": _pf("total_price_15"),
-            "total_price_20": _pf("total_price_20"),
-        }
-        # Remove Nones to avoid overwriting with blanks
-        mapped_data_full = {k: v for k, v in mapped_data_full.items() if v is not None}
-
-        create_proposal_from_fields(
-            customer_name=customer_name,
-            street_address=street_address,
-            city=city,
-            state=state,
-            zip_code=zip_code,
-            roof_type=roof_type,
-            total_squares=int(squares) if squares else 0,
-            warranty_incl=warranty_incl,
-            product=product,
-            proposal_language=proposal_language,
-            submitted_by=submitted_by,
+        # Fields present on the form for the Excel/Word write (blank numbers are left out)
+        mapped_data_full = ProposalRecord.from_form_mapped(request.form)
+
+        def regenerate():
+            _delete_old_artifacts(proposal_folder)
+            create_proposal_from_fields(**generate_kwargs)
+
+        generate_kwargs = dict(
+            customer_name=data.customer_name,
+            street_address=data.street_address,
+            city=data.city,
+            state=data.state,
+            zip_code=data.zip_code,
+            roof_type=data.current_roof,
+            total_squares=int(data.squares) if data.squares else 0,
+            warranty_incl=data.warranty_incl,
+            product=data.product,
+            proposal_language=data.proposal_language,
+            submitted_by=data.submitted_by,
             target_folder=proposal_folder,
             mapped_data=mapped_data_full,
-            pdf_async=True,
+            pdf_async=not BACKGROUND_GENERATION,
             use_libreoffice=True,
         )
+        if BACKGROUND_GENERATION:
+            submit_generation(os.path.basename(proposal_folder), regenerate)
+        else:
+            regenerate()
         return redirect(url_for('proposal_list'))
 
-    # Call calculation_routine and merge results
-    calc_result = calculation_routine(
-        squares,
-        product,
-        roof_type,
-        labor_days,
-        warranty_incl,
-        price_per_sq_10,
-        commission_pct,
-        submitted_by=submitted_by,
-        previous_submitted_by=previous_submitted_by,
-        office_fee_pct=office_fee_pct,
-        adjusted_coverage=adjusted_coverage,
-        silicone_units_10=silicone_units_10,
-        silicone_price=silicone_price,
-        gaco_patch_units=gaco_patch_units,
-        gaco_patch_price=gaco_patch_price,
-        sw_1flash_units=sw_1flash_units,
-        sw_1flash_price=sw_1flash_price,
-        bleed_trap_units=bleed_trap_units,
-        bleed_trap_price=bleed_trap_price,
-        sw_bleed_block_units=sw_bleed_block_units,
-        sw_bleed_block_price=sw_bleed_block_price,
-        drainage_mat_units=drainage_mat_units,
-        drainage_mat_price=drainage_mat_price,
-        foam_units=foam_units,
-        foam_price=foam_price,
-        rfc_labor_price=rfc_labor_price,
-        pcs_labor_price=pcs_labor_price,
-        scarifying_total=scarifying_total,
-        travel_total=travel_total,
-        misc_costs_total=misc_costs_total,
-        previous_squares=previous_squares,
-        previous_roof_type=previous_roof_type,
-        previous_product=previous_product,
-        previous_adjusted_coverage=previous_adjusted_coverage,
-        previous_silicone_units_10=previous_silicone_units_10,
-        proposal_note=proposal_note
-    )
+    # Call calculation_routine (memoized) and merge results
+    calc_result = calculation_routine_cached(**data.calc_kwargs())
     # Persist key header fields and note across round trip so they are not lost
     calc_result.update({
-        "customer_name": customer_name,
-        "street_address": street_address,
-        "city": city,
-        "state": state,
-        "zip_code": zip_code,
-        "proposal_note": proposal_note,
-        "proposal_language": includes_text,
-        "includes_text": includes_text,
+        "customer_name": data.customer_name,
+        "street_address": data.street_address,
+        "city": data.city,
+        "state": data.state,
+        "zip_code": data.zip_code,
+        "proposal_note": data.proposal_note,
+        "proposal_language": data.includes_text,
+        "includes_text": data.includes_text,
     })
 
     data.update(calc_result)
@@ -1427,7 +5558,8 @@ def update_proposal(folder_name):
         data=data,
         folder_name=folder_name,
         readonly=readonly,
-        is_blank=(folder_name in ("NEW", "__blank__"))
+        is_blank=(folder_name in ("NEW", "__blank__")),
+        duplicates=duplicates,
     )
 
 @app.route('/proposal_details/new', methods=['GET'])
@@ -1471,17 +5603,8 @@ def proposal_details(folder_name):
     dead_ind = request.args.get('dead_ind')
     if dead_ind is not None and str(dead_ind).strip().lower() in ('yes', 'true', '1'):
         # Attempt to move the folder from proposals to deadfile
-        src_path = os.path.join(PROPOSALS_DIR, folder_name)
-        dest_path = os.path.join(DEADFILE_DIR, folder_name)
         try:
-            # Check if source exists
-            if not os.path.exists(src_path):
-                flash(f"Source folder '{src_path}' does not exist.", "error")
-            elif os.path.exists(dest_path):
-                flash(f"Target folder '{dest_path}' already exists.", "error")
-            else:
-                shutil.move(src_path, dest_path)
-                flash(f"Proposal '{folder_name}' moved to dead file.", "success")
+            _flash_move_result(move_proposal(folder_name, "dead"), "Proposal", "moved to dead file.")
         except Exception as e:
             flash(f"Error moving proposal: {e}", "error")
         return redirect(url_for('proposal_list'))
@@ -1490,17 +5613,8 @@ def proposal_details(folder_name):
     contract_ind = request.args.get('contract_ind')
     if contract_ind is not None and str(contract_ind).strip().lower() in ('yes', 'true', '1'):
         # Attempt to move the folder from proposals to contracts
-        src_path = os.path.join(PROPOSALS_DIR, folder_name)
-        dest_path = os.path.join(CONTRACTS_DIR, folder_name)
         try:
-            # Check if source exists
-            if not os.path.exists(src_path):
-                flash(f"Source folder '{src_path}' does not exist.", "error")
-            elif os.path.exists(dest_path):
-                flash(f"Target folder '{dest_path}' already exists.", "error")
-            else:
-                shutil.move(src_path, dest_path)
-                flash(f"Proposal '{folder_name}' moved to contracts.", "success")
+            _flash_move_result(move_proposal(folder_name, "contracts"), "Proposal", "moved to contracts.")
         except Exception as e:
             flash(f"Error moving proposal: {e}", "error")
         return redirect(url_for('proposal_list'))
@@ -1509,114 +5623,43 @@ def proposal_details(folder_name):
     close_ind = request.args.get('close_ind')
     if close_ind is not None and str(close_ind).strip().lower() in ('yes', 'true', '1'):
         # Attempt to move the folder from contracts to completed
-        src_path = os.path.join(CONTRACTS_DIR, folder_name)
-        dest_path = os.path.join(COMPLETED_DIR, folder_name)
         try:
-            if not os.path.exists(src_path):
-                flash(f"Source folder '{src_path}' does not exist.", "error")
-            elif os.path.exists(dest_path):
-                flash(f"Target folder '{dest_path}' already exists.", "error")
-            else:
-                shutil.move(src_path, dest_path)
-                flash(f"Contract '{folder_name}' closed and moved to Completed.", "success")
+            _flash_move_result(move_proposal(folder_name, "completed"), "Contract", "closed and moved to Completed.")
         except Exception as e:
             flash(f"Error closing contract: {e}", "error")
         return redirect(url_for('proposal_list', status='under'))
 
-    # Determine source root (Open Proposals vs Contracts) by checking where the folder exists
-    safe_folder = os.path.basename(folder_name)
-    proposals_path = os.path.join(PROPOSALS_DIR, safe_folder)
-    contracts_path = os.path.join(CONTRACTS_DIR, safe_folder)
-
-    if os.path.isdir(proposals_path):
-        folder_path = proposals_path
-    elif os.path.isdir(contracts_path):
-        folder_path = contracts_path
-    else:
-        return f"Folder not found in either PROPOSALS_DIR or CONTRACTS_DIR: {safe_folder}", 404
+    # Resolve the stable ID (or legacy folder name) to its current stage directory
+    resolved = resolve_proposal(folder_name)
+    if not resolved:
+        return f"Proposal not found in any stage directory: {os.path.basename(folder_name)}", 404
+    proposal_id, stage, folder_path = resolved
 
     # Find the first file in the folder that starts with 'Profit Summary'
-    profit_files = [f for f in os.listdir(folder_path) if f.startswith("Profit Summary") and f.endswith((".xlsm", ".xlsx"))]
-    if not profit_files:
-        return f"No Profit Summary file found in folder: {folder_name}"
-
-    file_path = os.path.join(folder_path, profit_files[0])
+    read_folder = mirror_read_path(folder_path)
+    artifact_files = list_artifact_files(read_folder)
+    if not artifact_files and not os.path.isdir(read_folder):
+        # Index is stale (folder moved outside the app): rescan once and retry
+        rebuild_proposal_index()
+        resolved = resolve_proposal(proposal_id)
+        if resolved:
+            proposal_id, stage, folder_path = resolved
+            read_folder = mirror_read_path(folder_path)
+            artifact_files = list_artifact_files(read_folder)
+    file_path = next(
+        (os.path.join(read_folder, f) for f in artifact_files
+         if f.startswith("Profit Summary") and f.endswith((".xlsm", ".xlsx"))),
+        None,
+    )
+    if not file_path:
+        return f"No Profit Summary file found in folder: {os.path.basename(folder_path)}"
 
     # Read the Excel file into a summary_data 2D list
-    summary_data = pd.read_excel(file_path, header=None).values.tolist()
+    with timed("excel_import"):
+        summary_data = pd.read_excel(file_path, header=None).values.tolist()
 
-    # Safely read Proposal Note from C40 (row 40, col C)
-    try:
-        _proposal_note_import = summary_data[39][2]
-    except Exception:
-        _proposal_note_import = ""
-
-    # Safely read proposal language from C41 (row 41, col C)
-    try:
-        _proposal_language_import = summary_data[40][2]  # C41
-    except Exception:
-        _proposal_language_import = ""
-
-    # Extract specific values
-    data = {
-        "squares": summary_data[2][4],               # E3
-        "product": summary_data[2][7],               # H3
-        "price_per_sq_10": summary_data[2][12],      # M3
-        "total_price_10": summary_data[2][15],       # P3
-        "current_roof": summary_data[4][4],          # E5
-        "warranty_incl": summary_data[4][7],         # H5
-        "price_per_sq_15": summary_data[4][12],      # M5
-        "total_price_15": summary_data[4][15],       # P5
-        "labor_days": summary_data[6][4],            # E7
-        "price_per_sq_20": summary_data[6][12],      # M7
-        "total_price_20": summary_data[6][15],       # P7
-        "includes_text": _proposal_language_import,
-        "proposal_language": _proposal_language_import,
-        "submitted_by": summary_data[6][7],          # H7
-        "previous_submitted_by": summary_data[6][7], # H7
-        "silicone_units_10": summary_data[10][2],    # C11
-        "silicone_price": summary_data[10][3],       # D11
-        "silicone_total": summary_data[10][4],       # E11
-        "gaco_patch_units": summary_data[11][2],     # C12
-        "gaco_patch_price": summary_data[11][3],     # D12
-        "gaco_patch_total": summary_data[11][4],     # E12
-        "bleed_trap_units": summary_data[12][2],     # C13
-        "bleed_trap_price": summary_data[12][3],     # D13
-        "bleed_trap_total": summary_data[12][4],     # E13
-        "sw_1flash_units": summary_data[13][2],      # C14
-        "sw_1flash_price": summary_data[13][3],      # D14
-        "sw_1flash_total": summary_data[13][4],      # E14
-        "sw_bleed_block_units": summary_data[14][2], # C15
-        "sw_bleed_block_price": summary_data[14][3], # D15
-        "sw_bleed_block_total": summary_data[14][4], # E15
-        "drainage_mat_units": summary_data[15][2],   # C16
-        "drainage_mat_price": summary_data[15][3],   # D16
-        "drainage_mat_total": summary_data[15][4],   # E16
-        "foam_units": summary_data[16][2],           # C17
-        "foam_price": summary_data[16][3],           # D17
-        "foam_total": summary_data[16][4],           # E17
-        "rfc_labor_price": summary_data[17][3],      # D18
-        "rfc_labor_total": summary_data[17][4],      # E18
-        "scarifying_total": summary_data[18][4],     # E19
-        "pcs_labor_price": summary_data[19][3],      # D20
-        "pcs_labor_total": summary_data[19][4],      # E20
-        "travel_total": summary_data[20][4],         # E21
-        "misc_costs_total": summary_data[21][4],     # E22
-        "warranty_10_total": summary_data[22][4],    # E23
-        "office_fee_total": summary_data[23][4],     # E24
-        "total_cost": summary_data[25][4],           # E26
-        "pcs_profit": summary_data[27][4],           # E28
-        "profit_pct": summary_data[28][4],           # E29
-        "daily_profit": summary_data[29][4],         # E30
-        "profit_share": summary_data[30][4],         # E31
-        "commission_amt": summary_data[31][4],       # E32
-        "customer_name": summary_data[0][2],         # C1
-        "street_address": summary_data[0][7],        # H1
-        "city": summary_data[0][13],                 # N1
-        "state": summary_data[0][18],                # S1
-        "zip_code": summary_data[0][20],             # U1
-        "proposal_note": _proposal_note_import,      # C40
-    }
+    # Extract the mapped cells (header, inputs, formula results, note C40, language C41)
+    data = ProposalRecord.from_grid(summary_data)
 
     # Ensure required keys exist for the template & triggers (Excel import init only)
     data.setdefault("coverage_10", 0)
@@ -1662,12 +5705,16 @@ def proposal_details(folder_name):
         readonly = (read_only_param.strip().lower() == 'yes')
     else:
         readonly = (request.args.get('readonly') == '1')
+    # Completed and dead proposals can be viewed but not edited
+    if stage in ("completed", "dead"):
+        readonly = True
     return render_template(
         "proposal_details.html",
         data=data,
-        folder_name=folder_name,
+        folder_name=proposal_id,
         readonly=readonly,
         is_blank=False,
+        artifact_files=artifact_files,
     )
 
         
@@ -1693,5 +5740,128 @@ def replace_placeholder_blocks(doc, replacements):
                         replace_text_in_block(para)
 
 
+def _template_names():
+    return sorted(n for n in jinja2.FileSystemLoader(TEMPLATE_PATH).list_templates() if n.endswith(".html"))
+
+
+def warm_templates() -> int:
+    """
+    Load every template (compiling it or reading it from the bytecode cache) and render the
+    two main pages once with empty data, so the first real request pays no compile cost.
+    """
+    warmed = 0
+    for name in _template_names():
+        try:
+            app.jinja_env.get_template(name)
+            warmed += 1
+        except Exception as e:
+            print(f"Template warmup: could not compile {name}: {e}")
+    with app.test_request_context('/'):
+        for name, context in (
+            ("proposal_list.html", dict(open_folders=[], contract_folders=[], folder_ids={}, status="open")),
+            ("proposal_details.html", dict(data=make_blank_data(), folder_name="NEW", readonly=False,
+                                           is_blank=True)),
+        ):
+            try:
+                render_template(name, **context)
+            except Exception as e:
+                print(f"Template warmup: could not render {name}: {e}")
+    return warmed
+
+
+# ---- App initialization / process lifecycle ----
+# init_app() does the read-only setup of the module-level app once: directory report,
+# template compilation and warmup, proposal and search index load. Under gunicorn --preload (see
+# gunicorn.conf.py) it runs in the master, so every forked worker shares those pages
+# copy-on-write. Threads, open files and in-memory job queues don't survive fork, so
+# start_background_services() (move-job worker, resumed jobs, profiler) runs per process:
+# from gunicorn's post_fork hook, or lazily on the first request for servers without one.
+_app_initialized = False
+_services_pid = None
+_services_lock = threading.Lock()
+
+
+def init_app():
+    """Initialize shared, immutable state of the module-level app and return it. Idempotent."""
+    global _app_initialized
+    if _app_initialized:
+        return app
+    _app_initialized = True
+    for env_name in ("PROPOSALS_DIR", "CONTRACTS_DIR", "COMPLETED_DIR", "DEADFILE_DIR", "TEMPLATE_DIR"):
+        print(f"{env_name} =", globals()[env_name])
+    if TEMPLATE_WARMUP:
+        warm_templates()
+    try:
+        _ensure_index_loaded()
+    except Exception as e:
+        print(f"Proposal index not loaded at startup: {e}")
+    with _search_lock:
+        _load_search_locked()
+    _build_suggest_snapshot()
+    return app
+
+
+def _refresh_catalog_views():
+    _refresh_rollups_if_stale()
+    _refresh_search_if_stale()
+
+
+def start_background_services():
+    """Start this process's worker threads; does nothing if they're already running here."""
+    global _services_pid
+    with _services_lock:
+        if _services_pid == os.getpid():
+            return
+        _services_pid = os.getpid()
+    # Pick up cross-device moves interrupted by a restart
+    resume_move_jobs()
+    start_mirror_sync()
+    start_search_sync()
+    # Catch up with edits made directly on the share since the derived views were last refreshed
+    threading.Thread(target=_refresh_catalog_views, name="catalog-refresh", daemon=True).start()
+    if PROFILER_ENABLED:
+        _start_profiler_thread()
+
+
+@app.before_request
+def _ensure_background_services():
+    if _services_pid != os.getpid():
+        start_background_services()
+
+
+def _after_fork_in_child():
+    """Drop per-process resources inherited from the parent."""
+    global _profile_window, _move_worker, _move_queue, _profiler_thread, _generation_executor, _mirror_thread
+    global _search_sync_thread, _mirror_owner
+    for handler in list(_trace_logger.handlers):
+        _trace_logger.removeHandler(handler)
+        try:
+            handler.close()
+        except Exception:
+            pass
+    _profiled_requests.clear()
+    _profile_window = None
+    _move_worker = None
+    # The parent's jobs belong to the parent's worker; this process resumes its own from
+    # MOVE_JOBS_PATH in start_background_services()
+    _move_jobs.clear()
+    _move_queue = queue.Queue()
+    _profiler_thread = None
+    _generation_executor = None
+    _generation_jobs.clear()
+    _mirror_thread = None
+    _search_sync_thread = None
+    # Closing the inherited descriptor doesn't release the parent's flock on the mirror
+    if _mirror_owner is not None and _mirror_owner[2] is not None:
+        _mirror_owner[2].close()
+    _mirror_owner = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
 if __name__ == "__main__":
+    init_app()
+    start_background_services()
     app.run(debug=True)
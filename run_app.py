@@ -1,5 +1,94 @@
 # run_app.py
-from pcs_proposal_web import app  # Flask app object
+import _thread
+import os
+import signal
+import threading
+
+import pcs_proposal_web
+from pcs_proposal_web import init_app, start_background_services
+
+# Shared setup runs here, at import: in the gunicorn master when preloaded (gunicorn.conf.py)
+app = init_app()  # Flask app object
+
+# ---- Embedded production server (desktop bundle) ----
+# The frozen app has no gunicorn, so it serves itself with waitress: a fixed pool of request
+# threads, HTTP keep-alive and a clean stop on Ctrl+C / SIGTERM: new connections are refused,
+# requests already running finish (up to SERVER_SHUTDOWN_TIMEOUT), then background generation
+# drains. A second Ctrl+C stops at once. DESKTOP_SERVER=dev brings back Flask's development
+# server.
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "5000"))
+SERVER_THREADS = max(1, int(os.environ.get("SERVER_THREADS", "8")))
+SERVER_KEEPALIVE = int(os.environ.get("SERVER_KEEPALIVE", "120"))  # idle seconds before a connection is closed
+SERVER_SHUTDOWN_TIMEOUT = float(os.environ.get("SERVER_SHUTDOWN_TIMEOUT", "300"))
+
+
+def _make_server():
+    """(run, begin_stop): begin_stop() is called from the signal handler and must not block."""
+    try:
+        from waitress.server import create_server
+    except ImportError:
+        # Werkzeug's threaded server: one thread per request, no pool, but still better than debug mode
+        from werkzeug.serving import make_server
+        print("waitress is not installed; using the Werkzeug threaded server.")
+        server = make_server(SERVER_HOST, SERVER_PORT, app, threaded=True)
+        server.daemon_threads = False  # so server_close() waits for the running requests
+
+        def run():
+            server.serve_forever()
+            server.server_close()
+
+        # shutdown() blocks until serve_forever returns, so it can't run on the main thread
+        return run, lambda: threading.Thread(target=server.shutdown, daemon=True).start()
+    server = create_server(app, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS,
+                           channel_timeout=SERVER_KEEPALIVE, ident="PCS Proposals")
+
+    def _drain():
+        # Running requests finish and queued ones are cancelled; the main loop keeps flushing
+        # their responses meanwhile, and is interrupted (see _handle_signal) once they're done
+        server.task_dispatcher.shutdown(timeout=SERVER_SHUTDOWN_TIMEOUT)
+        _thread.interrupt_main()
+
+    def begin_stop():
+        server.accepting = False
+        threading.Thread(target=_drain, daemon=True).start()
+
+    return server.run, begin_stop
+
+
+def serve():
+    """Run the app on the embedded server until interrupted, then drain background generation."""
+    if "BACKGROUND_GENERATION" not in os.environ:
+        # Saves return immediately; Excel/Word/PDF work happens on the generation workers
+        pcs_proposal_web.BACKGROUND_GENERATION = True
+    start_background_services()
+    run, begin_stop = _make_server()
+    stopping = threading.Event()
+
+    def _handle_signal(signum, frame):
+        if stopping.is_set():
+            # Requests drained, or a second Ctrl+C: leave the server loop (waitress stops on this)
+            raise KeyboardInterrupt
+        stopping.set()
+        print("Shutting down: no new connections, waiting for running requests and jobs ...")
+        begin_stop()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, _handle_signal)
+
+    print(f"Serving on http://{SERVER_HOST}:{SERVER_PORT} ({SERVER_THREADS} threads)")
+    try:
+        run()
+    except KeyboardInterrupt:
+        if not stopping.is_set():
+            raise
+    if not pcs_proposal_web.shutdown_generation(timeout=SERVER_SHUTDOWN_TIMEOUT):
+        print(f"Background generation still running after {SERVER_SHUTDOWN_TIMEOUT:.0f}s; exiting anyway.")
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    if os.environ.get("DESKTOP_SERVER", "").strip().lower() == "dev":
+        start_background_services()
+        app.run(host=SERVER_HOST, port=SERVER_PORT)
+    else:
+        serve()
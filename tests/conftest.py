@@ -0,0 +1,17 @@
+"""
+Point every share and state path at a temporary root and swap in the Excel/LibreOffice
+stand-ins before pcs_proposal_web is imported by any test.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import standins  # noqa: E402
+
+standins.install(tempfile.mkdtemp(prefix="pcs-tests-"), make_templates=False)
+
+import pcs_proposal_web  # noqa: E402
+
+standins.patch_app(pcs_proposal_web)
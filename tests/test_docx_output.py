@@ -0,0 +1,80 @@
+import io
+import struct
+import zipfile
+
+from docx import Document
+
+import pcs_proposal_web as web
+
+
+def _raw_members(path):
+    """name -> compressed bytes exactly as stored in the archive."""
+    raw = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<2H", f.read(30)[26:30])
+            f.seek(name_len + extra_len, 1)
+            raw[info.filename] = f.read(info.compress_size)
+    return raw
+
+
+def _template(tmp_path):
+    doc = Document()
+    doc.add_heading("[[CustomerName]]", level=1)
+    doc.add_paragraph("Squares: [[Squares]]")
+    path = str(tmp_path / "template.docx")
+    doc.save(path)
+    return path
+
+
+def _fill(template, output):
+    doc = Document(template)
+    web.replace_placeholder_blocks(doc, {"[[CustomerName]]": "Ada Lovelace", "[[Squares]]": "120"})
+    web._save_docx_from_template(doc, template, output)
+
+
+def test_saved_docx_opens_and_keeps_untouched_members(tmp_path):
+    template = _template(tmp_path)
+    output = str(tmp_path / "out.docx")
+    _fill(template, output)
+
+    with zipfile.ZipFile(output) as zf:
+        assert zf.testzip() is None
+        names = zf.namelist()
+    with zipfile.ZipFile(template) as zf:
+        assert names == zf.namelist()
+    text = "\n".join(p.text for p in Document(output).paragraphs)
+    assert "Ada Lovelace" in text and "Squares: 120" in text
+
+    before, after = _raw_members(template), _raw_members(output)
+    changed = {name for name in before if before[name] != after[name]}
+    assert changed == {"word/document.xml"}
+
+
+def test_template_written_with_data_descriptors(tmp_path):
+    # zipfile streams to non-seekable files with sizes in a trailing data descriptor
+    source = _template(tmp_path)
+    buf = io.BytesIO()
+
+    class Unseekable(io.RawIOBase):
+        def writable(self):
+            return True
+
+        def write(self, b):
+            return buf.write(b)
+
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(Unseekable(), "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            dst.writestr(info.filename, src.read(info))
+    template = str(tmp_path / "streamed.docx")
+    with open(template, "wb") as f:
+        f.write(buf.getvalue())
+    with zipfile.ZipFile(template) as zf:
+        assert all(i.flag_bits & 0x08 for i in zf.infolist())
+
+    output = str(tmp_path / "out.docx")
+    _fill(template, output)
+    with zipfile.ZipFile(output) as zf:
+        assert zf.testzip() is None
+    assert "Ada Lovelace" in Document(output).paragraphs[0].text
@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+import pcs_proposal_web as web
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "MIRROR_DIR", str(tmp_path / "mirror"))
+    monkeypatch.setattr(web, "MIRROR_SETTLE_SECONDS", 0)
+    monkeypatch.setattr(web, "_mirror_manifest", None)
+    monkeypatch.setattr(web, "_mirror_owner", None)
+    web._mirror_dirty.clear()
+    assert web._claim_mirror()
+    yield
+    web._mirror_owner[2].close()
+    web._mirror_dirty.clear()
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as fh:
+        return fh.read()
+
+
+def _synced_folder(name="notes.txt", text="v1"):
+    """A proposal folder created on the share and pulled into the mirror."""
+    share_dir = web.stage_path("proposals", f"Mirror {uuid.uuid4().hex[:8]}")
+    _write(os.path.join(share_dir, name), text)
+    web.mirror_sync_once(deep=True)
+    local_dir = web.mirror_write_path(share_dir)
+    assert local_dir != share_dir and _read(os.path.join(local_dir, name)) == text
+    return share_dir, local_dir
+
+
+def _conflicts(key):
+    return [c for c in web._mirror_manifest["conflicts"] if c["key"] == key]
+
+
+def test_only_one_process_owns_the_mirror(mirror):
+    web.mirror_sync_once(deep=True)
+    assert web.mirror_active()
+
+    def other_process():
+        os._exit(0 if not web._claim_mirror() and not web.mirror_active() else 1)
+
+    child = multiprocessing.get_context("fork").Process(target=other_process)
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+    path = web.stage_path("proposals", "Anything")
+    assert web.mirror_write_path(path) != path
+
+
+def test_push_and_conflict_keep_the_share_version(mirror):
+    share_dir, local_dir = _synced_folder()
+    _write(os.path.join(local_dir, "notes.txt"), "local edit")
+    web.mirror_touch(local_dir)
+    web.mirror_sync_once()
+    assert _read(os.path.join(share_dir, "notes.txt")) == "local edit"
+
+    _write(os.path.join(local_dir, "notes.txt"), "second local edit")
+    _write(os.path.join(share_dir, "notes.txt"), "edited on the share")
+    web.mirror_touch(local_dir)
+    web.mirror_sync_once()
+
+    key = web._mirror_key(os.path.join(share_dir, "notes.txt"))
+    assert _read(os.path.join(share_dir, "notes.txt")) == "edited on the share"
+    assert _read(os.path.join(local_dir, "notes.txt")) == "edited on the share"
+    [conflict] = _conflicts(key)
+    assert conflict["reason"] == "changed on both sides"
+    assert _read(conflict["saved_as"]) == "second local edit"
+
+
+def test_local_delete_removes_the_share_copy(mirror):
+    share_dir, local_dir = _synced_folder()
+    _write(os.path.join(local_dir, "extra.txt"), "new")
+    os.remove(os.path.join(local_dir, "notes.txt"))
+    web.mirror_touch(local_dir)
+    web.mirror_sync_once()
+
+    assert sorted(os.listdir(share_dir)) == ["extra.txt"]
+    key = web._mirror_key(os.path.join(share_dir, "notes.txt"))
+    assert key not in web._mirror_manifest["files"]
+
+
+def test_local_delete_of_a_file_edited_on_the_share_keeps_the_edit(mirror):
+    share_dir, local_dir = _synced_folder()
+    os.remove(os.path.join(local_dir, "notes.txt"))
+    _write(os.path.join(share_dir, "notes.txt"), "edited on the share")
+    web.mirror_touch(local_dir)
+    web.mirror_sync_once()
+
+    key = web._mirror_key(os.path.join(share_dir, "notes.txt"))
+    assert _read(os.path.join(share_dir, "notes.txt")) == "edited on the share"
+    assert _read(os.path.join(local_dir, "notes.txt")) == "edited on the share"
+    assert [c["reason"] for c in _conflicts(key)] == ["deleted locally, changed on share"]
+    assert not web._mirror_manifest["files"][key].get("deleted")
+
+
+def test_folder_moved_on_the_share_is_not_recreated(mirror):
+    share_dir, local_dir = _synced_folder()
+    _write(os.path.join(local_dir, "notes.txt"), "unpushed edit")
+    web.mirror_touch(local_dir)
+    moved_dir = web.stage_path("contracts", os.path.basename(share_dir))
+    os.rename(share_dir, moved_dir)
+    web.mirror_sync_once()
+
+    assert not os.path.exists(share_dir)
+    assert _read(os.path.join(moved_dir, "notes.txt")) == "v1"
+    assert not os.path.exists(local_dir)
+    key = web._mirror_key(os.path.join(local_dir, "notes.txt"))
+    [conflict] = _conflicts(key)
+    assert conflict["reason"] == f"folder moved on share to {moved_dir}"
+    assert _read(conflict["saved_as"]) == "unpushed edit"
+    # The mirror picks the folder up again under its new stage
+    assert _read(os.path.join(web.mirror_write_path(moved_dir), "notes.txt")) == "v1"
@@ -0,0 +1,161 @@
+import errno
+import multiprocessing
+import os
+import subprocess
+import time
+
+import pytest
+
+import pcs_proposal_web as web
+
+
+@pytest.fixture(autouse=True)
+def jobs_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "MOVE_JOBS_PATH", str(tmp_path / "move_jobs.json"))
+
+
+def _proposal(name):
+    folder = web.stage_path("proposals", f"{name} {os.urandom(4).hex()}")
+    os.makedirs(os.path.join(folder, "photos"))
+    for rel, size in (("Proposal.docx", 5000), ("photos/roof.jpg", 300000), ("notes.txt", 10)):
+        with open(os.path.join(folder, rel), "wb") as fh:
+            fh.write(os.urandom(size))
+    return web.register_proposal_folder("proposals", folder), folder
+
+
+def _contents(folder):
+    found = {}
+    for root, _dirs, names in os.walk(folder):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as fh:
+                found[os.path.relpath(os.path.join(root, name), folder)] = fh.read()
+    return found
+
+
+def _wait(job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = web.get_move_job(job_id)
+        if job and job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"move job {job_id} did not finish")
+
+
+def _leftovers(stage):
+    return [n for n in os.listdir(web.STAGE_DIRS[stage]) if ".moving-" in n]
+
+
+def _force_exdev(monkeypatch, src_path):
+    real_rename = os.rename
+
+    def rename(src, dst):
+        if src == src_path:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return real_rename(src, dst)
+
+    monkeypatch.setattr(web.os, "rename", rename)
+
+
+def _dead_pid():
+    child = subprocess.Popen(["true"])
+    child.wait()
+    return child.pid
+
+
+def _stranded_job(pid, folder, partial=True):
+    """A job left 'running' by a process that died mid-copy, with part of its temp copy."""
+    name = os.path.basename(folder)
+    dest = web.stage_path("contracts", name)
+    job = {"id": os.urandom(6).hex(), "proposal_id": pid, "folder": name, "src_path": folder,
+           "dest_path": dest, "stage": "contracts", "status": "running", "owner_pid": _dead_pid(),
+           "files_total": 0, "files_done": 0, "bytes_total": 0, "bytes_done": 0, "error": None,
+           "created": time.time(), "updated": time.time()}
+    if partial:
+        tmp_root = os.path.join(web.STAGE_DIRS["contracts"], f".{name}.moving-{job['id']}")
+        os.makedirs(tmp_root)
+        web.shutil.copy2(os.path.join(folder, "notes.txt"), os.path.join(tmp_root, "notes.txt"))
+    web._persist_move_job(job)
+    return job
+
+
+def _assert_moved(pid, folder, before):
+    dest = web.stage_path("contracts", os.path.basename(folder))
+    assert not os.path.exists(folder)
+    assert _contents(dest) == before
+    assert web.resolve_proposal(pid)[1:] == ("contracts", dest)
+    assert _leftovers("contracts") == []
+
+
+def test_cross_device_rename_falls_back_to_a_verified_copy_job(monkeypatch):
+    pid, folder = _proposal("Exdev")
+    before = _contents(folder)
+    _force_exdev(monkeypatch, folder)
+
+    [result] = web.move_proposals([pid], "contracts")
+    assert result["status"] == "queued"
+    job = _wait(result["job_id"])
+
+    assert job["status"] == "done", job["error"]
+    assert job["files_done"] == job["files_total"] == len(before)
+    _assert_moved(pid, folder, before)
+
+
+def test_checksum_mismatch_fails_the_job_and_removes_the_partial_copy(monkeypatch):
+    pid, folder = _proposal("Checksum")
+    before = _contents(folder)
+    _force_exdev(monkeypatch, folder)
+    real_sha256 = web._file_sha256
+    monkeypatch.setattr(web, "_file_sha256",
+                        lambda path: "corrupt" if ".moving-" in path and path.endswith(".jpg") else real_sha256(path))
+
+    [result] = web.move_proposals([pid], "contracts")
+    job = _wait(result["job_id"])
+
+    assert job["status"] == "failed"
+    assert "Checksum mismatch" in job["error"]
+    assert _contents(folder) == before
+    assert not os.path.exists(web.stage_path("contracts", os.path.basename(folder)))
+    assert _leftovers("contracts") == []
+    assert web.resolve_proposal(pid)[1] == "proposals"
+
+
+def test_job_of_a_dead_process_is_resumed_from_its_partial_copy():
+    pid, folder = _proposal("Resume")
+    before = _contents(folder)
+    job = _stranded_job(pid, folder)
+
+    assert web.resume_move_jobs() == 1
+    assert web.resume_move_jobs() == 0   # already ours
+    resumed = _wait(job["id"])
+
+    assert resumed["status"] == "done", resumed["error"]
+    assert resumed["owner_pid"] == os.getpid()
+    _assert_moved(pid, folder, before)
+
+
+def test_concurrent_resumers_claim_a_job_once():
+    pid, folder = _proposal("Race")
+    before = _contents(folder)
+    job = _stranded_job(pid, folder)
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(3)
+
+    def worker():
+        barrier.wait()
+        claimed = web.resume_move_jobs()
+        if claimed:
+            _wait(job["id"])
+        os._exit(claimed)
+
+    workers = [ctx.Process(target=worker) for _ in range(3)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(timeout=30)
+    assert sorted(p.exitcode for p in workers) == [0, 0, 1]
+
+    finished = web._load_move_jobs()[job["id"]]
+    assert finished["status"] == "done", finished["error"]
+    assert finished["owner_pid"] in {p.pid for p in workers}
+    _assert_moved(pid, folder, before)
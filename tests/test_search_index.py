@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+import pcs_proposal_web as web
+
+
+def _doc(i, customer="alpha"):
+    fields = {"customer": f"{customer} {i}", "address": "", "note": "", "language": ""}
+    prior = {"customer_name": f"{customer} {i}", "street_address": f"{i} Main St", "city": "Austin",
+             "state": "TX", "zip_code": "78701", "product": "Gaco", "current_roof": "Metal",
+             "submitted_by": "Vern Abbott", "saved_ns": i}
+    return {"stage": "proposals", "folder": f"Folder {i}", "fields": fields,
+            "paragraphs": ["Clean, prime and coat the roof."], "sig": [i], "prior": prior}
+
+
+def _forget_search_index():
+    """Drop the in-memory index, as a freshly started process would have it."""
+    for pid in list(web._search_docs):
+        web._search_set(pid, None)
+    web._search_log_gen, web._search_log_pos, web._search_refreshed_at = None, 0, None
+    web._build_suggest_snapshot()
+
+
+@pytest.fixture
+def search_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "SEARCH_INDEX_PATH", str(tmp_path / "search_index.json"))
+    _forget_search_index()
+    yield tmp_path
+    _forget_search_index()
+
+
+def _put(i, **kwargs):
+    web._update_search(lambda set_doc: set_doc(f"P{i}", _doc(i, **kwargs)))
+
+
+def test_updates_are_appended_not_rewritten(search_index):
+    _put(1)
+    _put(2)
+    assert not os.path.exists(web.SEARCH_INDEX_PATH)
+    with open(web._search_log_path("0"), encoding="utf-8") as fh:
+        assert len(fh.readlines()) == 2
+
+    _forget_search_index()
+    assert web.search_proposals("alpha")["total"] == 2
+
+
+def test_compaction_keeps_other_processes_in_step(search_index):
+    _put(1)
+    with web._search_lock:
+        web._load_search_locked()
+
+    def other_worker():
+        _put(2, customer="beta")
+        web.compact_search_index()
+        _put(3)
+
+    child = multiprocessing.get_context("fork").Process(target=other_worker)
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+    # The log this process was reading is gone: it reloads the snapshot, then tails the new log
+    assert web.search_proposals("alpha")["total"] == 2
+    assert web.search_proposals("beta")["total"] == 1
+    assert sorted(n for n in os.listdir(search_index) if n.endswith(".log")) == [
+        os.path.basename(web._search_log_path(web._search_log_gen))]
+
+    _forget_search_index()
+    assert web.search_proposals("alpha")["total"] == 2
+    assert sorted(web._search_docs) == ["P1", "P2", "P3"]
+
+
+def test_suggest_reads_the_snapshot_without_the_search_lock(search_index):
+    _put(1)
+    _put(12)
+    web._build_suggest_snapshot()
+    _put(123)
+    assert [s["value"] for s in web.suggest("Alpha 1")] == ["alpha 1", "alpha 12"]
+
+    web._build_suggest_snapshot()
+    result = []
+    with web._search_lock:
+        reader = threading.Thread(target=lambda: result.extend(web.suggest("alpha 1")))
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+    assert [s["value"] for s in result] == ["alpha 1", "alpha 12", "alpha 123"]
+    assert [s["proposals"] for s in web.suggest("1 main st", field="address")] == [1]
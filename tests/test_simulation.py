@@ -0,0 +1,47 @@
+import pytest
+
+import pcs_proposal_web as web
+
+FIXED = {group: {"dist": "fixed", "value": 1.0} for group in web.SIMULATION_GROUPS}
+
+
+def calc_kwargs(product, roof_type, squares=120, **overrides):
+    kwargs = dict(
+        squares=squares, product=product, roof_type=roof_type, labor_days=None, warranty_incl="Yes",
+        price_per_sq_10=None, commission_pct=0, submitted_by="Vern Abbott", previous_submitted_by="Vern Abbott",
+        office_fee_pct=None, adjusted_coverage=None, silicone_units_10=None, silicone_price=None,
+        gaco_patch_units=None, gaco_patch_price=None, sw_1flash_units=None, sw_1flash_price=None,
+        bleed_trap_units=None, bleed_trap_price=None, sw_bleed_block_units=None, sw_bleed_block_price=None,
+        drainage_mat_units=None, drainage_mat_price=None, foam_units=None, foam_price=None,
+        rfc_labor_price=None, pcs_labor_price=0, scarifying_total=0, travel_total=0, misc_costs_total=0,
+        previous_squares=0, previous_roof_type="", previous_product="", previous_adjusted_coverage=0,
+        previous_silicone_units_10=0, proposal_note="",
+    )
+    kwargs.update(overrides)
+    return kwargs
+
+
+CASES = [
+    calc_kwargs("Gaco", "Mod Bit"),
+    calc_kwargs("Uniflex", "Metal", squares=37, price_per_sq_10=455, travel_total=250),
+    calc_kwargs("Gaco", "Ballasted 60 mil", squares=301, submitted_by="Mark Burcham"),
+    calc_kwargs("Uniflex", "Rock/Foam/Coat", squares=88, misc_costs_total=1234.5),
+    # Labor days entered as 0 on an unchanged proposal stay 0
+    calc_kwargs("Gaco", "TPO/EPDM", squares=60, labor_days=0, previous_squares=60, previous_roof_type="TPO/EPDM",
+                previous_product="Gaco"),
+]
+
+
+@pytest.mark.parametrize("kwargs", CASES)
+def test_fixed_distributions_reproduce_the_routine(kwargs):
+    expected = web.calculation_routine(**kwargs)
+    result = web.simulate_margin(kwargs, FIXED, draws=25, seed=1)
+    for name in ("pcs_profit", "profit_pct", "daily_profit"):
+        assert set(result[name]["percentiles"].values()) == {expected[name]}, name
+
+
+def test_zero_labor_days_are_not_bumped_to_one():
+    kwargs = CASES[-1]
+    assert web.calculation_routine(**kwargs)["labor_days"] == 0
+    result = web.simulate_margin(kwargs, draws=200, seed=3)
+    assert set(result["daily_profit"]["percentiles"].values()) == {0}